@@ -6,7 +6,6 @@ from typing import List, Optional
 
 import typer
 from importlib.metadata import version as _version
-from bfcl._llm_response_generation import main as generation_main
 from bfcl.constants.category_mapping import TEST_COLLECTION_MAPPING
 from bfcl.constants.eval_config import (
     DOTENV_PATH,
@@ -15,7 +14,6 @@ from bfcl.constants.eval_config import (
     SCORE_PATH,
 )
 from bfcl.constants.model_config import MODEL_CONFIG_MAPPING
-from bfcl.eval_checker.eval_runner import main as evaluation_main
 from dotenv import load_dotenv
 from tabulate import tabulate
 
@@ -118,9 +116,49 @@ def generate(
         "--exclude-state-log",
         help="Exclude info about the state of each API system after each turn in the inference log; only relevant for multi-turn categories.",
     ),
+    external_inference_log: bool = typer.Option(
+        False,
+        "--external-inference-log",
+        help="Store the inference logs in a compressed, deduplicated side store next to the result files, and only keep a reference to each log in the result files.",
+    ),
     num_gpus: int = typer.Option(1, help="The number of GPUs to use."),
+    num_replicas: int = typer.Option(
+        1,
+        "--num-replicas",
+        help="The number of vLLM/SGLang server replicas, each using --num-gpus GPUs; requests are balanced across them. Only relevant for locally-hosted models.",
+    ),
     num_threads: int = typer.Option(1, help="The number of threads to use."),
+    requests_per_minute: Optional[int] = typer.Option(
+        None,
+        "--requests-per-minute",
+        help="Requests-per-minute budget for the model provider; only relevant for API-based models. No limit by default.",
+    ),
+    tokens_per_minute: Optional[int] = typer.Option(
+        None,
+        "--tokens-per-minute",
+        help="Tokens-per-minute budget for the model provider; only relevant for API-based models. No limit by default.",
+    ),
     gpu_memory_utilization: float = typer.Option(0.9, help="The GPU memory utilization."),
+    batch_size: int = typer.Option(
+        1,
+        "--batch-size",
+        help="The maximum number of prompts sent to the vLLM/SGLang server in one completion request; only relevant for locally-hosted models. 1 sends each prompt in its own request.",
+    ),
+    batch_window: float = typer.Option(
+        0.05,
+        "--batch-window",
+        help="How long, in seconds, a prompt waits for other prompts to share its completion request; only relevant when --batch-size is larger than 1.",
+    ),
+    order_by_prefix: bool = typer.Option(
+        False,
+        "--order-by-prefix",
+        help="Send the test entries that share a system prompt (same function docs and category) one after another, so the vLLM/SGLang prefix cache is reused; only relevant for locally-hosted models.",
+    ),
+    server_prompt_token_count: bool = typer.Option(
+        False,
+        "--server-prompt-token-count",
+        help="Base the prompt token count of each multi-turn step on the exact count reported by the vLLM/SGLang server for the previous step, instead of on the local tokenizer only; only relevant for locally-hosted models with --batch-size 1.",
+    ),
     backend: str = typer.Option("vllm", help="The backend to use for the model."),
     skip_server_setup: bool = typer.Option(
         False,
@@ -159,9 +197,17 @@ def generate(
         temperature=temperature,
         include_input_log=include_input_log,
         exclude_state_log=exclude_state_log,
+        external_inference_log=external_inference_log,
         num_gpus=num_gpus,
+        num_replicas=num_replicas,
         num_threads=num_threads,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
         gpu_memory_utilization=gpu_memory_utilization,
+        batch_size=batch_size,
+        batch_window=batch_window,
+        order_by_prefix=order_by_prefix,
+        server_prompt_token_count=server_prompt_token_count,
         backend=backend,
         skip_server_setup=skip_server_setup,
         local_model_path=local_model_path,
@@ -170,6 +216,9 @@ def generate(
         run_ids=run_ids,
     )
     load_dotenv(dotenv_path=DOTENV_PATH, verbose=True, override=True)  # Load the .env file
+    # Imported here, so that the other commands do not pay for the generation pipeline imports
+    from bfcl._llm_response_generation import main as generation_main
+
     generation_main(args)
 
 
@@ -251,13 +300,27 @@ def evaluate(
         "--score-dir",
         help="Relative path to the evaluation score folder, if different from the default; Path should be relative to the `berkeley-function-call-leaderboard` root folder",
     ),
+    num_workers: int = typer.Option(
+        1,
+        help="The number of worker processes to evaluate with; 1 evaluates sequentially in the current process.",
+    ),
+    cache_ground_truth: bool = typer.Option(
+        False,
+        "--cache-ground-truth",
+        help="Cache the executed ground truth of the multi-turn entries in the user cache folder (`~/.cache/bfcl/`), and reuse it across models and runs.",
+    ),
 ):
     """
     Evaluate results from run of one or more models on a test-category (same as eval_runner.py).
     """
 
     load_dotenv(dotenv_path=DOTENV_PATH, verbose=True, override=True)  # Load the .env file
-    evaluation_main(model, test_category, result_dir, score_dir)
+    # Imported here, so that the other commands do not pay for the evaluation pipeline imports (pandas, numpy)
+    from bfcl.eval_checker.eval_runner import main as evaluation_main
+
+    evaluation_main(
+        model, test_category, result_dir, score_dir, num_workers, cache_ground_truth
+    )
 
 
 @cli.command()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# Every BFCL dataset and result file writes the `id` first; other layouts fall back to decoding the whole line
+_LEADING_ID_PATTERN = re.compile(rb'\s*\{\s*"id"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class IndexedJsonlFile:
+    """
+    An index of the byte range and the id of every entry of a JSONL file.
+
+    Building the index only scans the file for line breaks and reads the leading `id` of each line, so the
+    number of entries, the ids, and the lookup of an entry by id do not need to decode any entry. Only the
+    index is kept in memory: entries are read from the file and decoded on access, and every access returns a
+    freshly decoded object, because callers are free to modify the entries they get.
+    """
+
+    def __init__(self, file_path: Path):
+        self.file_path = Path(file_path)
+        self._line_ranges = []
+        self.ids = []
+
+        # The file is opened for each read rather than memory-mapped, so no file descriptor is held open, and a
+        # result file that is rewritten in place can never be read (or fault) through a stale mapping
+        data, self.signature = self._read_file()
+
+        start = 0
+        data_length = len(data)
+        while start < data_length:
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = data_length
+            if data[start:end].strip():
+                self._line_ranges.append((start, end))
+                self.ids.append(_read_id(data, start, end))
+            start = end + 1
+
+        self.id_to_index = {
+            test_id: i for i, test_id in enumerate(self.ids) if test_id is not None
+        }
+        self._sorted_indices = None
+        self._digests = {}
+
+    def _read_file(self, start: int = 0, length: Optional[int] = None) -> tuple[bytes, tuple]:
+        """
+        Read `length` bytes from offset `start` (the whole file by default), with the signature of the file
+        that was read.
+        """
+        fd = os.open(self.file_path, os.O_RDONLY)
+        try:
+            stat = os.fstat(fd)
+            if length is None:
+                length = stat.st_size - start
+            chunks = []
+            while length > 0:
+                chunk = os.pread(fd, length, start)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                start += len(chunk)
+                length -= len(chunk)
+            return b"".join(chunks), _signature_of(stat)
+        finally:
+            os.close(fd)
+
+    def _read_indexed_file(self, start: int = 0, length: Optional[int] = None) -> bytes:
+        data, signature = self._read_file(start, length)
+        if signature != self.signature:
+            raise RuntimeError(
+                f"{self.file_path} changed since it was indexed. Open it again with `open_jsonl`."
+            )
+        return data
+
+    def __len__(self) -> int:
+        return len(self._line_ranges)
+
+    def raw(self, index: int) -> bytes:
+        start, end = self._line_ranges[index]
+        return self._read_indexed_file(start, end - start)
+
+    def entry(self, index: int) -> dict:
+        return json.loads(self.raw(index))
+
+    def get(self, test_id: str) -> Optional[dict]:
+        index = self.id_to_index.get(test_id)
+        if index is None:
+            return None
+        return self.entry(index)
+
+    def digest(self, index: int) -> str:
+        """
+        A content hash of the entry, computed from its raw bytes without decoding it.
+        """
+        if index not in self._digests:
+            self._digests[index] = hashlib.sha256(self.raw(index)).hexdigest()
+        return self._digests[index]
+
+    def sorted_indices(self) -> list[int]:
+        if self._sorted_indices is None:
+            # Imported here, as `bfcl.utils` imports this module
+            from bfcl.utils import sort_key
+
+            self._sorted_indices = sorted(
+                range(len(self.ids)), key=lambda i: sort_key({"id": self.ids[i]})
+            )
+        return self._sorted_indices
+
+    def load(self, sort_by_id: bool = False) -> "JsonlEntries":
+        indices = self.sorted_indices() if sort_by_id else range(len(self))
+        # Read the whole file once, rather than once per entry; the bytes are dropped once decoded
+        data = self._read_indexed_file()
+        entries, digests = [], []
+        for i in indices:
+            start, end = self._line_ranges[i]
+            raw = data[start:end]
+            if i not in self._digests:
+                self._digests[i] = hashlib.sha256(raw).hexdigest()
+            entries.append(json.loads(raw))
+            digests.append(self._digests[i])
+        return JsonlEntries(entries, digests)
+
+
+class JsonlEntries(list):
+    """
+    The decoded entries of a JSONL file, with the content hash of each entry in `digests` (same order).
+    """
+
+    def __init__(self, entries: list[dict], digests: list[str]):
+        super().__init__(entries)
+        self.digests = digests
+
+
+def _read_id(data: bytes, start: int, end: int) -> Optional[str]:
+    # The id prefix is short, so only look at the beginning of the line
+    match = _LEADING_ID_PATTERN.match(data, start, min(end, start + 512))
+    if match is not None:
+        return json.loads(b'"' + match.group(1) + b'"')
+    # Some files, such as the multi-turn function docs, have no `id` at all
+    return json.loads(data[start:end]).get("id")
+
+
+def _signature_of(stat: os.stat_result) -> tuple:
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _file_signature(file_path: Path) -> tuple:
+    return _signature_of(os.stat(file_path))
+
+
+# Indexed files by resolved path, least recently used first. Dataset files are opened by both generation and
+# evaluation, and by every model; result files are rewritten in place (see `compact_journal`), so an index is
+# rebuilt whenever the file's modification time, size or inode changed since it was built. An index only holds the
+# byte ranges, ids and digests of the entries, and the cache is bounded, as a multi-model run opens hundreds of
+# result files that are each read only once or twice.
+_MAX_INDEXED_FILES = 64
+_INDEXED_FILES: "OrderedDict[Path, IndexedJsonlFile]" = OrderedDict()
+_INDEXED_FILES_LOCK = threading.Lock()
+
+
+def open_jsonl(file_path) -> IndexedJsonlFile:
+    file_path = Path(file_path).resolve()
+    signature = _file_signature(file_path)
+    with _INDEXED_FILES_LOCK:
+        indexed_file = _INDEXED_FILES.get(file_path)
+        if indexed_file is None or indexed_file.signature != signature:
+            indexed_file = IndexedJsonlFile(file_path)
+            _INDEXED_FILES[file_path] = indexed_file
+        _INDEXED_FILES.move_to_end(file_path)
+        while len(_INDEXED_FILES) > _MAX_INDEXED_FILES:
+            _INDEXED_FILES.popitem(last=False)
+        return indexed_file
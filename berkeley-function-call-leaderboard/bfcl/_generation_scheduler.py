@@ -0,0 +1,336 @@
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from typing import Callable, Optional
+
+from bfcl.model_handler.utils import set_backoff_callback
+
+RETRY_LIMIT = 3
+# 60s for the timer to complete. But often we find that even with 60 there is a conflict. So 65 is a safe no.
+RETRY_DELAY = 65  # Delay in seconds
+
+# Rough characters-per-token ratio, only used to reserve token budget before a request is sent.
+# The reservation is reconciled with the actual token count reported by the handler afterwards.
+CHARS_PER_TOKEN_ESTIMATE = 4
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    """
+    Whether the provider rejected the request because of its load, which is what shrinks the concurrency limit.
+    """
+    message = str(e).lower()
+    return (
+        "rate limit reached" in message
+        # eg, the ThrottlingException of AWS Bedrock
+        or "throttlingexception" in message
+        or getattr(e, "status_code", None) == 429
+        # The Google SDKs expose the HTTP status as `code`
+        or getattr(e, "code", None) == 429
+    )
+
+
+def is_retryable_error(e: Exception) -> bool:
+    """
+    Whether the test case is worth retrying after a delay: a rate limit, or a transient server error.
+    """
+    return is_rate_limit_error(e) or getattr(e, "status_code", None) in {500, 503}
+
+
+def _get_retry_after(e: Exception) -> Optional[float]:
+    """
+    Read the `retry-after` header from the provider response, if the SDK exposes it.
+    """
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _flatten(value) -> list:
+    # Multi-turn entries report nested lists (per turn, per step); single-turn entries report a scalar
+    if isinstance(value, list):
+        flat = []
+        for item in value:
+            flat.extend(_flatten(item))
+        return flat
+    return [value]
+
+
+class PerMinuteBudget:
+    """
+    A token bucket that refills `limit` units every 60 seconds.
+
+    The bucket level is allowed to go negative when a reservation is reconciled with a larger actual usage;
+    later callers then wait until the debt is paid off. The state is plain numbers (no event-loop bound
+    primitives), so the same budget can be shared by consecutive `asyncio.run` calls for the same provider.
+    """
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self._level = float(limit) if limit else 0.0
+        self._last_refill = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(
+            float(self.limit), self._level + (now - self._last_refill) * self.limit / 60
+        )
+        self._last_refill = now
+
+    async def acquire(self, amount: float) -> None:
+        if not self.limit:
+            return
+        # A single request larger than the whole budget would otherwise wait forever
+        amount = min(amount, self.limit)
+        while True:
+            self._refill()
+            if self._level >= amount:
+                self._level -= amount
+                return
+            await asyncio.sleep((amount - self._level) * 60 / self.limit)
+
+    def adjust(self, delta: float) -> None:
+        """
+        Charge (positive delta) or refund (negative delta) the bucket after the actual usage is known.
+        """
+        if not self.limit:
+            return
+        self._refill()
+        self._level = min(float(self.limit), self._level - delta)
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    AIMD concurrency control: the number of in-flight requests is halved on a rate-limit error and grows
+    back by one after a full window of successful requests, never exceeding `max_limit`.
+    Rate-limit errors that arrive within `decrease_cooldown` seconds of the last decrease are treated as part
+    of the same burst, so a batch of requests rejected together only halves the limit once.
+    """
+
+    def __init__(self, max_limit: int, decrease_cooldown: float = 5):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.decrease_cooldown = decrease_cooldown
+        self._in_flight = 0
+        self._success_streak = 0
+        self._last_decrease = float("-inf")
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        # Created lazily so that it binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> None:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self) -> None:
+        async with self.condition:
+            self._in_flight -= 1
+            self.condition.notify_all()
+
+    def on_success(self) -> None:
+        self._success_streak += 1
+        if self._success_streak >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._success_streak = 0
+
+    def on_rate_limited(self) -> None:
+        self._success_streak = 0
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        new_limit = max(1, self.limit // 2)
+        if new_limit < self.limit:
+            print(f"⏬ Rate limited, reducing concurrency from {self.limit} to {new_limit}.")
+            self.limit = new_limit
+
+
+class ProviderRateLimiter:
+    """
+    Request and token budgets for one provider (keyed by the handler's `ModelStyle`).
+    """
+
+    def __init__(
+        self, requests_per_minute: Optional[int], tokens_per_minute: Optional[int]
+    ):
+        self.request_budget = PerMinuteBudget(requests_per_minute)
+        self.token_budget = PerMinuteBudget(tokens_per_minute)
+
+
+# Budgets outlive a single `generate_results` call, so consecutive models served by the same provider
+# share the same per-minute quota.
+_PROVIDER_RATE_LIMITERS: dict[tuple, ProviderRateLimiter] = {}
+
+
+def get_provider_rate_limiter(
+    model_style, requests_per_minute: Optional[int], tokens_per_minute: Optional[int]
+) -> ProviderRateLimiter:
+    key = (model_style, requests_per_minute, tokens_per_minute)
+    if key not in _PROVIDER_RATE_LIMITERS:
+        _PROVIDER_RATE_LIMITERS[key] = ProviderRateLimiter(
+            requests_per_minute, tokens_per_minute
+        )
+    return _PROVIDER_RATE_LIMITERS[key]
+
+
+def estimate_token_count(test_case: dict) -> int:
+    text_length = len(json.dumps(test_case["question"])) + len(
+        json.dumps(test_case["function"])
+    )
+    return max(1, text_length // CHARS_PER_TOKEN_ESTIMATE)
+
+
+class InferenceScheduler:
+    """
+    Schedules blocking `handler.inference` calls on a thread pool from an asyncio event loop.
+
+    Admission of each test case is gated by the provider's requests-per-minute and tokens-per-minute budgets
+    and by an AIMD concurrency limit (capped at `num_threads`). A rate-limited test case backs off with
+    `asyncio.sleep`, so it holds neither a worker thread nor a concurrency slot while waiting, and the other
+    test cases keep going.
+    """
+
+    def __init__(
+        self,
+        handler,
+        num_threads: int,
+        include_input_log: bool,
+        exclude_state_log: bool,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.handler = handler
+        self.num_threads = num_threads
+        self.include_input_log = include_input_log
+        self.exclude_state_log = exclude_state_log
+        self.rate_limiter = get_provider_rate_limiter(
+            handler.model_style, requests_per_minute, tokens_per_minute
+        )
+        self.concurrency = AdaptiveConcurrencyLimit(num_threads)
+
+    def run(self, test_cases: list[dict], on_result: Callable[[dict], None]) -> None:
+        """
+        Run inference on all test cases. `on_result` is called from the calling thread as soon as each test
+        case finishes, so results come back in completion order rather than in the order of `test_cases`.
+        """
+        asyncio.run(self._run_all(test_cases, on_result))
+
+    async def _run_all(
+        self, test_cases: list[dict], on_result: Callable[[dict], None]
+    ) -> None:
+        self._loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            self._executor = executor
+            tasks = [
+                asyncio.create_task(self._run_one(test_case)) for test_case in test_cases
+            ]
+            for task in asyncio.as_completed(tasks):
+                on_result(await task)
+
+    def _on_handler_backoff(self, retry_state) -> None:
+        # Called from a worker thread when a handler's own `retry_with_backoff` decorator hits an error. Some
+        # handlers also retry on errors that say nothing about the load (eg, an invalid JSON response), which must
+        # not shrink the concurrency limit.
+        if is_rate_limit_error(retry_state.outcome.exception()):
+            self._loop.call_soon_threadsafe(self.concurrency.on_rate_limited)
+
+    def _inference_in_thread(self, test_case: dict):
+        set_backoff_callback(self._on_handler_backoff)
+        try:
+            return self.handler.inference(
+                deepcopy(test_case), self.include_input_log, self.exclude_state_log
+            )
+        finally:
+            set_backoff_callback(None)
+
+    async def _run_one(self, test_case: dict) -> dict:
+        assert type(test_case["function"]) is list
+
+        estimated_tokens = estimate_token_count(test_case)
+        retry_count = 0
+
+        while True:
+            await self.rate_limiter.request_budget.acquire(1)
+            await self.rate_limiter.token_budget.acquire(estimated_tokens)
+            await self.concurrency.acquire()
+            try:
+                result, metadata = await self._loop.run_in_executor(
+                    self._executor, self._inference_in_thread, test_case
+                )
+            except Exception as e:
+                await self.concurrency.release()
+                # TODO: It might be better to handle the exception in the handler itself rather than a universal catch block here, as each handler use different ways to call the endpoint.
+                # OpenAI has openai.RateLimitError while Anthropic has anthropic.RateLimitError. It would be more robust in the long run.
+                if retry_count < RETRY_LIMIT and is_retryable_error(e):
+                    # A server error says nothing about the load, so it is retried without shrinking the limit
+                    if is_rate_limit_error(e):
+                        self.concurrency.on_rate_limited()
+                        reason = "Rate limit reached"
+                    else:
+                        reason = "Server error"
+                    delay = _get_retry_after(e) or RETRY_DELAY
+                    # Jitter so that the requests rejected together do not come back together
+                    delay += random.uniform(0, delay / 10)
+                    print(
+                        f"{reason}. Backing off {test_case['id']} for {delay:.0f} seconds. Retry {retry_count + 1}/{RETRY_LIMIT}"
+                    )
+                    await asyncio.sleep(delay)
+                    retry_count += 1
+                    continue
+
+                # This is usually the case when the model getting stuck on one particular test case.
+                # For example, timeout error or FC model returning invalid JSON response.
+                # Since temperature is already set to 0.001, retrying the same test case will not help.
+                # So we continue the generation process and record the error message as the model response
+                print("-" * 100)
+                print(
+                    "❗️❗️ Error occurred during inference. Maximum reties reached for rate limit or other error. Continuing to next test case."
+                )
+                print(f"❗️❗️ Test case ID: {test_case['id']}, Error: {str(e)}")
+                print("-" * 100)
+
+                return {
+                    "id": test_case["id"],
+                    "result": f"Error during inference: {str(e)}",
+                }
+
+            await self.concurrency.release()
+            self.concurrency.on_success()
+            self._reconcile_budgets(metadata, estimated_tokens)
+            break
+
+        result_to_write = {
+            "id": test_case["id"],
+            "result": result,
+        }
+
+        result_to_write.update(metadata)
+
+        return result_to_write
+
+    def _reconcile_budgets(self, metadata: dict, estimated_tokens: int) -> None:
+        # A multi-turn entry makes one request per step; only the first one was reserved up front
+        request_count = len(_flatten(metadata.get("latency", 0)))
+        actual_tokens = sum(
+            count
+            for count in _flatten(metadata.get("input_token_count", 0))
+            + _flatten(metadata.get("output_token_count", 0))
+            if isinstance(count, (int, float))
+        )
+        self.rate_limiter.request_budget.adjust(request_count - 1)
+        if actual_tokens:
+            self.rate_limiter.token_budget.adjust(actual_tokens - estimated_tokens)
+
@@ -1,50 +1,82 @@
+import importlib
 from dataclasses import dataclass
 from typing import Optional
 
-from bfcl.model_handler.api_inference.claude import ClaudeHandler
-from bfcl.model_handler.api_inference.cohere import CohereHandler
-from bfcl.model_handler.api_inference.databricks import DatabricksHandler
-from bfcl.model_handler.api_inference.deepseek import DeepSeekAPIHandler
-from bfcl.model_handler.api_inference.fireworks import FireworksHandler
-from bfcl.model_handler.api_inference.functionary import FunctionaryHandler
-from bfcl.model_handler.api_inference.gemini import create_gemini_handler
-from bfcl.model_handler.api_inference.gogoagent import GoGoAgentHandler
-from bfcl.model_handler.api_inference.gorilla import GorillaHandler
-from bfcl.model_handler.api_inference.grok import GrokHandler
-from bfcl.model_handler.api_inference.mining import MiningHandler
-from bfcl.model_handler.api_inference.mistral import MistralHandler
-from bfcl.model_handler.api_inference.nexus import NexusHandler
-from bfcl.model_handler.api_inference.nova import NovaHandler
-from bfcl.model_handler.api_inference.novita import NovitaHandler
-from bfcl.model_handler.api_inference.nvidia import NvidiaHandler
-from bfcl.model_handler.api_inference.openai import OpenAIHandler
-from bfcl.model_handler.api_inference.writer import WriterHandler
-from bfcl.model_handler.api_inference.yi import YiHandler
-from bfcl.model_handler.local_inference.bielik import BielikHandler
-from bfcl.model_handler.local_inference.deepseek import DeepseekHandler
-from bfcl.model_handler.local_inference.deepseek_coder import DeepseekCoderHandler
-from bfcl.model_handler.local_inference.deepseek_reasoning import DeepseekReasoningHandler
-from bfcl.model_handler.local_inference.falcon_fc import Falcon3FCHandler
-from bfcl.model_handler.local_inference.gemma import GemmaHandler
-from bfcl.model_handler.local_inference.glaive import GlaiveHandler
-from bfcl.model_handler.local_inference.glm import GLMHandler
-from bfcl.model_handler.local_inference.granite import GraniteHandler
-from bfcl.model_handler.local_inference.hammer import HammerHandler
-from bfcl.model_handler.local_inference.hermes import HermesHandler
-from bfcl.model_handler.local_inference.llama import LlamaHandler
-from bfcl.model_handler.local_inference.llama_3_1 import LlamaHandler_3_1
-from bfcl.model_handler.local_inference.minicpm import MiniCPMHandler
-from bfcl.model_handler.local_inference.minicpm_fc import MiniCPMFCHandler
-from bfcl.model_handler.local_inference.mistral_fc import MistralFCHandler
-from bfcl.model_handler.local_inference.phi import PhiHandler
-from bfcl.model_handler.local_inference.phi_fc import PhiFCHandler
-from bfcl.model_handler.local_inference.quick_testing_oss import QuickTestingOSSHandler
-from bfcl.model_handler.local_inference.qwen import QwenHandler
-from bfcl.model_handler.local_inference.qwen_fc import QwenFCHandler
-from bfcl.model_handler.local_inference.salesforce_llama import SalesforceLlamaHandler
-from bfcl.model_handler.local_inference.salesforce_qwen import SalesforceQwenHandler
-from bfcl.model_handler.local_inference.think_agent import ThinkAgentHandler
-from bfcl.model_handler.api_inference.qwq import QwenAPIHandler
+
+class LazyHandler:
+    """
+    A reference to a model handler (a handler class, or a factory function such as `create_gemini_handler`),
+    given by its module path and attribute name.
+
+    The module is only imported the first time the handler is used, so listing models, scoring, or evaluating
+    a single model does not import (or require) the SDKs of every other provider.
+    Calling a `LazyHandler` calls the handler it refers to, so `config.model_handler(model_name, temperature)`
+    works the same as with the handler itself.
+    """
+
+    def __init__(self, module_path: str, attribute_name: str):
+        self.module_path = module_path
+        self.attribute_name = attribute_name
+        self._handler = None
+
+    def resolve(self):
+        if self._handler is None:
+            module = importlib.import_module(self.module_path)
+            self._handler = getattr(module, self.attribute_name)
+        return self._handler
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"LazyHandler({self.module_path}.{self.attribute_name})"
+
+
+ClaudeHandler = LazyHandler("bfcl.model_handler.api_inference.claude", "ClaudeHandler")
+CohereHandler = LazyHandler("bfcl.model_handler.api_inference.cohere", "CohereHandler")
+DatabricksHandler = LazyHandler("bfcl.model_handler.api_inference.databricks", "DatabricksHandler")
+DeepSeekAPIHandler = LazyHandler("bfcl.model_handler.api_inference.deepseek", "DeepSeekAPIHandler")
+FireworksHandler = LazyHandler("bfcl.model_handler.api_inference.fireworks", "FireworksHandler")
+FunctionaryHandler = LazyHandler("bfcl.model_handler.api_inference.functionary", "FunctionaryHandler")
+create_gemini_handler = LazyHandler("bfcl.model_handler.api_inference.gemini", "create_gemini_handler")
+GoGoAgentHandler = LazyHandler("bfcl.model_handler.api_inference.gogoagent", "GoGoAgentHandler")
+GorillaHandler = LazyHandler("bfcl.model_handler.api_inference.gorilla", "GorillaHandler")
+GrokHandler = LazyHandler("bfcl.model_handler.api_inference.grok", "GrokHandler")
+MiningHandler = LazyHandler("bfcl.model_handler.api_inference.mining", "MiningHandler")
+MistralHandler = LazyHandler("bfcl.model_handler.api_inference.mistral", "MistralHandler")
+NexusHandler = LazyHandler("bfcl.model_handler.api_inference.nexus", "NexusHandler")
+NovaHandler = LazyHandler("bfcl.model_handler.api_inference.nova", "NovaHandler")
+NovitaHandler = LazyHandler("bfcl.model_handler.api_inference.novita", "NovitaHandler")
+NvidiaHandler = LazyHandler("bfcl.model_handler.api_inference.nvidia", "NvidiaHandler")
+OpenAIHandler = LazyHandler("bfcl.model_handler.api_inference.openai", "OpenAIHandler")
+WriterHandler = LazyHandler("bfcl.model_handler.api_inference.writer", "WriterHandler")
+YiHandler = LazyHandler("bfcl.model_handler.api_inference.yi", "YiHandler")
+BielikHandler = LazyHandler("bfcl.model_handler.local_inference.bielik", "BielikHandler")
+DeepseekHandler = LazyHandler("bfcl.model_handler.local_inference.deepseek", "DeepseekHandler")
+DeepseekCoderHandler = LazyHandler("bfcl.model_handler.local_inference.deepseek_coder", "DeepseekCoderHandler")
+DeepseekReasoningHandler = LazyHandler("bfcl.model_handler.local_inference.deepseek_reasoning", "DeepseekReasoningHandler")
+Falcon3FCHandler = LazyHandler("bfcl.model_handler.local_inference.falcon_fc", "Falcon3FCHandler")
+GemmaHandler = LazyHandler("bfcl.model_handler.local_inference.gemma", "GemmaHandler")
+GlaiveHandler = LazyHandler("bfcl.model_handler.local_inference.glaive", "GlaiveHandler")
+GLMHandler = LazyHandler("bfcl.model_handler.local_inference.glm", "GLMHandler")
+GraniteHandler = LazyHandler("bfcl.model_handler.local_inference.granite", "GraniteHandler")
+HammerHandler = LazyHandler("bfcl.model_handler.local_inference.hammer", "HammerHandler")
+HermesHandler = LazyHandler("bfcl.model_handler.local_inference.hermes", "HermesHandler")
+LlamaHandler = LazyHandler("bfcl.model_handler.local_inference.llama", "LlamaHandler")
+LlamaHandler_3_1 = LazyHandler("bfcl.model_handler.local_inference.llama_3_1", "LlamaHandler_3_1")
+MiniCPMHandler = LazyHandler("bfcl.model_handler.local_inference.minicpm", "MiniCPMHandler")
+MiniCPMFCHandler = LazyHandler("bfcl.model_handler.local_inference.minicpm_fc", "MiniCPMFCHandler")
+MistralFCHandler = LazyHandler("bfcl.model_handler.local_inference.mistral_fc", "MistralFCHandler")
+PhiHandler = LazyHandler("bfcl.model_handler.local_inference.phi", "PhiHandler")
+PhiFCHandler = LazyHandler("bfcl.model_handler.local_inference.phi_fc", "PhiFCHandler")
+QuickTestingOSSHandler = LazyHandler("bfcl.model_handler.local_inference.quick_testing_oss", "QuickTestingOSSHandler")
+QwenHandler = LazyHandler("bfcl.model_handler.local_inference.qwen", "QwenHandler")
+QwenFCHandler = LazyHandler("bfcl.model_handler.local_inference.qwen_fc", "QwenFCHandler")
+SalesforceLlamaHandler = LazyHandler("bfcl.model_handler.local_inference.salesforce_llama", "SalesforceLlamaHandler")
+SalesforceQwenHandler = LazyHandler("bfcl.model_handler.local_inference.salesforce_qwen", "SalesforceQwenHandler")
+ThinkAgentHandler = LazyHandler("bfcl.model_handler.local_inference.think_agent", "ThinkAgentHandler")
+QwenAPIHandler = LazyHandler("bfcl.model_handler.api_inference.qwq", "QwenAPIHandler")
+
 
 # -----------------------------------------------------------------------------
 # A mapping of model identifiers to their respective model configurations.
@@ -65,7 +97,7 @@ class ModelConfig:
         url (str): Reference URL for the model or hosting service.
         org (str): Organization providing the model.
         license (str): License under which the model is released.
-        model_handler (str): Handler name for invoking the model.
+        model_handler (LazyHandler): Handler for invoking the model; imported on first use.
         input_price (Optional[float]): USD per million input tokens (None for open source models).
         output_price (Optional[float]): USD per million output tokens (None for open source models).
         is_fc_model (bool): True if this model is used in Function-Calling mode, otherwise False for Prompt-based mode.
@@ -79,7 +111,7 @@ class ModelConfig:
     org: str
     license: str
 
-    model_handler: str
+    model_handler: LazyHandler
 
     # Prices are in USD per million tokens; open source models have None
     input_price: Optional[float] = None
@@ -25,19 +25,48 @@ PYTHON_NESTED_TYPE_CHECK_LIST = ["array", "tuple"]
 
 NESTED_CONVERSION_TYPE_LIST = ["Array", "ArrayList", "array"]
 
+# Checker plans by (checker plan key, language), where the key identifies the test entry and the content of its
+# function docs and possible answers. A test entry has the same plan for every model, so it is compiled once per
+# evaluation run and reused when evaluating the other models.
+_CHECKER_PLANS = {}
+
+
+def reset_checker_plans():
+    """
+    Drop the checker plans compiled so far. Called at the start of every evaluation run, so the plans do not
+    accumulate across runs in the same process.
+    """
+    _CHECKER_PLANS.clear()
+
 
 #### Main function ####
 def ast_checker(
-    func_description, model_output, possible_answer, language, test_category, model_name
+    func_description,
+    model_output,
+    possible_answer,
+    language,
+    test_category,
+    model_name,
+    checker_plan_key=None,
 ):
+    if checker_plan_key is None:
+        plan = compile_checker_plan(func_description, possible_answer)
+    else:
+        plan_key = (checker_plan_key, language)
+        if plan_key not in _CHECKER_PLANS:
+            _CHECKER_PLANS[plan_key] = compile_checker_plan(
+                func_description, possible_answer
+            )
+        plan = _CHECKER_PLANS[plan_key]
+
     if "parallel" in test_category:
         return parallel_function_checker_no_order(
-            func_description, model_output, possible_answer, language, model_name
+            func_description, model_output, possible_answer, language, model_name, plan
         )
         
     elif "multiple" in test_category:
         return multiple_function_checker(
-            func_description, model_output, possible_answer, language, model_name
+            func_description, model_output, possible_answer, language, model_name, plan
         )
         
     else:
@@ -49,10 +78,46 @@ def ast_checker(
             }
 
         return simple_function_checker(
-            func_description[0], model_output[0], possible_answer[0], language, model_name
+            func_description[0],
+            model_output[0],
+            possible_answer[0],
+            language,
+            model_name,
+            plan["answers"][0],
         )
 
 
+def compile_checker_plan(func_descriptions, possible_answers: list) -> dict:
+    """
+    Compile the parts of the checking work that only depend on the test entry, not on the model output:
+    a name-indexed lookup of the function docs, and (lazily, per parameter) the standardized form of every
+    possible answer. `possible_answers` is a list of `{function_name: {param: [possible values]}}`.
+    """
+    func_descriptions_by_name = {}
+    if type(func_descriptions) == list:
+        for func_description in func_descriptions:
+            # Keep the first one, as `find_description` does
+            func_descriptions_by_name.setdefault(func_description["name"], func_description)
+
+    return {
+        "func_descriptions": func_descriptions,
+        "func_descriptions_by_name": func_descriptions_by_name,
+        # One answer plan per possible answer; each maps a parameter name to its standardized possible values
+        "answers": [
+            {"strings": {}, "lists": {}, "dict_values": {}, "list_dict_values": {}}
+            for _ in possible_answers
+        ],
+    }
+
+
+def find_description_in_plan(plan: dict, name):
+    if type(plan["func_descriptions"]) == list:
+        return plan["func_descriptions_by_name"].get(name)
+    else:
+        # it is a dict, there is only one function
+        return plan["func_descriptions"]
+
+
 #### Helper functions for AST ####
 def find_description(func_descriptions, name):
     if type(func_descriptions) == list:
@@ -172,12 +237,47 @@ def standardize_string(input_string: str):
     return re.sub(regex_string, "", input_string).lower().replace("'", '"')
 
 
-def string_checker(param: str, model_output: str, possible_answer: list):
+def standardize_possible_answer_strings(possible_answer: list) -> frozenset:
+    return frozenset(
+        standardize_string(possible_answer_item)
+        for possible_answer_item in possible_answer
+        if type(possible_answer_item) == str
+    )
+
+
+def standardize_possible_answer_lists(possible_answer: list) -> list:
     standardize_possible_answer = []
-    standardize_model_output = standardize_string(model_output)
     for i in range(len(possible_answer)):
-        if type(possible_answer[i]) == str:
-            standardize_possible_answer.append(standardize_string(possible_answer[i]))
+        standardize_possible_answer.append([])
+        for j in range(len(possible_answer[i])):
+            if type(possible_answer[i][j]) == str:
+                standardize_possible_answer[i].append(
+                    standardize_string(possible_answer[i][j])
+                )
+            else:
+                standardize_possible_answer[i].append(possible_answer[i][j])
+    return standardize_possible_answer
+
+
+def standardize_possible_answer_values(possible_answer_values: list) -> list:
+    standardize_possible_answer = []
+    for possible_answer_value in possible_answer_values:
+        if type(possible_answer_value) == str:
+            standardize_possible_answer.append(standardize_string(possible_answer_value))
+        else:
+            standardize_possible_answer.append(possible_answer_value)
+    return standardize_possible_answer
+
+
+def string_checker(
+    param: str,
+    model_output: str,
+    possible_answer: list,
+    standardize_possible_answer: frozenset = None,
+):
+    standardize_model_output = standardize_string(model_output)
+    if standardize_possible_answer is None:
+        standardize_possible_answer = standardize_possible_answer_strings(possible_answer)
 
     if standardize_model_output not in standardize_possible_answer:
         return {
@@ -191,7 +291,12 @@ def string_checker(param: str, model_output: str, possible_answer: list):
     return {"valid": True, "error": []}
 
 
-def list_checker(param: str, model_output: list, possible_answer: list):
+def list_checker(
+    param: str,
+    model_output: list,
+    possible_answer: list,
+    standardize_possible_answer: list = None,
+):
     # Convert the tuple to a list
 
     standardize_model_output = list(model_output)
@@ -201,17 +306,9 @@ def list_checker(param: str, model_output: list, possible_answer: list):
         if type(standardize_model_output[i]) == str:
             standardize_model_output[i] = standardize_string(model_output[i])
 
-    standardize_possible_answer = []
     # We also need to standardize the possible answers
-    for i in range(len(possible_answer)):
-        standardize_possible_answer.append([])
-        for j in range(len(possible_answer[i])):
-            if type(possible_answer[i][j]) == str:
-                standardize_possible_answer[i].append(
-                    standardize_string(possible_answer[i][j])
-                )
-            else:
-                standardize_possible_answer[i].append(possible_answer[i][j])
+    if standardize_possible_answer is None:
+        standardize_possible_answer = standardize_possible_answer_lists(possible_answer)
 
     if standardize_model_output not in standardize_possible_answer:
         return {
@@ -225,9 +322,17 @@ def list_checker(param: str, model_output: list, possible_answer: list):
     return {"valid": True, "error": []}
 
 
-def dict_checker(param: str, model_output: dict, possible_answers: list):
+def dict_checker(
+    param: str,
+    model_output: dict,
+    possible_answers: list,
+    standardized_values: dict = None,
+):
     # This function works for simple dictionaries, but not dictionaries with nested dictionaries.
     # The current dataset only contains simple dictionaries, so this is sufficient.
+    # `standardized_values` memoizes the standardized possible values, keyed by (possible answer index, dict key)
+    if standardized_values is None:
+        standardized_values = {}
 
     result = {"valid": False, "error": [], "error_type": "dict_checker:unclear"}
     for i in range(len(possible_answers)):
@@ -256,14 +361,11 @@ def dict_checker(param: str, model_output: dict, possible_answers: list):
                 standardize_value = standardize_string(value)
                 
             # We also need to standardize the possible answers if they are string
-            standardize_possible_answer = []
-            for i in range(len(possible_answer[key])):
-                if type(possible_answer[key][i]) == str:
-                    standardize_possible_answer.append(
-                        standardize_string(possible_answer[key][i])
-                    )
-                else:
-                    standardize_possible_answer.append(possible_answer[key][i])
+            if (i, key) not in standardized_values:
+                standardized_values[(i, key)] = standardize_possible_answer_values(
+                    possible_answer[key]
+                )
+            standardize_possible_answer = standardized_values[(i, key)]
 
             if standardize_value not in standardize_possible_answer:
                 result["valid"] = False
@@ -288,10 +390,19 @@ def dict_checker(param: str, model_output: dict, possible_answers: list):
     return result
 
 
-def list_dict_checker(param: str, model_output: list, possible_answers: list):
+def list_dict_checker(
+    param: str,
+    model_output: list,
+    possible_answers: list,
+    standardized_values: dict = None,
+):
     # This function takes in a list of dictionaries and checks if each dictionary is valid
     # The order of the dictionaries in the list must match the order of the possible answers
 
+    # `standardized_values` memoizes the standardized possible values, keyed by (answer index, dict index)
+    if standardized_values is None:
+        standardized_values = {}
+
     result = {"valid": False, "error": [], "error_type": "list_dict_checker:unclear"}
 
     for answer_index in range(len(possible_answers)):
@@ -310,6 +421,7 @@ def list_dict_checker(param: str, model_output: list, possible_answers: list):
                 param,
                 model_output[dict_index],
                 [possible_answers[answer_index][dict_index]],
+                standardized_values.setdefault((answer_index, dict_index), {}),
             )
             if not result["valid"]:
                 flag = False
@@ -326,8 +438,12 @@ def simple_function_checker(
     possible_answer: dict,
     language: str,
     model_name: str,
+    answer_plan: dict = None,
 ):
     possible_answer = list(possible_answer.values())[0]
+    if answer_plan is None:
+        # Standardized possible values are then only reused within this call
+        answer_plan = {"strings": {}, "lists": {}, "dict_values": {}, "list_dict_values": {}}
     # Extract function name and parameters details
     func_name = func_description["name"]
     param_details = func_description["parameters"]["properties"]
@@ -456,14 +572,24 @@ def simple_function_checker(
         if not is_variable:
             # Special handle for dictionaries
             if expected_type_converted == dict:
-                result = dict_checker(param, value, possible_answer[param])
+                result = dict_checker(
+                    param,
+                    value,
+                    possible_answer[param],
+                    answer_plan["dict_values"].setdefault(param, {}),
+                )
                 if not result["valid"]:
                     return result
                 continue
 
             # Special handle for list of dictionaries
             elif expected_type_converted == list and nested_type_converted == dict:
-                result = list_dict_checker(param, value, possible_answer[param])
+                result = list_dict_checker(
+                    param,
+                    value,
+                    possible_answer[param],
+                    answer_plan["list_dict_values"].setdefault(param, {}),
+                )
                 if not result["valid"]:
                     return result
                 continue
@@ -471,13 +597,25 @@ def simple_function_checker(
             # Special handle for strings
             elif expected_type_converted == str:
                 # We don't check for case sensitivity for string, as long as it's not a variable
-                result = string_checker(param, value, possible_answer[param])
+                if param not in answer_plan["strings"]:
+                    answer_plan["strings"][param] = standardize_possible_answer_strings(
+                        possible_answer[param]
+                    )
+                result = string_checker(
+                    param, value, possible_answer[param], answer_plan["strings"][param]
+                )
                 if not result["valid"]:
                     return result
                 continue
 
             elif expected_type_converted == list:
-                result = list_checker(param, value, possible_answer[param])
+                if param not in answer_plan["lists"]:
+                    answer_plan["lists"][param] = standardize_possible_answer_lists(
+                        possible_answer[param]
+                    )
+                result = list_checker(
+                    param, value, possible_answer[param], answer_plan["lists"][param]
+                )
                 if not result["valid"]:
                     return result
                 continue
@@ -546,6 +684,7 @@ def parallel_function_checker_no_order(
     possible_answers: list,
     language: str,
     model_name: str,
+    plan: dict = None,
 ):
     if len(model_output) != len(possible_answers):
         return {
@@ -554,58 +693,87 @@ def parallel_function_checker_no_order(
             "error_type": "parallel_function_checker_no_order:wrong_count",
         }
 
-    matched_indices = []
-
-    # We go throught the possible answers one by one, and eliminate the model output that matches the possible answer
-    # It must be this way because we need ground truth to fetch the correct function description
-    for i in range(len(possible_answers)):
-        # possible_answers[i] is a dictionary with only one key
-        func_name_expected = list(possible_answers[i].keys())[0]
-        func_description = find_description(func_descriptions, func_name_expected)
-
+    if plan is None:
+        plan = compile_checker_plan(func_descriptions, possible_answers)
 
-        all_errors = []
+    # possible_answers[i] is a dictionary with only one key
+    # We need ground truth to fetch the correct function description
+    expected_func_descriptions = [
+        find_description_in_plan(plan, list(possible_answer.keys())[0])
+        for possible_answer in possible_answers
+    ]
 
-        for index in range(len(model_output)):
-            if index in matched_indices:
-                continue
+    # Each (possible answer, model output) pair is checked at most once, and only when the matching needs it
+    pair_results = {}
 
-            result = simple_function_checker(
-                func_description,
+    def check_pair(i, index):
+        if (i, index) not in pair_results:
+            pair_results[(i, index)] = simple_function_checker(
+                expected_func_descriptions[i],
                 model_output[index],
                 possible_answers[i],
                 language,
                 model_name,
+                plan["answers"][i],
             )
+        return pair_results[(i, index)]
 
-            if result["valid"]:
-                matched_indices.append(index)
-                break
-            else:
-                all_errors.append(
-                    {
-                        f"Model Result Index {index}": {
-                            "sub_error": result["error"],
-                            "sub_error_type": result["error_type"],
-                            "model_output_item": model_output[index],
-                            "possible_answer_item": possible_answers[i],
-                        }
-                    }
-                )
+    # matched_answers[index] is the index of the possible answer that model output `index` is assigned to
+    matched_answers = [None] * len(model_output)
 
-        if not result["valid"]:
-            considered_indices = [
-                i for i in range(len(model_output)) if i not in matched_indices
-            ]
-            all_errors.insert(
-                0,
-                f"Could not find a matching function among index {considered_indices} of model output for index {i} of possible answers.",
+    def find_augmenting_path(i, visited):
+        for index in range(len(model_output)):
+            if index in visited or not check_pair(i, index)["valid"]:
+                continue
+            visited.add(index)
+            # Take a free model output, or move the possible answer holding it to another compatible output
+            if matched_answers[index] is None or find_augmenting_path(
+                matched_answers[index], visited
+            ):
+                matched_answers[index] = i
+                return True
+        return False
+
+    # A maximum bipartite matching (Kuhn's algorithm) between the possible answers and the model outputs.
+    # Unlike taking the first compatible model output for each possible answer, this never rejects a valid
+    # assignment because one model output is compatible with several possible answers.
+    unmatched_answer_indices = [
+        i for i in range(len(possible_answers)) if not find_augmenting_path(i, set())
+    ]
+
+    if unmatched_answer_indices:
+        i = unmatched_answer_indices[0]
+        # The model outputs left over by the maximum matching. None of them is compatible with possible answer `i`,
+        # otherwise the matching would have assigned it.
+        considered_indices = [
+            index for index in range(len(model_output)) if matched_answers[index] is None
+        ]
+        all_errors = []
+        for index in considered_indices:
+            result = check_pair(i, index)
+            all_errors.append(
+                {
+                    f"Model Result Index {index}": {
+                        "sub_error": result["error"],
+                        "sub_error_type": result["error_type"],
+                        "model_output_item": model_output[index],
+                        "possible_answer_item": possible_answers[i],
+                    }
+                }
             )
-            return {
-                "valid": False,
-                "error": all_errors,
-                "error_type": "parallel_function_checker_no_order:cannot_find_match",
-            }
+        all_errors.insert(
+            0,
+            f"Could not find a matching function among index {considered_indices} of model output for index {i} of possible answers.",
+        )
+        all_errors.insert(
+            1,
+            f"Unmatched possible answers: index {unmatched_answer_indices}.",
+        )
+        return {
+            "valid": False,
+            "error": all_errors,
+            "error_type": "parallel_function_checker_no_order:cannot_find_match",
+        }
 
     return {"valid": True, "error": []}
 
@@ -616,6 +784,7 @@ def multiple_function_checker(
     possible_answers: list,
     language: str,
     model_name: str,
+    plan: dict = None,
 ):
     if len(model_output) != len(possible_answers):
         return {
@@ -624,13 +793,17 @@ def multiple_function_checker(
             "error_type": "multiple_function_checker:wrong_count",
         }
 
+    if plan is None:
+        plan = compile_checker_plan(func_descriptions, possible_answers)
+
     # possible_answers is a list of only one dictionary with only one key
     func_name_expected = list(possible_answers[0].keys())[0]
-    func_description = find_description(func_descriptions, func_name_expected)
+    func_description = find_description_in_plan(plan, func_name_expected)
     return simple_function_checker(
         func_description,
         model_output[0],
         possible_answers[0],
         language,
         model_name,
+        plan["answers"][0],
     )
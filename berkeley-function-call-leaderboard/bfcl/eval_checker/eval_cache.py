@@ -0,0 +1,195 @@
+import ast
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from bfcl.constants.category_mapping import VERSION_PREFIX
+from bfcl.utils import dumps_json_serializable
+
+# Kept in a hidden folder inside the model score folder, so the score readers (which glob `*.json` in each
+# model folder) never mistake it for a score file
+EVAL_CACHE_DIR_NAME = ".eval_cache"
+
+_BFCL_ROOT = Path(__file__).resolve().parents[1]
+
+# The checkers; every verdict depends on them, on the model handler, and on every `bfcl` module they import
+_CHECKER_SOURCE_PATHS = [_BFCL_ROOT / "eval_checker"]
+
+_checker_version_by_handler = {}
+
+
+def _hash_json(value) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def entry_digests(entries: Optional[list]) -> Optional[list[str]]:
+    """
+    The content hash of every entry. Entries loaded with `load_file` carry the hash of their raw line, so they
+    do not need to be serialized again; any other list is hashed entry by entry.
+    """
+    if entries is None:
+        return None
+    digests = getattr(entries, "digests", None)
+    if digests is not None and len(digests) == len(entries):
+        return digests
+    return [_hash_json(entry) for entry in entries]
+
+
+def _resolve_bfcl_module(module_name: str) -> Optional[Path]:
+    path = _BFCL_ROOT.parent.joinpath(*module_name.split("."))
+    if path.with_suffix(".py").is_file():
+        return path.with_suffix(".py")
+    if (path / "__init__.py").is_file():
+        return path / "__init__.py"
+    return None
+
+
+def _imported_bfcl_modules(source_file: Path) -> set[Path]:
+    """
+    The source files of the `bfcl` modules that `source_file` imports, at any level of the file.
+    """
+    imported_files = set()
+    for node in ast.walk(ast.parse(source_file.read_bytes())):
+        if isinstance(node, ast.Import):
+            module_names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            # `from package import name` may import the submodule `package.name`
+            module_names = [node.module] + [
+                f"{node.module}.{alias.name}" for alias in node.names
+            ]
+        else:
+            continue
+        for module_name in module_names:
+            if module_name == "bfcl" or module_name.startswith("bfcl."):
+                module_file = _resolve_bfcl_module(module_name)
+                if module_file is not None:
+                    imported_files.add(module_file)
+    return imported_files
+
+
+def _with_imported_bfcl_modules(source_files: set[Path]) -> set[Path]:
+    """
+    `source_files` and, transitively, the source files of every `bfcl` module they import.
+    """
+    pending = list(source_files)
+    all_files = set(source_files)
+    while pending:
+        for module_file in _imported_bfcl_modules(pending.pop()):
+            if module_file not in all_files:
+                all_files.add(module_file)
+                pending.append(module_file)
+    return all_files
+
+
+def get_checker_version(handler) -> str:
+    """
+    A hash of the source code that decides the verdict of an entry: the checkers, the decoders of the
+    model handler (every module in its class hierarchy), and every `bfcl` module they import, such as the shared
+    parsing utilities and the constants (type mappings, model configs).
+    Any edit to those files invalidates every cached verdict that depends on them.
+    """
+    handler_class = type(handler)
+    if handler_class not in _checker_version_by_handler:
+        source_files = set()
+        for path in _CHECKER_SOURCE_PATHS:
+            if path.is_dir():
+                source_files.update(path.rglob("*.py"))
+            else:
+                source_files.add(path)
+        for cls in handler_class.__mro__:
+            try:
+                source_files.add(Path(inspect.getfile(cls)).resolve())
+            except TypeError:
+                # Built-in classes such as `object` have no source file
+                continue
+        source_files = _with_imported_bfcl_modules(
+            {source_file for source_file in source_files if _BFCL_ROOT in source_file.parents}
+        )
+
+        digest = hashlib.sha256()
+        for source_file in sorted(source_files):
+            digest.update(str(source_file.relative_to(_BFCL_ROOT)).encode())
+            digest.update(source_file.read_bytes())
+        _checker_version_by_handler[handler_class] = digest.hexdigest()
+
+    return _checker_version_by_handler[handler_class]
+
+
+class EvalCache:
+    """
+    Per-entry verdicts of one (model, test category) pair, persisted next to its score file.
+
+    A verdict is the list of failure records the runner produced for the entry, plus whether the entry
+    counted as correct. It is keyed by the content hashes of the model result entry, the prompt entry, the
+    possible answer entry and the checker version, so re-evaluating a result file only runs the checkers on
+    the entries whose inputs or checking code changed since the last evaluation.
+    """
+
+    def __init__(self, score_dir: Path, model_name: str, test_category: str, handler):
+        self.cache_path = (
+            score_dir
+            / model_name
+            / EVAL_CACHE_DIR_NAME
+            / f"{VERSION_PREFIX}_{test_category}_eval_cache.jsonl"
+        )
+        self._key_prefix = f"{get_checker_version(handler)}:{model_name}:{test_category}:"
+        self._verdicts = {}
+        # The raw line of each verdict in the cache file, so a verdict that is used again is saved back as is
+        self._verdict_lines = {}
+        # Only the verdicts used in this run are saved back, so the cache does not grow with stale entries.
+        # They are kept as their encoded line.
+        self._used_verdicts = {}
+        self._modified = False
+        self.hit_count = 0
+
+        if self.cache_path.exists():
+            with open(self.cache_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._verdicts[record["key"]] = record
+                    self._verdict_lines[record["key"]] = line.rstrip("\n")
+
+    def entry_key(
+        self, model_result_digest: str, prompt_digest: str, possible_answer_digest: Optional[str]
+    ) -> str:
+        return hashlib.sha256(
+            (
+                self._key_prefix
+                + model_result_digest
+                + prompt_digest
+                + (possible_answer_digest or "")
+            ).encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[tuple[list, int]]:
+        record = self._verdicts.get(key)
+        if record is None:
+            return None
+        self.hit_count += 1
+        self._used_verdicts[key] = self._verdict_lines[key]
+        return record["result"], record["correct_count"]
+
+    def put(self, key: str, result: list, correct_count: int) -> None:
+        # Encoded right away, in the same form as the verdicts loaded from the cache file
+        self._used_verdicts[key] = dumps_json_serializable(
+            {"key": key, "result": result, "correct_count": correct_count}
+        )
+        self._modified = True
+
+    def save(self) -> None:
+        if not self._modified and len(self._used_verdicts) == len(self._verdicts):
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_suffix(".jsonl.tmp")
+        with open(temp_path, "w") as f:
+            for line in self._used_verdicts.values():
+                f.write(line + "\n")
+        os.replace(temp_path, self.cache_path)
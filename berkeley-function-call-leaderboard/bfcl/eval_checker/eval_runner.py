@@ -1,4 +1,7 @@
 import argparse
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from bfcl.constants.category_mapping import (
     TEST_COLLECTION_MAPPING,
@@ -13,8 +16,14 @@ from bfcl.constants.eval_config import (
     RESULT_PATH,
     SCORE_PATH,
 )
-from bfcl.eval_checker.ast_eval.ast_checker import ast_checker
+from bfcl.eval_checker.ast_eval.ast_checker import ast_checker, reset_checker_plans
+from bfcl.eval_checker.eval_cache import EvalCache, entry_digests
+from bfcl.eval_checker.eval_stats import get_eval_stats_path
 from bfcl.eval_checker.eval_runner_helper import *
+from bfcl.eval_checker.multi_turn_eval.ground_truth_cache import (
+    GROUND_TRUTH_CACHE_PATH,
+    configure_ground_truth_cache,
+)
 from bfcl.eval_checker.multi_turn_eval.multi_turn_checker import (
     multi_turn_checker,
     multi_turn_irrelevance_checker,
@@ -26,19 +35,105 @@ from dotenv import load_dotenv
 from tqdm import tqdm
 
 
+# Number of entries evaluated by one worker task in the parallel evaluation mode.
+# Small enough to spread a single multi-turn category (a few seconds per entry) over many workers,
+# large enough that pickling the inputs and results of a shard stays negligible.
+EVAL_SHARD_SIZE = 50
+
+
 def get_handler(model_name):
     return MODEL_CONFIG_MAPPING[model_name].model_handler(
         model_name, temperature=0
     )  # Temperature doesn't matter for evaluation
 
 
-def multi_turn_runner(
-    handler, model_result, prompt, possible_answer, model_name, test_category, score_dir
+def get_language(test_category):
+    language = "Python"
+    if is_java(test_category):
+        language = "Java"
+    if is_js(test_category):
+        language = "JavaScript"
+    return language
+
+
+def write_score_file(
+    result, correct_count, total_count, model_name, test_category, score_dir
 ):
-    assert (
-        len(model_result) == len(prompt) == len(possible_answer)
-    ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
+    accuracy = correct_count / total_count
+    result.insert(
+        0,
+        {
+            "accuracy": accuracy,
+            "correct_count": correct_count,
+            "total_count": total_count,
+        },
+    )
+    output_file_name = f"{VERSION_PREFIX}_{test_category}_score.json"
+    output_file_dir = score_dir / model_name
+    write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
+
+    return accuracy
+
+
+def lookup_cached_verdicts(eval_cache, model_result, prompt, possible_answer):
+    """
+    Return the cache key and the cached verdict of every entry; the verdict is None for the entries that need
+    to be evaluated.
+    """
+    model_result_digests = entry_digests(model_result)
+    prompt_digests = entry_digests(prompt)
+    possible_answer_digests = entry_digests(possible_answer)
+    keys = [
+        eval_cache.entry_key(
+            model_result_digests[i],
+            prompt_digests[i],
+            possible_answer_digests[i] if possible_answer_digests is not None else None,
+        )
+        for i in range(len(model_result))
+    ]
+    return keys, [eval_cache.get(key) for key in keys]
 
+
+def save_verdicts(eval_cache, keys, verdicts, indices):
+    for i in indices:
+        eval_cache.put(keys[i], *verdicts[i])
+    eval_cache.save()
+
+
+def merge_verdicts(verdicts):
+    result = []
+    correct_count = 0
+    for entry_result, entry_correct_count in verdicts:
+        result.extend(entry_result)
+        correct_count += entry_correct_count
+    return result, correct_count
+
+
+def run_entries_with_cache(entries_runner, eval_cache, model_result, prompt, possible_answer):
+    """
+    Evaluate the entries with `entries_runner(model_result, prompt, possible_answer)`, skipping the entries that
+    have a cached verdict in `eval_cache`. The score file content is the same as evaluating all entries at once.
+    """
+    if eval_cache is None:
+        return entries_runner(model_result, prompt, possible_answer)
+
+    # Keys are computed before any evaluation, as the runners modify the prompt entries in place
+    keys, verdicts = lookup_cached_verdicts(eval_cache, model_result, prompt, possible_answer)
+    missing_indices = [i for i, verdict in enumerate(verdicts) if verdict is None]
+    for i in missing_indices:
+        verdicts[i] = entries_runner(
+            model_result[i : i + 1],
+            prompt[i : i + 1],
+            possible_answer[i : i + 1] if possible_answer is not None else None,
+        )
+    save_verdicts(eval_cache, keys, verdicts, missing_indices)
+
+    return merge_verdicts(verdicts)
+
+
+def _multi_turn_entries_runner(
+    handler, model_result, prompt, possible_answer, model_name, test_category
+):
     result = []
     correct_count = 0
     for i in range(len(model_result)):
@@ -144,30 +239,49 @@ def multi_turn_runner(
             temp["model_result_raw"] = multi_turn_model_result_list
             temp["model_result_decoded"] = multi_turn_model_result_list_decoded
             temp["possible_answer"] = multi_turn_ground_truth_list
-            temp["inference_log"] = model_result[i].get("inference_log", "")
+            if "inference_log_id" in model_result[i]:
+                # Generated with `--external-inference-log`; the log is in the store next to the result files
+                temp["inference_log_id"] = model_result[i]["inference_log_id"]
+            else:
+                temp["inference_log"] = model_result[i].get("inference_log", "")
             result.append(temp)
         else:
             correct_count += 1
 
-    accuracy = correct_count / len(model_result)
-    result.insert(
-        0,
-        {
-            "accuracy": accuracy,
-            "correct_count": correct_count,
-            "total_count": len(model_result),
-        },
+    return result, correct_count
+
+
+def multi_turn_runner(
+    handler,
+    model_result,
+    prompt,
+    possible_answer,
+    model_name,
+    test_category,
+    score_dir,
+    eval_cache=None,
+):
+    assert (
+        len(model_result) == len(prompt) == len(possible_answer)
+    ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
+
+    result, correct_count = run_entries_with_cache(
+        lambda model_result, prompt, possible_answer: _multi_turn_entries_runner(
+            handler, model_result, prompt, possible_answer, model_name, test_category
+        ),
+        eval_cache,
+        model_result,
+        prompt,
+        possible_answer,
+    )
+    accuracy = write_score_file(
+        result, correct_count, len(model_result), model_name, test_category, score_dir
     )
-    output_file_name = f"{VERSION_PREFIX}_{test_category}_score.json"
-    output_file_dir = score_dir / model_name
-    write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
 
     return accuracy, len(model_result)
 
 
-def relevance_file_runner(
-    handler, model_result, prompt, model_name, test_category, score_dir
-):
+def _relevance_entries_runner(handler, model_result, prompt, model_name, test_category):
     # This function serves for both relevance and irrelevance tests, which share the exact opposite logic.
     # If `test_category` is "irrelevance", the model is expected to output no function call.
     # No function call means either the AST decoding fails (a error message is generated) or the decoded AST does not contain any function call (such as a empty list, `[]`).
@@ -224,38 +338,36 @@ def relevance_file_runner(
 
             result.append(temp)
 
-    accuracy = correct_count / len(model_result)
-    result.insert(
-        0,
-        {
-            "accuracy": accuracy,
-            "correct_count": correct_count,
-            "total_count": len(model_result),
-        },
+    return result, correct_count
+
+
+def relevance_file_runner(
+    handler, model_result, prompt, model_name, test_category, score_dir, eval_cache=None
+):
+    result, correct_count = run_entries_with_cache(
+        lambda model_result, prompt, _: _relevance_entries_runner(
+            handler, model_result, prompt, model_name, test_category
+        ),
+        eval_cache,
+        model_result,
+        prompt,
+        None,
+    )
+    accuracy = write_score_file(
+        result, correct_count, len(model_result), model_name, test_category, score_dir
     )
-    output_file_name = f"{VERSION_PREFIX}_{test_category}_score.json"
-    output_file_dir = score_dir / model_name
-    write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
 
     return accuracy, len(model_result)
 
 
-def ast_file_runner(
-    handler,
-    model_result,
-    prompt,
-    possible_answer,
-    language,
-    test_category,
-    model_name,
-    score_dir,
+def _ast_entries_runner(
+    handler, model_result, prompt, possible_answer, language, test_category, model_name
 ):
-    assert (
-        len(model_result) == len(prompt) == len(possible_answer)
-    ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
-
     result = []
     correct_count = 0
+    # The checker plan of an entry is reused only while its function docs and possible answers stay the same
+    prompt_digests = entry_digests(prompt)
+    possible_answer_digests = entry_digests(possible_answer)
     for i in range(len(model_result)):
         index: str = model_result[i]["id"]
         model_result_item = model_result[i]["result"]
@@ -308,6 +420,7 @@ def ast_file_runner(
             language,
             test_category,
             model_name,
+            (prompt[i]["id"], prompt_digests[i], possible_answer_digests[i]),
         )
 
         if checker_result["valid"]:
@@ -326,24 +439,55 @@ def ast_file_runner(
             temp["possible_answer"] = possible_answer_item
             result.append(temp)
 
-    accuracy = correct_count / len(model_result)
-    result.insert(
-        0,
-        {
-            "accuracy": accuracy,
-            "correct_count": correct_count,
-            "total_count": len(model_result),
-        },
+    return result, correct_count
+
+
+def ast_file_runner(
+    handler,
+    model_result,
+    prompt,
+    possible_answer,
+    language,
+    test_category,
+    model_name,
+    score_dir,
+    eval_cache=None,
+):
+    assert (
+        len(model_result) == len(prompt) == len(possible_answer)
+    ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
+
+    result, correct_count = run_entries_with_cache(
+        lambda model_result, prompt, possible_answer: _ast_entries_runner(
+            handler,
+            model_result,
+            prompt,
+            possible_answer,
+            language,
+            test_category,
+            model_name,
+        ),
+        eval_cache,
+        model_result,
+        prompt,
+        possible_answer,
+    )
+    accuracy = write_score_file(
+        result, correct_count, len(model_result), model_name, test_category, score_dir
     )
-    output_file_name = f"{VERSION_PREFIX}_{test_category}_score.json"
-    output_file_dir = score_dir / model_name
-    write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
 
     return accuracy, len(model_result)
 
 
 #### Main runner function ####
-def runner(model_names, test_categories, result_dir, score_dir):
+def runner(
+    model_names,
+    test_categories,
+    result_dir,
+    score_dir,
+    num_workers=1,
+    cache_ground_truth=False,
+):
 
     # State udpated by each eval subtask.
     state = dict(
@@ -359,6 +503,48 @@ def runner(model_names, test_categories, result_dir, score_dir):
     # Filter out the subdirectories
     subdirs = [entry for entry in entries if entry.is_dir()]
 
+    # When cached, the ground truth of the multi-turn entries is executed once, and shared by every model and run.
+    # Filling the cache costs more than executing the ground truth once, so it is opt-in.
+    ground_truth_cache_path = GROUND_TRUTH_CACHE_PATH if cache_ground_truth else None
+    configure_ground_truth_cache(ground_truth_cache_path)
+    reset_checker_plans()
+
+    start_time = time.time()
+    if num_workers > 1:
+        total_entry_count = parallel_runner(
+            subdirs,
+            model_names,
+            test_categories,
+            result_dir,
+            score_dir,
+            state,
+            num_workers,
+            ground_truth_cache_path,
+        )
+    else:
+        total_entry_count = sequential_runner(
+            subdirs, model_names, test_categories, result_dir, score_dir, state
+        )
+    elapsed_time = time.time() - start_time
+    print(
+        f"📈 Evaluated {total_entry_count} entries in {elapsed_time:.1f}s "
+        f"({total_entry_count / max(elapsed_time, 1e-9):.1f} entries/s, {num_workers} worker process(es))."
+    )
+
+    # This function reads all the score files from local folder and updates the
+    # leaderboard table. This is helpful when you only want to run the
+    # evaluation for a subset of models and test categories.
+    update_leaderboard_table_with_local_score_file(state["leaderboard_table"], score_dir)
+    # Write the leaderboard table to a file
+    generate_leaderboard_csv(
+        state["leaderboard_table"], score_dir, model_names, test_categories
+    )
+
+
+def iter_result_files(subdirs, model_names, test_categories, result_dir):
+    """
+    Yield `(model_name, test_category, model_result_json)` for every result file to evaluate, in evaluation order.
+    """
     # Traverse each subdirectory
     for subdir in tqdm(subdirs, desc="Number of models evaluated"):
 
@@ -366,8 +552,6 @@ def runner(model_names, test_categories, result_dir, score_dir):
         if model_names is not None and model_name not in model_names:
             continue
 
-        model_name_escaped = model_name.replace("_", "/")
-
         print(f"🦍 Model: {model_name}")
 
         # Find and process all JSON files in the subdirectory
@@ -376,32 +560,200 @@ def runner(model_names, test_categories, result_dir, score_dir):
             if test_category not in test_categories:
                 continue
 
-            handler = get_handler(model_name_escaped)
-
             # We don't evaluate the following categories in the current iteration of the benchmark
             if is_chatable(test_category) or is_sql(test_category) or is_executable(test_category):
                 continue
 
+            yield model_name, test_category, model_result_json
+
+
+def sequential_runner(subdirs, model_names, test_categories, result_dir, score_dir, state):
+    total_entry_count = 0
+    handlers = {}
+    for model_name, test_category, model_result_json in iter_result_files(
+        subdirs, model_names, test_categories, result_dir
+    ):
+        if model_name not in handlers:
+            handlers[model_name] = get_handler(model_name.replace("_", "/"))
+        handler = handlers[model_name]
+
+        model_result = load_file(model_result_json, sort_by_id=True)
+        total_entry_count += len(model_result)
+
+        state = evaluate_task(
+            test_category,
+            result_dir,
+            score_dir,
+            model_result,
+            model_name,
+            handler,
+            state,
+        )
+
+    return total_entry_count
+
+
+# Handlers are not picklable, so each worker process builds its own, once per model
+_WORKER_HANDLERS = {}
+
+
+def _evaluate_shard(test_category, model_name, model_result, prompt, possible_answer):
+    """
+    Evaluate a shard of entries of a (model, test category) pair, and return the verdict of each entry.
+    Runs in a worker process.
+    """
+    if model_name not in _WORKER_HANDLERS:
+        _WORKER_HANDLERS[model_name] = get_handler(model_name.replace("_", "/"))
+    handler = _WORKER_HANDLERS[model_name]
+
+    return [
+        _run_entries(
+            handler,
+            test_category,
+            model_name,
+            model_result[i : i + 1],
+            prompt[i : i + 1],
+            possible_answer[i : i + 1] if possible_answer is not None else None,
+        )
+        for i in range(len(model_result))
+    ]
+
+
+def _run_entries(handler, test_category, model_name, model_result, prompt, possible_answer):
+    if is_relevance_or_irrelevance(test_category):
+        return _relevance_entries_runner(
+            handler, model_result, prompt, model_name, test_category
+        )
+    if is_multi_turn(test_category):
+        return _multi_turn_entries_runner(
+            handler, model_result, prompt, possible_answer, model_name, test_category
+        )
+    return _ast_entries_runner(
+        handler,
+        model_result,
+        prompt,
+        possible_answer,
+        get_language(test_category),
+        test_category,
+        model_name,
+    )
+
+
+def parallel_runner(
+    subdirs,
+    model_names,
+    test_categories,
+    result_dir,
+    score_dir,
+    state,
+    num_workers,
+    ground_truth_cache_path=None,
+):
+    """
+    Evaluate the result files on a pool of worker processes.
+
+    The entries of every (model, test category) pair that have no cached verdict are split into shards of
+    `EVAL_SHARD_SIZE` entries, and shards from different pairs are evaluated concurrently. The verdicts of a
+    pair are merged back in entry order once its shards are all done, so the score files are identical to the
+    ones written by `sequential_runner`.
+    """
+    total_entry_count = 0
+    # (model_name, test_category, eval_cache, keys, verdicts, shards), in submission order,
+    # where each shard is a (future, entry indices) pair
+    pending_tasks = deque()
+    pending_shard_count = 0
+
+    def finalize_task():
+        nonlocal pending_shard_count
+        model_name, test_category, eval_cache, keys, verdicts, shards = (
+            pending_tasks.popleft()
+        )
+        pending_shard_count -= len(shards)
+
+        for future, indices in shards:
+            for i, verdict in zip(indices, future.result()):
+                verdicts[i] = verdict
+        save_verdicts(
+            eval_cache, keys, verdicts, [i for _, indices in shards for i in indices]
+        )
+        result, correct_count = merge_verdicts(verdicts)
+        total_count = len(verdicts)
+
+        accuracy = write_score_file(
+            result, correct_count, total_count, model_name, test_category, score_dir
+        )
+        record_result(state, model_name, test_category, accuracy, total_count)
+        print(
+            f"✅ Test completed: {model_name} {test_category}. 🎯 Accuracy: {accuracy} "
+            f"(♻️ {eval_cache.hit_count}/{total_count} verdicts reused from the eval cache)"
+        )
+
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=configure_ground_truth_cache,
+        initargs=(ground_truth_cache_path,),
+    ) as executor:
+        for model_name, test_category, model_result_json in iter_result_files(
+            subdirs, model_names, test_categories, result_dir
+        ):
             model_result = load_file(model_result_json, sort_by_id=True)
+            total_entry_count += len(model_result)
+            record_cost_latency(
+                state["leaderboard_table"], model_name, test_category, model_result
+            ).save(get_eval_stats_path(score_dir, model_name, test_category))
 
-            state = evaluate_task(
-                test_category,
-                result_dir,
-                score_dir,
-                model_result,
-                model_name,
-                handler,
-                state,
+            prompt = load_file(
+                find_file_with_suffix(PROMPT_PATH, test_category), sort_by_id=True
+            )
+            possible_answer = None
+            if not is_relevance_or_irrelevance(test_category):
+                possible_answer = load_file(
+                    find_file_with_suffix(POSSIBLE_ANSWER_PATH, test_category),
+                    sort_by_id=True,
+                )
+                assert (
+                    len(model_result) == len(prompt) == len(possible_answer)
+                ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
+
+            print(f"🔍 Running test: {test_category}")
+            eval_cache = EvalCache(
+                score_dir, model_name, test_category, get_handler(model_name.replace("_", "/"))
             )
+            keys, verdicts = lookup_cached_verdicts(
+                eval_cache, model_result, prompt, possible_answer
+            )
+            missing_indices = [i for i, verdict in enumerate(verdicts) if verdict is None]
+
+            shards = []
+            for start in range(0, len(missing_indices), EVAL_SHARD_SIZE):
+                indices = missing_indices[start : start + EVAL_SHARD_SIZE]
+                future = executor.submit(
+                    _evaluate_shard,
+                    test_category,
+                    model_name,
+                    [model_result[i] for i in indices],
+                    [prompt[i] for i in indices],
+                    (
+                        [possible_answer[i] for i in indices]
+                        if possible_answer is not None
+                        else None
+                    ),
+                )
+                shards.append((future, indices))
+            pending_tasks.append(
+                (model_name, test_category, eval_cache, keys, verdicts, shards)
+            )
+            pending_shard_count += len(shards)
 
-    # This function reads all the score files from local folder and updates the
-    # leaderboard table. This is helpful when you only want to run the
-    # evaluation for a subset of models and test categories.
-    update_leaderboard_table_with_local_score_file(state["leaderboard_table"], score_dir)
-    # Write the leaderboard table to a file
-    generate_leaderboard_csv(
-        state["leaderboard_table"], score_dir, model_names, test_categories
-    )
+            # Keep enough shards queued to saturate the pool, but do not hold the inputs and results of every
+            # model in memory at once
+            while pending_shard_count > 4 * num_workers:
+                finalize_task()
+
+        while pending_tasks:
+            finalize_task()
+
+    return total_entry_count
 
 
 def evaluate_task(
@@ -414,15 +766,15 @@ def evaluate_task(
     state,
 ):
 
-    language = "Python"
-    if is_java(test_category):
-        language = "Java"
-    if is_js(test_category):
-        language = "JavaScript"
+    language = get_language(test_category)
 
     print(f"🔍 Running test: {test_category}")
 
-    record_cost_latency(state["leaderboard_table"], model_name, model_result)
+    record_cost_latency(
+        state["leaderboard_table"], model_name, test_category, model_result
+    ).save(get_eval_stats_path(score_dir, model_name, test_category))
+
+    eval_cache = EvalCache(score_dir, model_name, test_category, handler)
 
     # Find the corresponding test file.
     prompt_file = find_file_with_suffix(PROMPT_PATH, test_category)
@@ -430,7 +782,7 @@ def evaluate_task(
 
     if is_relevance_or_irrelevance(test_category):
         accuracy, total_count = relevance_file_runner(
-            handler, model_result, prompt, model_name, test_category, score_dir
+            handler, model_result, prompt, model_name, test_category, score_dir, eval_cache
         )
 
     else:
@@ -447,6 +799,7 @@ def evaluate_task(
                 model_name,
                 test_category,
                 score_dir,
+                eval_cache,
             )
 
         # Single turn test
@@ -460,15 +813,21 @@ def evaluate_task(
                 test_category,
                 model_name,
                 score_dir,
+                eval_cache,
             )
 
     record_result(state, model_name, test_category, accuracy, total_count)
-    print(f"✅ Test completed: {test_category}. 🎯 Accuracy: {accuracy}")
+    print(
+        f"✅ Test completed: {test_category}. 🎯 Accuracy: {accuracy} "
+        f"(♻️ {eval_cache.hit_count}/{total_count} verdicts reused from the eval cache)"
+    )
 
     return state
 
 
-def main(model, test_categories, result_dir, score_dir):
+def main(
+    model, test_categories, result_dir, score_dir, num_workers=1, cache_ground_truth=False
+):
     if result_dir is None:
         result_dir = RESULT_PATH
     else:
@@ -496,7 +855,14 @@ def main(model, test_categories, result_dir, score_dir):
             model_names.append(model_name.replace("/", "_"))
 
     # Driver function to run the evaluation for all categories involved.
-    runner(model_names, all_test_categories, result_dir, score_dir)
+    runner(
+        model_names,
+        all_test_categories,
+        result_dir,
+        score_dir,
+        num_workers,
+        cache_ground_truth,
+    )
 
     print(
         f"🏁 Evaluation completed. See {score_dir / 'data_overall.csv'} for overall evaluation results on BFCL V3."
@@ -532,6 +898,17 @@ if __name__ == "__main__":
         type=str,
         help="Path to the folder where the evaluation score files will be stored; relative to the `berkeley-function-call-leaderboard` root folder",
     )
+    parser.add_argument(
+        "--num-workers",
+        default=1,
+        type=int,
+        help="Number of worker processes to evaluate with; 1 evaluates sequentially in the current process",
+    )
+    parser.add_argument(
+        "--cache-ground-truth",
+        action="store_true",
+        help="Cache the executed ground truth of the multi-turn entries in the user cache folder, and reuse it across models and runs",
+    )
 
     args = parser.parse_args()
 
@@ -541,4 +918,6 @@ if __name__ == "__main__":
         args.test_category,
         args.result_dir,
         args.score_dir,
+        args.num_workers,
+        args.cache_ground_truth,
     )
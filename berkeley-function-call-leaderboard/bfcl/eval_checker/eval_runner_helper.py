@@ -1,14 +1,15 @@
+import json
 import os
-import statistics
 from datetime import datetime
 from pathlib import Path
 
-import numpy as np
 import pandas as pd
+from bfcl._dataset_store import open_jsonl
 from bfcl.constants.category_mapping import TEST_FILE_MAPPING
 from bfcl.constants.column_headers import *
 from bfcl.constants.eval_config import *
 from bfcl.constants.model_config import MODEL_CONFIG_MAPPING
+from bfcl.eval_checker.eval_stats import CostLatencyStats, get_eval_stats_path
 from bfcl.utils import extract_test_category, load_file
 
 
@@ -71,38 +72,15 @@ def record_result(leaderboard_table, model_name, test_category, accuracy, total_
     }
 
 
-def record_cost_latency(leaderboard_table, model_name, model_output_data):
-    def process_data(key, data, output_list):
-        # All entries are either a list of list (in multi-turn), or a single value (in single-turn)
-        if key in data:
-            if isinstance(data[key], list) and all(
-                isinstance(inner_item, list) for inner_item in data[key]
-            ):
-                flattened_list = sum(data[key], [])
-                output_list.extend([item for item in flattened_list if item != 0])
-            else:
-                if data[key] != 0:
-                    output_list.append(data[key])
-
+def record_cost_latency(leaderboard_table, model_name, test_category, model_output_data):
+    stats = CostLatencyStats.from_model_result(model_output_data)
     if model_name not in leaderboard_table:
         leaderboard_table[model_name] = {}
-        leaderboard_table[model_name]["cost"] = {"input_data": [], "output_data": []}
-        leaderboard_table[model_name]["latency"] = {"data": []}
-
-    input_token = []
-    output_token = []
-    latency = []
-    for data in model_output_data:
-        process_data("latency", data, latency)
-        process_data("input_token_count", data, input_token)
-        process_data("output_token_count", data, output_token)
+    leaderboard_table[model_name].setdefault("cost_latency", {})[test_category] = stats
+    return stats
 
-    leaderboard_table[model_name]["cost"]["input_data"].extend(input_token)
-    leaderboard_table[model_name]["cost"]["output_data"].extend(output_token)
-    leaderboard_table[model_name]["latency"]["data"].extend(latency)
 
-
-def get_cost_latency_info(model_name, cost_data, latency_data):
+def get_cost_latency_info(model_name, cost_latency_stats):
     cost, mean_latency, std_latency, percentile_95_latency = "N/A", "N/A", "N/A", "N/A"
     model_config = MODEL_CONFIG_MAPPING[model_name]
 
@@ -110,27 +88,32 @@ def get_cost_latency_info(model_name, cost_data, latency_data):
         # Open source models should not have a cost or latency
         return "N/A", "N/A", "N/A", "N/A"
 
+    # Merge the statistics of every category of the model
+    stats = CostLatencyStats()
+    for category_stats in cost_latency_stats.values():
+        stats.merge(category_stats)
+    input_token_stats = stats.metrics["input_token_count"]
+    output_token_stats = stats.metrics["output_token_count"]
+    latency_stats = stats.metrics["latency"]
+
     if (
         model_config.input_price is not None
-        and len(cost_data["input_data"]) > 0
-        and len(cost_data["output_data"]) > 0
+        and input_token_stats.count > 0
+        and output_token_stats.count > 0
     ):
 
-        mean_input_token = statistics.mean(cost_data["input_data"])
-        mean_output_token = statistics.mean(cost_data["output_data"])
+        mean_input_token = input_token_stats.mean
+        mean_output_token = output_token_stats.mean
         cost = (
             mean_input_token * model_config.input_price
             + mean_output_token * model_config.output_price
         ) / 1000
         cost = round(cost, 2)
 
-    if len(latency_data["data"]) != 0:
-        mean_latency = statistics.mean(latency_data["data"])
-        std_latency = statistics.stdev(latency_data["data"])
-        percentile_95_latency = np.percentile(latency_data["data"], 95)
-        mean_latency = round(mean_latency, 2)
-        std_latency = round(std_latency, 2)
-        percentile_95_latency = round(percentile_95_latency, 2)
+    if latency_stats.count != 0:
+        mean_latency = round(latency_stats.mean, 2)
+        std_latency = round(latency_stats.stdev, 2)
+        percentile_95_latency = round(latency_stats.quantile(0.95), 2)
 
     return cost, mean_latency, std_latency, percentile_95_latency
 
@@ -142,7 +125,7 @@ def get_category_score(score_dict: dict, test_category: str) -> dict:
         return score
     else:
         test_file_path = TEST_FILE_MAPPING[test_category]
-        num_entry = len(load_file(PROMPT_PATH / test_file_path))
+        num_entry = len(open_jsonl(PROMPT_PATH / test_file_path))
         # If a category is not being evaluated, it needs to be distinguished from the situation where the evaluation score is 0
         # It will still be considered 0 in the overall score calculation though
         # We use `display_accuracy` to special handle
@@ -192,10 +175,8 @@ def generate_leaderboard_csv(
         model_name_escaped = model_name.replace("_", "/")
         model_config = MODEL_CONFIG_MAPPING[model_name_escaped]
 
-        cost_data = value.get("cost", {"input_data": [], "output_data": []})
-        latency_data = value.get("latency", {"data": []})
         cost, latency_mean, latency_std, percentile_95_latency = get_cost_latency_info(
-            model_name_escaped, cost_data, latency_data
+            model_name_escaped, value.get("cost_latency", {})
         )
 
         # Non-Live Score
@@ -484,7 +465,9 @@ def update_leaderboard_table_with_local_score_file(
         model_name = subdir.relative_to(score_path).name
         # Find and process all JSON files in the subdirectory
         for model_score_json in subdir.glob("*.json"):
-            metadata = load_file(model_score_json)[0]
+            # Only the first line (the summary) is needed; the rest of the score file can be large
+            with open(model_score_json) as f:
+                metadata = json.loads(f.readline())
             accuracy, total_count = metadata["accuracy"], metadata["total_count"]
             test_category = extract_test_category(model_score_json)
             if model_name not in leaderboard_table:
@@ -494,3 +477,11 @@ def update_leaderboard_table_with_local_score_file(
                     "accuracy": accuracy,
                     "total_count": total_count,
                 }
+            cost_latency_stats = leaderboard_table[model_name].setdefault("cost_latency", {})
+            if test_category not in cost_latency_stats:
+                # Saved along with the score file, so the result file does not need to be read again
+                stats = CostLatencyStats.load(
+                    get_eval_stats_path(score_path, model_name, test_category)
+                )
+                if stats is not None:
+                    cost_latency_stats[test_category] = stats
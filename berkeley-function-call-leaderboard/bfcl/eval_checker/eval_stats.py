@@ -0,0 +1,221 @@
+import json
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+from bfcl.constants.category_mapping import VERSION_PREFIX
+
+# Kept in a hidden folder inside the model score folder, so the score readers (which glob `*.json` in each
+# model folder) never mistake it for a score file
+EVAL_STATS_DIR_NAME = ".eval_stats"
+
+# The metrics recorded for every result entry; a value of 0 means the metric was not measured for that entry
+COST_LATENCY_METRICS = ["latency", "input_token_count", "output_token_count"]
+
+# Every quantile of the sketch is within 0.1% of the exact value, which is below the rounding of the leaderboard
+SKETCH_RELATIVE_ACCURACY = 0.001
+
+
+def get_eval_stats_path(score_dir: Path, model_name: str, test_category: str) -> Path:
+    return (
+        score_dir
+        / model_name
+        / EVAL_STATS_DIR_NAME
+        / f"{VERSION_PREFIX}_{test_category}_eval_stats.json"
+    )
+
+
+class QuantileSketch:
+    """
+    A DDSketch: values are counted in buckets whose bounds grow geometrically, so any quantile is estimated within
+    `relative_accuracy` of the exact value, in a space that only depends on the range of the values. Sketches with
+    the same accuracy can be merged, eg, to get the quantiles of a model from the sketches of its categories.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: dict[int, int] = {}
+        # Values that are not positive have no bucket
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged.")
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Linearly interpolated between the two closest ranks, like `np.percentile`. Both ranks are estimated within
+        the relative accuracy, so the interpolated value is as well.
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        lower_rank = math.floor(rank)
+        lower_value = self._value_at_rank(lower_rank)
+        if rank == lower_rank:
+            return lower_value
+        upper_value = self._value_at_rank(lower_rank + 1)
+        return lower_value + (upper_value - lower_value) * (rank - lower_rank)
+
+    def _value_at_rank(self, rank: int) -> float:
+        seen_count = self.zero_count
+        if seen_count > rank:
+            return 0.0
+        for key in sorted(self.bins):
+            seen_count += self.bins[key]
+            if seen_count > rank:
+                # The value in the middle of the bucket, relative to its bounds
+                return 2 * self._gamma**key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.bins) / (self._gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "bins": {str(key): count for key, count in sorted(self.bins.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+class StreamingStats:
+    """
+    Count, mean and variance (Welford's algorithm) and quantiles (`QuantileSketch`) of a stream of values, without
+    keeping the values themselves.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # Sum of the squared differences from the mean
+        self._m2 = 0.0
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.sketch.add(value)
+
+    def merge(self, other: "StreamingStats") -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.sketch.merge(other.sketch)
+
+    @property
+    def stdev(self) -> float:
+        # Sample standard deviation, as `statistics.stdev`
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.sketch.quantile(q)
+
+    def to_dict(self) -> dict:
+        return {
+            # Summary, for reading the file directly
+            "count": self.count,
+            "mean": self.mean,
+            "stdev": self.stdev,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            # State, for merging
+            "m2": self._m2,
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StreamingStats":
+        stats = cls()
+        stats.count = data["count"]
+        stats.mean = data["mean"]
+        stats._m2 = data["m2"]
+        stats.sketch = QuantileSketch.from_dict(data["sketch"])
+        return stats
+
+
+def _add_measurements(stats: StreamingStats, value) -> None:
+    # Multi-turn entries have a list (per turn) of lists (per step) of measurements, single-turn entries have one
+    if isinstance(value, list):
+        for item in value:
+            _add_measurements(stats, item)
+    elif value != 0:
+        stats.add(value)
+
+
+class CostLatencyStats:
+    """
+    Streaming statistics of the latency and token counts of the result entries of one (model, test category) pair,
+    or of several pairs merged together. They are saved next to the score file of the pair, so the cost and latency
+    columns of the leaderboard can be rebuilt from the score folder alone.
+    """
+
+    def __init__(self):
+        self.metrics = {metric: StreamingStats() for metric in COST_LATENCY_METRICS}
+
+    @classmethod
+    def from_model_result(cls, model_result: list[dict]) -> "CostLatencyStats":
+        stats = cls()
+        for entry in model_result:
+            for metric in COST_LATENCY_METRICS:
+                if metric in entry:
+                    _add_measurements(stats.metrics[metric], entry[metric])
+        return stats
+
+    def merge(self, other: "CostLatencyStats") -> None:
+        for metric in COST_LATENCY_METRICS:
+            self.metrics[metric].merge(other.metrics[metric])
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".json.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(
+                {metric: self.metrics[metric].to_dict() for metric in COST_LATENCY_METRICS},
+                f,
+                indent=4,
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["CostLatencyStats"]:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        stats = cls()
+        for metric in COST_LATENCY_METRICS:
+            if metric in data:
+                stats.metrics[metric] = StreamingStats.from_dict(data[metric])
+        return stats
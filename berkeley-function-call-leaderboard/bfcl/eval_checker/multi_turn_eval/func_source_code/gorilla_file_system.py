@@ -20,6 +20,9 @@ class File:
         self.name: str = name
         self.content: str = content
         self._last_modified: datetime.datetime = datetime.datetime.now()
+        # The lines and the word count of the content, computed on first use and dropped whenever the content changes
+        self._lines: Optional[tuple] = None
+        self._word_count: Optional[int] = None
 
     def _write(self, new_content: str) -> None:
         """
@@ -30,6 +33,7 @@ class File:
         """
         self.content = new_content
         self._last_modified = datetime.datetime.now()
+        self._content_changed()
 
     def _read(self) -> str:
         """
@@ -49,6 +53,48 @@ class File:
         """
         self.content += additional_content
         self._last_modified = datetime.datetime.now()
+        self._content_changed()
+
+    def _content_changed(self) -> None:
+        self._lines = None
+        self._word_count = None
+
+    def _get_lines(self) -> tuple:
+        """
+        The lines of the content, as `str.splitlines`.
+        """
+        if self._lines is None:
+            self._lines = tuple(self.content.splitlines())
+        return self._lines
+
+    def _get_word_count(self) -> int:
+        if self._word_count is None:
+            self._word_count = len(self.content.split())
+        return self._word_count
+
+    def _state_snapshot(self, previous_snapshot: Optional["File"]) -> "File":
+        """
+        Return a copy of the file for the state log, or `previous_snapshot` itself if the file has not changed.
+
+        Args:
+            previous_snapshot (File, optional): The snapshot of this file taken at the previous turn.
+        """
+        if (
+            isinstance(previous_snapshot, File)
+            and previous_snapshot.name == self.name
+            and previous_snapshot.content == self.content
+        ):
+            return previous_snapshot
+        # A fresh copy rather than `deepcopy(self)`, so the snapshot does not carry the cached lines of the content
+        snapshot = File(self.name, self.content)
+        snapshot._last_modified = self._last_modified
+        return snapshot
+
+    def _state_fields(self) -> dict:
+        """
+        The fields that define the state of the file (the ones compared by `__eq__`), for reporting state differences.
+        """
+        return {"name": self.name, "content": self.content}
 
     def __repr__(self):
         return f"<<File: {self.name}, Content: {self.content}>>"
@@ -122,6 +168,53 @@ class Directory:
         """
         return list(self.contents.keys())
 
+    def _state_snapshot(
+        self,
+        previous_snapshot: Optional["Directory"],
+        parent_snapshot: Optional["Directory"] = None,
+    ) -> "Directory":
+        """
+        Return a copy of the directory tree for the state log. Unchanged files and subtrees are shared with
+        `previous_snapshot` instead of being copied, and `previous_snapshot` itself is returned if nothing changed.
+
+        Args:
+            previous_snapshot (Directory, optional): The snapshot of this directory taken at the previous turn.
+            parent_snapshot (Directory, optional): The snapshot of the parent directory, if it is being copied.
+        """
+        if not isinstance(previous_snapshot, Directory):
+            previous_snapshot = None
+        parent_name = self.parent.name if self.parent else None
+        if parent_snapshot is None and self.parent is not None:
+            # Only the parent name is observable (see `__repr__`), so a detached copy of the parent is enough
+            parent_snapshot = Directory(self.parent.name)
+
+        snapshot = Directory(self.name, parent_snapshot)
+        unchanged = (
+            previous_snapshot is not None
+            and previous_snapshot.name == self.name
+            and (previous_snapshot.parent.name if previous_snapshot.parent else None)
+            == parent_name
+            and list(previous_snapshot.contents) == list(self.contents)
+        )
+        for item_name, item in self.contents.items():
+            previous_item = (
+                previous_snapshot.contents.get(item_name) if previous_snapshot else None
+            )
+            if isinstance(item, Directory):
+                item_snapshot = item._state_snapshot(previous_item, snapshot)
+            else:
+                item_snapshot = item._state_snapshot(previous_item)
+            unchanged = unchanged and item_snapshot is previous_item
+            snapshot.contents[item_name] = item_snapshot
+
+        return previous_snapshot if unchanged else snapshot
+
+    def _state_fields(self) -> dict:
+        """
+        The fields that define the state of the directory (the ones compared by `__eq__`), for reporting state differences.
+        """
+        return {"name": self.name, "contents": self.contents}
+
     def __repr__(self):
         return f"<Directory: {self.name}, Parent: {self.parent.name if self.parent else None}, Contents: {self.contents}>"
 
@@ -142,6 +235,9 @@ class GorillaFileSystem:
         """
         self.root: Directory
         self._current_dir: Directory
+        # Directory -> the (relative path, name) of every item under it, in the order `find` visits them.
+        # Cleared whenever a directory gains or loses an item.
+        self._find_listings: Dict[int, List[tuple]] = {}
         self._api_description = "This tool belongs to the Gorilla file system. It is a simple file system that allows users to perform basic file operations such as navigating directories, creating files and directories, reading and writing to files, etc."
 
     def __eq__(self, other: object) -> bool:
@@ -198,6 +294,10 @@ class GorillaFileSystem:
                 scenario["root"][list(scenario["root"].keys())[0]]["contents"], root_dir
             )
         self._current_dir = self.root
+        self._find_listings = {}
+
+    def _structure_changed(self) -> None:
+        self._find_listings.clear()
 
     def _load_directory(
         self, current: dict, parent: Optional[Directory] = None
@@ -327,6 +427,7 @@ class GorillaFileSystem:
             return {"error": f"mkdir: cannot create directory '{dir_name}': File exists"}
 
         self._current_dir._add_directory(dir_name)
+        self._structure_changed()
         return None
 
     def touch(self, file_name: str) -> Union[None, Dict[str, str]]:
@@ -343,6 +444,7 @@ class GorillaFileSystem:
             return {"error": f"touch: cannot touch '{file_name}': File exists"}
 
         self._current_dir._add_file(file_name)
+        self._structure_changed()
         return None
 
     def echo(
@@ -368,6 +470,7 @@ class GorillaFileSystem:
                 self._current_dir._get_item(file_name)._write(content)
             else:
                 self._current_dir._add_file(file_name, content)
+                self._structure_changed()
         else:
             return {"terminal_output": content}
 
@@ -410,18 +513,27 @@ class GorillaFileSystem:
             matches (List[str]): A list of matching file and directory paths relative to the given path.
 
         """
-        matches = []
         target_dir = self._current_dir
-
-        def recursive_search(directory: Directory, base_path: str) -> None:
-            for item_name, item in directory.contents.items():
-                item_path = f"{base_path}/{item_name}"
-                if name is None or name in item_name:
-                    matches.append(item_path)
-                if isinstance(item, Directory):
-                    recursive_search(item, item_path)
-
-        recursive_search(target_dir, path.rstrip("/"))
+        listing = self._find_listings.get(id(target_dir))
+        if listing is None:
+            listing = []
+
+            def recursive_search(directory: Directory, base_path: str) -> None:
+                for item_name, item in directory.contents.items():
+                    item_path = f"{base_path}/{item_name}"
+                    listing.append((item_path, item_name))
+                    if isinstance(item, Directory):
+                        recursive_search(item, item_path)
+
+            recursive_search(target_dir, "")
+            self._find_listings[id(target_dir)] = listing
+
+        base_path = path.rstrip("/")
+        matches = [
+            base_path + item_path
+            for item_path, item_name in listing
+            if name is None or name in item_name
+        ]
         return {"matches": matches}
 
     def wc(self, file_name: str, mode: str = "l") -> Dict[str, Union[int, str]]:
@@ -445,11 +557,11 @@ class GorillaFileSystem:
                 content = file._read()
 
                 if mode == "l":
-                    line_count = len(content.splitlines())
+                    line_count = len(file._get_lines())
                     return {"count": line_count, "type": "lines"}
 
                 elif mode == "w":
-                    word_count = len(content.split())
+                    word_count = file._get_word_count()
                     return {"count": word_count, "type": "words"}
 
                 elif mode == "c":
@@ -471,9 +583,7 @@ class GorillaFileSystem:
         if file_name in self._current_dir.contents:
             file = self._current_dir._get_item(file_name)
             if isinstance(file, File):
-                content = file._read()
-
-                sorted_content = "\n".join(sorted(content.splitlines()))
+                sorted_content = "\n".join(sorted(file._get_lines()))
 
                 return {"sorted_content": sorted_content}
 
@@ -493,9 +603,7 @@ class GorillaFileSystem:
         if file_name in self._current_dir.contents:
             file = self._current_dir._get_item(file_name)
             if isinstance(file, File):
-                content = file._read()
-
-                matching_lines = [line for line in content.splitlines() if pattern in line]
+                matching_lines = [line for line in file._get_lines() if pattern in line]
 
                 return {"matching_lines": matching_lines}
 
@@ -552,7 +660,7 @@ class GorillaFileSystem:
         if file_name in self._current_dir.contents:
             file = self._current_dir._get_item(file_name)
             if isinstance(file, File):
-                content = file._read().splitlines()
+                content = file._get_lines()
 
                 if lines > len(content):
                     lines = len(content)
@@ -581,8 +689,8 @@ class GorillaFileSystem:
             file2 = self._current_dir._get_item(file_name2)
 
             if isinstance(file1, File) and isinstance(file2, File):
-                content1 = file1._read().splitlines()
-                content2 = file2._read().splitlines()
+                content1 = file1._get_lines()
+                content2 = file2._get_lines()
 
                 diff_lines = [
                     f"- {line1}\n+ {line2}"
@@ -635,6 +743,7 @@ class GorillaFileSystem:
                     else:
                         dest_item._add_directory(source)
                         dest_item.contents[source].contents = item.contents
+                    self._structure_changed()
                     return {"result": f"'{source}' moved to '{destination}/{source}'"}
             else:
                 return {
@@ -648,6 +757,7 @@ class GorillaFileSystem:
             else:
                 self._current_dir._add_directory(destination)
                 self._current_dir.contents[destination].contents = item.contents
+            self._structure_changed()
             return {"result": f"'{source}' moved to '{destination}'"}
 
     def rm(self, file_name: str) -> Dict[str, str]:
@@ -664,6 +774,7 @@ class GorillaFileSystem:
             item = self._current_dir._get_item(file_name)
             if isinstance(item, File) or isinstance(item, Directory):
                 self._current_dir.contents.pop(file_name)
+                self._structure_changed()
                 return {"result": f"'{file_name}' removed"}
             else:
                 return {
@@ -691,6 +802,7 @@ class GorillaFileSystem:
                     }
                 else:
                     self._current_dir.contents.pop(dir_name)
+                    self._structure_changed()
                     return {"result": f"'{dir_name}' removed"}
             else:
                 return {"error": f"rmdir: cannot remove '{dir_name}': Not a directory"}
@@ -745,6 +857,7 @@ class GorillaFileSystem:
                     else:
                         dest_item._add_directory(source)
                         dest_item.contents[source].contents = item.contents.copy()
+                    self._structure_changed()
                     return {"result": f"'{source}' copied to '{destination}/{source}'"}
             else:
                 return {
@@ -757,6 +870,7 @@ class GorillaFileSystem:
             else:
                 self._current_dir._add_directory(destination)
                 self._current_dir.contents[destination].contents = item.contents.copy()
+            self._structure_changed()
             return {"result": f"'{source}' copied to '{destination}'"}
 
     def _navigate_to_directory(
@@ -64,6 +64,9 @@ class MessageAPI:
         self.inbox: List[Dict[str, str]]
         self.message_count: int
         self.current_user: Optional[str]
+        # (receiver_id, message, lowercased message) of each inbox message, built on the first search and dropped
+        # whenever the inbox changes
+        self._search_records: Optional[List[tuple]] = None
         self._api_description = "This tool belongs to the Message API, which is used to manage user interactions in a workspace."
 
     def _load_scenario(self, scenario: dict, long_context=False) -> None:
@@ -85,6 +88,7 @@ class MessageAPI:
             "message_count", DEFAULT_STATE_COPY["message_count"]
         )
         self.current_user = scenario.get("current_user", DEFAULT_STATE_COPY["current_user"])
+        self._search_records = None
 
     def __eq__(self, value: object) -> bool:
         if not isinstance(value, MessageAPI):
@@ -188,6 +192,7 @@ class MessageAPI:
         message_id = self._generate_id()
         # Store the message in the inbox
         self.inbox.append({receiver_id: message})
+        self._search_records = None
         self.message_count += 1
         return {
             "sent_status": True,
@@ -214,6 +219,7 @@ class MessageAPI:
             receiver, _ = list(message.items())[0]
             if receiver == receiver_id:
                 self.inbox.remove(message)
+                self._search_records = None
                 return {
                     "deleted_status": True,
                     "message_id": receiver,
@@ -265,6 +271,21 @@ class MessageAPI:
             "message": f"Contact '{user_name}' added successfully.",
         }
 
+    def _get_search_records(self) -> List[tuple]:
+        if self._search_records is None:
+            search_records = []
+            for message_data in self.inbox:
+                receiver_id, message_content = list(message_data.items())[0]
+                search_records.append(
+                    (
+                        receiver_id,
+                        message_content,
+                        message_content.lower() if isinstance(message_content, str) else None,
+                    )
+                )
+            self._search_records = search_records
+        return self._search_records
+
     def search_messages(
         self, keyword: str
     ) -> Dict[str, Union[List[Dict[str, Union[str, List[str]]]], str]]:
@@ -281,11 +302,11 @@ class MessageAPI:
             return {"error": "No user is currently logged in."}
         keyword_lower = keyword.lower()
         results = []
-        # Iterate through the inbox to search for the keyword in messages
-        # for message_id, message_data in self.inbox.items():
-        for message_data in self.inbox:
-            receiver_id, message_content = list(message_data.items())[0]
-            if keyword_lower in message_content.lower():
+        for receiver_id, message_content, message_lower in self._get_search_records():
+            # A message of another type is matched (or fails) exactly as before
+            if message_lower is None:
+                message_lower = message_content.lower()
+            if keyword_lower in message_lower:
                 results.append(
                     {
                         "receiver_id": receiver_id,
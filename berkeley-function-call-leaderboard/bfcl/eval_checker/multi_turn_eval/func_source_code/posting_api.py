@@ -24,6 +24,9 @@ class TwitterAPI:
         self.following_list: List[str]
         # tweet_counter is used to assign unique IDs to tweets, it might not be the same as the length of the tweets list for different scenarios
         self.tweet_counter: int
+        # (tweet, lowercased content, lowercased tags) of each tweet, built on the first search and dropped whenever
+        # a tweet is posted
+        self._search_records: Optional[List[tuple]] = None
         self._api_description = "This tool belongs to the TwitterAPI, which provides core functionality for posting tweets, retweeting, commenting, and following users on Twitter."
 
     def _load_scenario(self, scenario: dict, long_context=False) -> None:
@@ -48,6 +51,7 @@ class TwitterAPI:
         self.tweet_counter = scenario.get(
             "tweet_counter", DEFAULT_STATE_COPY["tweet_counter"]
         )
+        self._search_records = None
 
     def authenticate_twitter(self, username: str, password: str) -> Dict[str, bool]:
         """
@@ -101,6 +105,7 @@ class TwitterAPI:
             "mentions": mentions,
         }
         self.tweets[self.tweet_counter] = tweet
+        self._search_records = None
         self.tweet_counter += 1
         return tweet
 
@@ -253,6 +258,22 @@ class TwitterAPI:
         """
         return [tweet for tweet in self.tweets.values() if tweet["username"] == username]
 
+    def _get_search_records(self) -> List[tuple]:
+        if self._search_records is None:
+            search_records = []
+            for tweet in self.tweets.values():
+                content, tags = tweet.get("content"), tweet.get("tags")
+                if isinstance(content, str) and isinstance(tags, list) and all(
+                    isinstance(tag, str) for tag in tags
+                ):
+                    search_records.append(
+                        (tweet, content.lower(), {tag.lower() for tag in tags})
+                    )
+                else:
+                    search_records.append((tweet, None, None))
+            self._search_records = search_records
+        return self._search_records
+
     def search_tweets(self, keyword: str) -> List[Dict[str, Union[int, str, List[str]]]]:
         """
         Search for tweets containing a specific keyword.
@@ -267,12 +288,21 @@ class TwitterAPI:
                 - tags (List[str]): List of tags associated with the tweet.
                 - mentions (List[str]): List of users mentioned in the tweet.
         """
-        return [
-            tweet
-            for tweet in self.tweets.values()
-            if keyword.lower() in tweet["content"].lower()
-            or keyword.lower() in [tag.lower() for tag in tweet["tags"]]
-        ]
+        search_records = self._get_search_records()
+        if not search_records:
+            return []
+        keyword_lower = keyword.lower()
+        matching_tweets = []
+        for tweet, content_lower, tags_lower in search_records:
+            if content_lower is None:
+                # Content or tags of another type are matched (or fail) exactly as before
+                if keyword_lower in tweet["content"].lower() or keyword_lower in [
+                    tag.lower() for tag in tweet["tags"]
+                ]:
+                    matching_tweets.append(tweet)
+            elif keyword_lower in content_lower or keyword_lower in tags_lower:
+                matching_tweets.append(tweet)
+        return matching_tweets
 
     def get_tweet_comments(self, tweet_id: int) -> List[Dict[str, str]]:
         """
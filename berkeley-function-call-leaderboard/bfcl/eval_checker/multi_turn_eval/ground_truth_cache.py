@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from bfcl.eval_checker.multi_turn_eval.multi_turn_utils import (
+    ExecutionSession,
+    execute_multi_turn_func_call,
+)
+
+# Kept in the cache folder of the current user rather than in the score folder, as the traces are unpickled, and a
+# score folder may come from someone else. Traces are keyed by content, so every score folder can share them.
+GROUND_TRUTH_CACHE_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    / "bfcl"
+    / "multi_turn_ground_truth.sqlite"
+)
+
+_MULTI_TURN_EVAL_ROOT = Path(__file__).resolve().parent
+_BFCL_ROOT = _MULTI_TURN_EVAL_ROOT.parents[1]
+
+# Source files that decide the execution results and states of the ground truth. `bfcl/utils.py` has
+# `copy_json_like`, which copies the instance states.
+_GROUND_TRUTH_SOURCE_PATHS = [
+    _MULTI_TURN_EVAL_ROOT / "func_source_code",
+    _MULTI_TURN_EVAL_ROOT / "multi_turn_utils.py",
+    _MULTI_TURN_EVAL_ROOT / "ground_truth_cache.py",
+    _BFCL_ROOT / "utils.py",
+]
+
+_ground_truth_version = None
+
+# Set with `configure_ground_truth_cache`; without it, the ground truth is executed for every entry
+_cache_path: Optional[Path] = None
+_store: Optional["_GroundTruthStore"] = None
+
+
+def configure_ground_truth_cache(cache_path: Optional[Path]) -> None:
+    """
+    Share the ground truth traces of this process through the cache at `cache_path` (or stop caching with None).
+    Every process that evaluates multi-turn entries must call it, eg, as the initializer of a worker pool.
+    """
+    global _cache_path, _store
+    if _store is not None:
+        _store.close()
+    _cache_path = cache_path
+    _store = None
+
+
+def get_ground_truth_version() -> str:
+    """
+    A hash of the source code of the backend APIs and of the execution and copy utilities. Any edit to those files
+    invalidates every cached trace.
+    """
+    global _ground_truth_version
+    if _ground_truth_version is None:
+        source_files = set()
+        for path in _GROUND_TRUTH_SOURCE_PATHS:
+            if path.is_dir():
+                source_files.update(path.rglob("*.py"))
+            else:
+                source_files.add(path)
+
+        digest = hashlib.sha256()
+        for source_file in sorted(source_files):
+            digest.update(str(source_file.relative_to(_BFCL_ROOT)).encode())
+            digest.update(source_file.read_bytes())
+        _ground_truth_version = digest.hexdigest()
+    return _ground_truth_version
+
+
+class _GroundTruthStore:
+    """
+    A SQLite database of ground truth traces, safe to share between processes. Traces of other ground truth
+    versions are dropped when it is opened.
+    """
+
+    def __init__(self, cache_path: Path):
+        # Only readable and writable by the current user
+        cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._pid = os.getpid()
+        self._connection = sqlite3.connect(cache_path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS traces (key TEXT PRIMARY KEY, version TEXT NOT NULL, data BLOB NOT NULL)"
+            )
+            self._connection.execute(
+                "DELETE FROM traces WHERE version != ?", (get_ground_truth_version(),)
+            )
+
+    def get(self, key: str) -> Optional[list[dict]]:
+        row = self._connection.execute(
+            "SELECT data FROM traces WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, trace: list[dict]) -> None:
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO traces VALUES (?, ?, ?)",
+                (key, get_ground_truth_version(), zlib.compress(pickle.dumps(trace))),
+            )
+
+    def close(self) -> None:
+        # A forked process must not use (or close) the connection of its parent
+        if self._pid == os.getpid():
+            self._connection.close()
+
+
+def _get_store() -> Optional[_GroundTruthStore]:
+    global _store
+    if _cache_path is None:
+        return None
+    if _store is None or _store._pid != os.getpid():
+        _store = _GroundTruthStore(_cache_path)
+    return _store
+
+
+def _trace_key(
+    test_entry: dict, multi_turn_ground_truth_list: list[list[str]], long_context: bool
+) -> str:
+    return hashlib.sha256(
+        json.dumps(
+            [
+                get_ground_truth_version(),
+                test_entry["id"],
+                test_entry["initial_config"],
+                test_entry["involved_classes"],
+                long_context,
+                multi_turn_ground_truth_list,
+            ],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+
+
+def execute_ground_truth(
+    test_entry: dict, multi_turn_ground_truth_list: list[list[str]], long_context: bool
+) -> list[dict]:
+    """
+    Execute the ground truth function calls of every turn, and return the trace: for each turn, the
+    `execution_results` of its calls and the `instance_states` at the end of the turn (see
+    `ExecutionSession.instance_states`).
+    """
+    trace = []
+    with ExecutionSession(
+        test_entry["initial_config"], test_entry["involved_classes"], long_context=long_context
+    ) as session:
+        for single_turn_ground_truth_list in multi_turn_ground_truth_list:
+            execution_results, _ = execute_multi_turn_func_call(
+                func_call_list=single_turn_ground_truth_list,
+                session=session,
+            )
+            trace.append(
+                {
+                    "execution_results": execution_results,
+                    "instance_states": session.instance_states(),
+                }
+            )
+    return trace
+
+
+def get_ground_truth_trace(
+    test_entry: dict, multi_turn_ground_truth_list: list[list[str]], long_context: bool
+) -> list[dict]:
+    """
+    The ground truth trace of an entry (see `execute_ground_truth`). It does not depend on the model, so it is
+    executed once per entry and ground truth version, and then read from the cache (if configured) by every
+    model evaluated afterwards.
+
+    The trace is shared, and must not be modified.
+    """
+    store = _get_store()
+    if store is None:
+        return execute_ground_truth(test_entry, multi_turn_ground_truth_list, long_context)
+
+    key = _trace_key(test_entry, multi_turn_ground_truth_list, long_context)
+    trace = store.get(key)
+    if trace is None:
+        trace = execute_ground_truth(test_entry, multi_turn_ground_truth_list, long_context)
+        store.put(key, trace)
+    return trace
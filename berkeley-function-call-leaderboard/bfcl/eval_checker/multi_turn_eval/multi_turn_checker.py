@@ -1,4 +1,9 @@
+from collections import Counter
+from typing import Optional
+
+from bfcl.eval_checker.multi_turn_eval.ground_truth_cache import get_ground_truth_trace
 from bfcl.eval_checker.multi_turn_eval.multi_turn_utils import (
+    ExecutionSession,
     execute_multi_turn_func_call,
     is_empty_execute_response,
 )
@@ -21,8 +26,37 @@ def multi_turn_checker(
     involved_classes: list = test_entry["involved_classes"]
     test_entry_id: str = test_entry["id"]
     test_category: str = test_entry_id.rsplit("_", 1)[0]
+    long_context = "long_context" in test_category or "composite" in test_category
+
+    # The ground truth does not depend on the model, so its execution results and states are shared across models
+    ground_truth_trace = get_ground_truth_trace(
+        test_entry, multi_turn_ground_truth_list, long_context
+    )
+
+    # The model gets its own set of instances, released once the entry is checked
+    with ExecutionSession(
+        initial_config, involved_classes, long_context=long_context
+    ) as model_session:
+        return _multi_turn_checker_in_sessions(
+            multi_turn_model_result_list_decoded,
+            multi_turn_ground_truth_list,
+            model_session,
+            ground_truth_trace,
+        )
+
+
+def _multi_turn_checker_in_sessions(
+    multi_turn_model_result_list_decoded: list[list[list[str]]],
+    multi_turn_ground_truth_list: list[list[str]],
+    model_session: ExecutionSession,
+    ground_truth_trace: list[dict],
+) -> dict:
     execution_results: list[dict] = []
     all_turn_model_execution_results: list[str] = []
+    # The same results as a multiset, updated with each turn's results, so a response check only costs the size of the turn
+    all_turn_model_execution_result_counter: Counter = Counter()
+    # Class name -> (modification count of the model instance, ground truth state) at the last passed state check
+    matched_states: dict[str, tuple[int, dict]] = {}
 
     # First execute all the function calls
     for turn_index, single_turn_ground_truth_list in enumerate(
@@ -41,35 +75,20 @@ def multi_turn_checker(
             single_step_model_execution_results, model_instances = (
                 execute_multi_turn_func_call(
                     func_call_list=single_step_model_response,
-                    initial_config=initial_config,
-                    involved_classes=involved_classes,
-                    model_name=model_name,
-                    test_entry_id=test_entry_id,
-                    long_context=(
-                        "long_context" in test_category or "composite" in test_category
-                    ),
-                    is_evaL_run=True,
+                    session=model_session,
                 )
             )
             single_turn_model_execution_results.extend(single_step_model_execution_results)
             single_turn_model_execution_results_uncombined.append(single_step_model_execution_results)
 
-        # Execute the ground truth function calls
-        single_turn_ground_truth_execution_results, ground_truth_instances = (
-            execute_multi_turn_func_call(
-                func_call_list=single_turn_ground_truth_list,
-                initial_config=initial_config,
-                involved_classes=involved_classes,
-                model_name=model_name + "_ground_truth",
-                test_entry_id=test_entry_id,
-                long_context=(
-                    "long_context" in test_category or "composite" in test_category
-                ),
-                is_evaL_run=True,
-            )
-        )
+        # The ground truth function calls were executed ahead of time
+        single_turn_ground_truth_execution_results = ground_truth_trace[turn_index][
+            "execution_results"
+        ]
+        ground_truth_states = ground_truth_trace[turn_index]["instance_states"]
 
         all_turn_model_execution_results.extend(single_turn_model_execution_results)
+        all_turn_model_execution_result_counter.update(single_turn_model_execution_results)
         execution_results.append(
             {
                 "model": single_turn_model_execution_results_uncombined,
@@ -99,15 +118,29 @@ def multi_turn_checker(
 
         ## Check after each turn ##
         assert len(model_instances) == len(
-            ground_truth_instances
-        ), f"Model instances and ground truth instances do not match in length for turn {turn_index}. Model instances: {len(model_instances)}, Ground truth instances: {len(ground_truth_instances)}"
-        assert set(model_instances.keys()) == set(ground_truth_instances.keys())
-
-        # Check the state of the instances
-        state_check_result = state_checker(model_instances, ground_truth_instances)
+            ground_truth_states
+        ), f"Model instances and ground truth instances do not match in length for turn {turn_index}. Model instances: {len(model_instances)}, Ground truth instances: {len(ground_truth_states)}"
+        assert set(model_instances.keys()) == set(ground_truth_states.keys())
+
+        # Check the state of the instances. An instance that received no call since it last matched, against a ground
+        # truth state that did not change either (unchanged states are shared between turns), still matches.
+        changed_ground_truth_states = {}
+        for class_name, ground_truth_state in ground_truth_states.items():
+            matched_count, matched_state = matched_states.get(class_name, (None, None))
+            if (
+                matched_count != model_session.modification_counts[class_name]
+                or matched_state is not ground_truth_state
+            ):
+                changed_ground_truth_states[class_name] = ground_truth_state
+        state_check_result = state_checker(model_instances, changed_ground_truth_states)
         if not state_check_result["valid"]:
             state_check_result["execution_result"] = execution_results
             return state_check_result
+        for class_name, ground_truth_state in ground_truth_states.items():
+            matched_states[class_name] = (
+                model_session.modification_counts[class_name],
+                ground_truth_state,
+            )
 
         # Check the response of the function calls
         # We use the all_turn_model_execution_results to accomodate the situation where the model invokes a function in a previous turn, and thus don't need to invoke it again in the current turn.
@@ -115,6 +148,7 @@ def multi_turn_checker(
             all_turn_model_execution_results,
             single_turn_ground_truth_execution_results,
             turn_index,
+            all_turn_model_execution_result_counter,
         )
         if not response_check_result["valid"]:
             return response_check_result
@@ -159,26 +193,16 @@ def multi_turn_irrelevance_checker(
 #### Sub-Chekcers ####
 
 
-def state_checker(model_instances: dict, ground_truth_instances: dict):
+def state_checker(model_instances: dict, ground_truth_states: dict):
     """
-    Checks if, after executing the function calls, the model_instance has the same state (defined by the attributes) as the ground_truth_instance.
-    It checks if every instance in the model_instances has the same attributes as their corresponding instance (of the same class) from ground_truth_instances.
+    Checks if, after executing the function calls, the model_instance has the same state (defined by the attributes) as the ground truth.
+    It checks if every instance in the model_instances has the same attributes as the state of the ground truth instance of the same class (see `ExecutionSession.instance_states`).
     """
-    for class_name, ground_truth_instance in ground_truth_instances.items():
+    for class_name, ground_truth_state in ground_truth_states.items():
         model_instance = model_instances[class_name]
-        valid, differences = _compare_instances(model_instance, ground_truth_instance)
+        valid, differences = _compare_instances(model_instance, ground_truth_state)
 
         if not valid:
-            model_instance_attributes = {
-                key: value
-                for key, value in vars(model_instance).items()
-                if not key.startswith("_")
-            }
-            ground_truth_instance_attributes = {
-                key: value
-                for key, value in vars(ground_truth_instance).items()
-                if not key.startswith("_")
-            }
             # Format the error message for better readability
             return {
                 "valid": False,
@@ -186,8 +210,6 @@ def state_checker(model_instances: dict, ground_truth_instances: dict):
                 "error_type": "multi_turn:instance_state_mismatch",
                 "details": {
                     "differences": differences,
-                    "model_instance_state": model_instance_attributes,
-                    "ground_truth_instance_state": ground_truth_instance_attributes,
                 },
             }
 
@@ -195,15 +217,19 @@ def state_checker(model_instances: dict, ground_truth_instances: dict):
 
 
 def response_checker(
-    model_response_list: list, ground_truth_response_list: list, turn_index: int
+    model_response_list: list,
+    ground_truth_response_list: list,
+    turn_index: int,
+    model_response_counter: Optional[Counter] = None,
 ):
     """
     Checks if the model_response is a subsequence of the ground_truth_response.
     Each list contains the response of the function calls executed in that single turn.
+    `model_response_counter`, if given, is `Counter(model_response_list)`, maintained by the caller.
     """
     # We don't need to enforce the order of the responses, because many entries have parallel operations, and so the model can execute them in any order.
     is_subsequence, missing_items = _is_subsequence_unordered(
-        ground_truth_response_list, model_response_list
+        ground_truth_response_list, model_response_list, model_response_counter
     )
     if not is_subsequence:
         return {
@@ -256,29 +282,64 @@ def method_invoke_order_checker(model_instances: dict, ground_truth_instances: d
 #### Helper functions ####
 
 
-def _compare_instances(model_obect, ground_truth_object):
+def _compare_instances(model_obect, ground_truth_state: dict):
     """
-    Checks if the model_object has the same attributes as the ground_truth_object. They are instances of the same class.
+    Checks if the model_object has the same attributes as the ground truth state, a snapshot of the public attributes of an instance of the same class.
+    The differences are reported by path (see `_diff_state`), so only the parts of the state that differ end up in the score file.
     """
-    assert type(model_obect) == type(
-        ground_truth_object
-    ), "Objects are not of the same type."
     differences = {}
     valid = True
-    for attr_name in vars(ground_truth_object):
-        # We don't check for private attributes
-        if attr_name.startswith("_"):
-            continue
+    for attr_name, ground_truth_attr in ground_truth_state.items():
         model_attr = getattr(model_obect, attr_name)
-        ground_truth_attr = getattr(ground_truth_object, attr_name)
 
         if model_attr != ground_truth_attr:
             valid = False
-            differences[attr_name] = {"model": model_attr, "ground_truth": ground_truth_attr}
+            _diff_state(model_attr, ground_truth_attr, attr_name, differences)
 
     return valid, differences
 
 
+def _diff_state(model_value, ground_truth_value, path: str, differences: dict) -> None:
+    """
+    Record the differences between two unequal state values in `differences`, as `path -> {"model": ..., "ground_truth": ...}`.
+
+    Dicts, lists and tuples of the same type, and the files and directories of the file system, are compared item by item,
+    so that a single changed item is reported under its own path (eg, `root.contents['notes.txt'].content`) instead of the
+    whole value. An item that only exists on one side is reported with that side only.
+    """
+    if type(model_value) is not type(ground_truth_value):
+        differences[path] = {"model": model_value, "ground_truth": ground_truth_value}
+        return
+
+    if isinstance(model_value, dict):
+        model_items, ground_truth_items = model_value, ground_truth_value
+        item_keys = list(ground_truth_value) + [
+            key for key in model_value if key not in ground_truth_value
+        ]
+        item_paths = {key: f"{path}[{key!r}]" for key in item_keys}
+    elif isinstance(model_value, (list, tuple)):
+        model_items = dict(enumerate(model_value))
+        ground_truth_items = dict(enumerate(ground_truth_value))
+        item_keys = range(max(len(model_value), len(ground_truth_value)))
+        item_paths = {key: f"{path}[{key}]" for key in item_keys}
+    elif hasattr(model_value, "_state_fields"):
+        model_items = model_value._state_fields()
+        ground_truth_items = ground_truth_value._state_fields()
+        item_keys = list(ground_truth_items)
+        item_paths = {key: f"{path}.{key}" for key in item_keys}
+    else:
+        differences[path] = {"model": model_value, "ground_truth": ground_truth_value}
+        return
+
+    for key in item_keys:
+        if key not in ground_truth_items:
+            differences[item_paths[key]] = {"model": model_items[key]}
+        elif key not in model_items:
+            differences[item_paths[key]] = {"ground_truth": ground_truth_items[key]}
+        elif model_items[key] != ground_truth_items[key]:
+            _diff_state(model_items[key], ground_truth_items[key], item_paths[key], differences)
+
+
 def _is_subsequence(list1, list2) -> tuple[bool, list]:
     """
     Checks if list1 is a subsequence of list2, i.e., all elements of list1 are present in list2 in the same order.
@@ -291,24 +352,26 @@ def _is_subsequence(list1, list2) -> tuple[bool, list]:
     ]
 
 
-def _is_subsequence_unordered(list1, list2) -> tuple[bool, list]:
+def _is_subsequence_unordered(
+    list1, list2, list2_counter: Optional[Counter] = None
+) -> tuple[bool, list]:
     """
     Checks if all elements of list1 are present in list2, regardless of order.
     Also returns the elements of list1 that are not present in list2.
+    Elements must be hashable; `list2_counter` can be passed to avoid counting the elements of list2 again.
     """
-    # Copy list2 to avoid modifying the original list during checks
-    list2_copy = list2[:]
-    
-    # Check each item in list1 to see if it exists in list2_copy
+    if list2_counter is None:
+        list2_counter = Counter(list2)
+
+    # Each occurrence in list2 can only match one item of list1, to handle duplicates
+    used_counts = Counter()
     missing_elements = []
     for item in list1:
-        try:
-            # Attempt to remove one occurrence of `item` from list2_copy to handle duplicates
-            list2_copy.remove(item)
-        except ValueError:
-            # If item is not found, add it to missing_elements
+        if used_counts[item] < list2_counter[item]:
+            used_counts[item] += 1
+        else:
             missing_elements.append(item)
-    
+
     # If there are missing elements, list1 is not a subsequence of list2
     is_subsequence = len(missing_elements) == 0
     return is_subsequence, missing_elements
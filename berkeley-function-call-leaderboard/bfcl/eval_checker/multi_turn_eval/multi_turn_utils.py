@@ -1,8 +1,13 @@
+import ast
 import importlib
 import inspect
 import json
+import os
 import re
-import copy
+import sys
+from typing import Optional
+
+from bfcl.utils import copy_json_like
 
 CLASS_FILE_PATH_MAPPING = {
     "GorillaFileSystem": "bfcl.eval_checker.multi_turn_eval.func_source_code.gorilla_file_system",
@@ -20,77 +25,163 @@ STATELESS_CLASSES = [
     "MathAPI",
 ]
 
+# Function names that are never executed, even if the model asks for them
+DISALLOWED_FUNCTION_NAMES = ["kill", "exit", "quit", "remove", "unlink", "popen", "Popen", "run"]
 
-def execute_multi_turn_func_call(
-    func_call_list: list[str],  # a list of strings of func calls
-    initial_config: dict,
-    involved_classes: list,
-    model_name: str,
-    test_entry_id: str,
-    long_context: bool = False,
-    is_evaL_run: bool = False,
-) -> tuple[list[str], dict]:
+# Class name -> (class, names of its public methods). Filled the first time each class is loaded.
+_CLASS_DISPATCH_TABLE: dict[str, tuple[type, tuple[str, ...]]] = {}
+
+# Set BFCL_REPORT_SESSION_MEMORY=true to print the approximate memory held by each execution session when it is released
+REPORT_SESSION_MEMORY = os.getenv("BFCL_REPORT_SESSION_MEMORY", "false").lower() == "true"
+
+
+class ExecutionSession:
     """
-    TODO: Add docstring
+    Owns the backend API instances used by one test entry.
+
+    The instances are created from the entry's initial configuration when the session is created, and they keep
+    their state across all the `execute_multi_turn_func_call` calls made with this session (ie, across steps and
+    turns of the same entry). Function calls are evaluated in a namespace private to the session, so instances of
+    different entries (or of the model and the ground truth of the same entry) never see each other.
+
+    The instances are dropped when the session is released, either explicitly with `release()`, by leaving the
+    `with` block, or when the session object itself is garbage collected.
     """
-    if is_evaL_run:
-        model_name += "_eval"
 
-    class_method_name_mapping = {}
-    involved_instances = {}
-    for class_name in involved_classes:
-        module_name = CLASS_FILE_PATH_MAPPING[class_name]
-        # TODO: Handler the model name issue from handler more elegantly
-        instance_name = (
-            f"{model_name.replace('-', '_').replace('.', '_').replace('/', '_')}_{test_entry_id}_{class_name.lower()}_instance"
-        )
-        if instance_name not in globals():
-            module = importlib.import_module(module_name)
-            class_ = getattr(module, class_name)
+    def __init__(
+        self, initial_config: dict, involved_classes: list, long_context: bool = False
+    ):
+        self.involved_instances = {}
+        self.class_method_name_mapping = {}
+        # Start from the module namespace, so that the evaluated calls see the same names as before
+        self.namespace = dict(globals())
+
+        # Method name -> bound method, used to execute calls without going through `eval`
+        self.bound_methods = {}
+        # Method name -> class name, to know which instances a call may have modified
+        self.method_owner = {}
+        # The last state snapshot of each class, and the classes that may have changed since then
+        self._state_snapshots = {}
+        self._dirty_classes = set(involved_classes)
+        # The number of calls that may have modified each instance, so a caller can tell if an instance changed
+        # since it last looked at it
+        self.modification_counts = {class_name: 0 for class_name in involved_classes}
+
+        for class_name in involved_classes:
+            instance_name = f"{class_name.lower()}_instance"
+            class_, method_names = _get_class_dispatch_table(class_name)
             class_instance = class_()
             if class_name not in STATELESS_CLASSES:
                 class_initial_config = initial_config.get(class_name, {})
-                # Deep copy the initial configuration to avoid mutation issues
+                # Deep copy the initial configuration to avoid mutation issues. It comes from the JSON dataset, so the
+                # plain container copy is enough and much cheaper than `copy.deepcopy`
                 class_instance._load_scenario(
-                    copy.deepcopy(class_initial_config), long_context=long_context
+                    copy_json_like(class_initial_config), long_context=long_context
                 )
-            globals()[instance_name] = class_instance
-        # This happens in subsequent turns
-        else:
-            class_instance = globals()[instance_name]
+            self.namespace[instance_name] = class_instance
+            self.involved_instances[class_name] = class_instance
 
-        involved_instances[class_name] = class_instance
+            for method_name in method_names:
+                self.class_method_name_mapping[method_name] = instance_name
+                self.bound_methods[method_name] = getattr(class_instance, method_name)
+                self.method_owner[method_name] = class_name
 
-        # Retrieve all method names and map them to the instance
-        for method_name, method in inspect.getmembers(
-            class_instance, predicate=inspect.ismethod
-        ):
-            # Skip private methods
-            if method_name.startswith("_"):
-                continue
-            class_method_name_mapping[method_name] = instance_name
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def instance_states(self) -> dict[str, dict]:
+        """
+        Snapshot the public attributes of every instance, keyed by class name.
+
+        The snapshots are copies, so later turns do not modify them. They are built incrementally: an instance that
+        received no call since the previous snapshot reuses that snapshot as is, and attributes that know how to
+        snapshot themselves (like the file system tree) share their unchanged parts with the previous snapshot.
+        Snapshots are never modified once taken, so sharing them between log entries (or turns) is safe.
+        """
+        for class_name, class_instance in self.involved_instances.items():
+            if class_name in self._dirty_classes or class_name not in self._state_snapshots:
+                previous_snapshot = self._state_snapshots.get(class_name, {})
+                self._state_snapshots[class_name] = {
+                    key: _snapshot_state_value(value, previous_snapshot.get(key))
+                    for key, value in vars(class_instance).items()
+                    if not key.startswith("_")
+                }
+        self._dirty_classes.clear()
+        return dict(self._state_snapshots)
+
+    def state_log(self) -> list[dict]:
+        """
+        The state of every stateful instance (see `instance_states`), in the `state_info` format of the inference log.
+        """
+        return [
+            {
+                "role": "state_info",
+                "class_name": class_name,
+                "content": instance_state,
+            }
+            for class_name, instance_state in self.instance_states().items()
+            if class_name not in STATELESS_CLASSES
+        ]
 
+    def _mark_modified(self, call_plan: Optional["_CallPlan"]) -> None:
+        if call_plan is None:
+            # Calls that go through `eval` could reach any instance
+            self._dirty_classes.update(self.involved_instances)
+            for class_name in self.involved_instances:
+                self.modification_counts[class_name] += 1
+            return
+        class_name = self.method_owner[call_plan.method_name]
+        self._dirty_classes.add(class_name)
+        self.modification_counts[class_name] += 1
+        for arg in list(call_plan.args) + list(call_plan.kwargs.values()):
+            if isinstance(arg, _CallPlan):
+                self._mark_modified(arg)
+
+    def memory_usage(self) -> int:
+        """
+        Approximate number of bytes held by the instances of this session.
+        """
+        return _approximate_deep_size(list(self.involved_instances.values()))
+
+    def release(self) -> None:
+        if REPORT_SESSION_MEMORY and self.involved_instances:
+            print(
+                f"🧹 Released execution session for {list(self.involved_instances)}: ~{self.memory_usage() / 1024:.1f} KiB"
+            )
+        self.involved_instances = {}
+        self.class_method_name_mapping = {}
+        self.bound_methods = {}
+        self.method_owner = {}
+        self._state_snapshots = {}
+        self.namespace = {}
+
+
+def execute_multi_turn_func_call(
+    func_call_list: list[str],  # a list of strings of func calls
+    session: ExecutionSession,
+) -> tuple[list[str], dict]:
+    """
+    Execute the function calls (one step of a turn) against the instances owned by the session.
+
+    Returns the execution result (as a string) of each function call, and the instances of the session keyed by
+    class name.
+    """
     execution_results = []
     for func_call in func_call_list:
-        # Add the instance name to the method calls
-        func_call = _process_method_calls(func_call, class_method_name_mapping)
+        # Most calls are a plain `method(arg=literal, ...)`; those are resolved directly to the bound method.
+        # Anything else goes through the original rewrite-and-eval path, which also produces the error messages.
+        call_plan = _compile_func_call(func_call, session.bound_methods)
+        session._mark_modified(call_plan)
 
         # Evaluate the function call
         try:
-            # We need to make a copy here because otherwise the `eval(func_call)` would error. 
-            func_call_copy = func_call
-            # Before calling `eval`, we need to make sure that the function call is safe
-            # We do so by checking if the function is `kill` or `exit`, etc.
-            # Extract the function name first
-            if "(" in func_call_copy:
-                func_call_copy = func_call_copy.split("(")[0]
-            # Situation where the function call is a method call
-            if "." in func_call_copy:
-                func_call_copy = func_call_copy.split(".")[1]
-            if func_call_copy in ["kill", "exit", "quit", "remove", "unlink", "popen", "Popen", "run"]:
-                raise Exception(f"Function call {func_call_copy} is not allowed.")
-
-            func_call_result = eval(func_call)
+            if call_plan is not None:
+                func_call_result = _run_call_plan(call_plan, session.bound_methods)
+            else:
+                func_call_result = _eval_func_call(func_call, session)
 
             if type(func_call_result) == str:
                 pass
@@ -107,7 +198,130 @@ def execute_multi_turn_func_call(
         except Exception as e:
             execution_results.append(f"Error during execution: {str(e)}")
 
-    return execution_results, involved_instances
+    return execution_results, session.involved_instances
+
+
+def _eval_func_call(func_call: str, session: ExecutionSession):
+    """
+    Execute a function call string by prepending the instance names to the method names and calling `eval`.
+    """
+    # Add the instance name to the method calls
+    func_call = _process_method_calls(func_call, session.class_method_name_mapping)
+
+    # We need to make a copy here because otherwise the `eval(func_call)` would error.
+    func_call_copy = func_call
+    # Before calling `eval`, we need to make sure that the function call is safe
+    # We do so by checking if the function is `kill` or `exit`, etc.
+    # Extract the function name first
+    if "(" in func_call_copy:
+        func_call_copy = func_call_copy.split("(")[0]
+    # Situation where the function call is a method call
+    if "." in func_call_copy:
+        func_call_copy = func_call_copy.split(".")[1]
+    if func_call_copy in DISALLOWED_FUNCTION_NAMES:
+        raise Exception(f"Function call {func_call_copy} is not allowed.")
+
+    return eval(func_call, session.namespace)
+
+
+def _get_class_dispatch_table(class_name: str) -> tuple[type, tuple[str, ...]]:
+    """
+    Return the class and the names of its public methods, importing the class on first use.
+    """
+    if class_name not in _CLASS_DISPATCH_TABLE:
+        module = importlib.import_module(CLASS_FILE_PATH_MAPPING[class_name])
+        class_ = getattr(module, class_name)
+        # Inspect an instance rather than the class, so that the method set is exactly what a bound call can reach
+        method_names = tuple(
+            method_name
+            for method_name, _ in inspect.getmembers(class_(), predicate=inspect.ismethod)
+            # Skip private methods
+            if not method_name.startswith("_")
+        )
+        _CLASS_DISPATCH_TABLE[class_name] = (class_, method_names)
+    return _CLASS_DISPATCH_TABLE[class_name]
+
+
+class _CallPlan:
+    """
+    A function call parsed from the model output: the method name, and its arguments as either literal values
+    or nested `_CallPlan`s.
+    """
+
+    __slots__ = ("method_name", "args", "kwargs")
+
+    def __init__(self, method_name: str, args: list, kwargs: dict):
+        self.method_name = method_name
+        self.args = args
+        self.kwargs = kwargs
+
+
+def _compile_func_call(func_call: str, bound_methods: dict):
+    """
+    Parse a function call string into a `_CallPlan`, without executing anything.
+
+    Returns None if the call is not a plain call to one of the known methods with literal (or nested call)
+    arguments, in which case the caller falls back to `eval`.
+    """
+    try:
+        tree = ast.parse(func_call, mode="eval")
+    except (SyntaxError, ValueError, MemoryError, RecursionError):
+        return None
+    return _compile_call_node(tree.body, bound_methods)
+
+
+def _compile_call_node(node: ast.AST, bound_methods: dict):
+    if (
+        not isinstance(node, ast.Call)
+        or not isinstance(node.func, ast.Name)
+        or node.func.id not in bound_methods
+        or node.func.id in DISALLOWED_FUNCTION_NAMES
+    ):
+        return None
+
+    args = []
+    for arg_node in node.args:
+        if isinstance(arg_node, ast.Starred):
+            return None
+        compiled, arg_value = _compile_argument_node(arg_node, bound_methods)
+        if not compiled:
+            return None
+        args.append(arg_value)
+
+    kwargs = {}
+    for keyword in node.keywords:
+        # `**kwargs` unpacking, or the same keyword passed twice (a SyntaxError in `eval`)
+        if keyword.arg is None or keyword.arg in kwargs:
+            return None
+        compiled, arg_value = _compile_argument_node(keyword.value, bound_methods)
+        if not compiled:
+            return None
+        kwargs[keyword.arg] = arg_value
+
+    return _CallPlan(node.func.id, args, kwargs)
+
+
+def _compile_argument_node(node: ast.AST, bound_methods: dict) -> tuple[bool, object]:
+    if isinstance(node, ast.Call):
+        call_plan = _compile_call_node(node, bound_methods)
+        return call_plan is not None, call_plan
+    try:
+        return True, ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return False, None
+
+
+def _run_call_plan(call_plan: _CallPlan, bound_methods: dict):
+    # Same evaluation order as Python: positional arguments first, then keyword arguments, left to right
+    args = [
+        _run_call_plan(arg, bound_methods) if isinstance(arg, _CallPlan) else arg
+        for arg in call_plan.args
+    ]
+    kwargs = {
+        key: _run_call_plan(value, bound_methods) if isinstance(value, _CallPlan) else value
+        for key, value in call_plan.kwargs.items()
+    }
+    return bound_methods[call_plan.method_name](*args, **kwargs)
 
 
 def is_empty_execute_response(input_list: list):
@@ -154,3 +368,38 @@ def _process_method_calls(function_call_string: str, instance_mapping: dict) ->
     processed_string = re.sub(pattern, replace_function, function_call_string)
 
     return processed_string
+
+
+def _approximate_deep_size(obj) -> int:
+    """
+    Sum of `sys.getsizeof` over every object reachable from `obj` through containers and instance attributes.
+    Each object is counted once.
+    """
+    seen = set()
+    total_size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        total_size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__") and not isinstance(current, type):
+            stack.append(vars(current))
+    return total_size
+
+
+def _snapshot_state_value(value, previous_snapshot):
+    """
+    Copy one attribute of a backend instance for the state log.
+    Objects that implement `_state_snapshot(previous_snapshot)` (eg, the file system tree) produce their own copy,
+    reusing the unchanged parts of the previous snapshot.
+    """
+    if hasattr(value, "_state_snapshot"):
+        return value._state_snapshot(previous_snapshot)
+    return copy_json_like(value)
@@ -1,6 +1,4 @@
-import json
 import time
-from copy import deepcopy
 
 from bfcl.constants.category_mapping import VERSION_PREFIX
 from bfcl.constants.default_prompts import (
@@ -10,12 +8,12 @@ from bfcl.constants.default_prompts import (
 )
 from bfcl.constants.eval_config import RESULT_PATH
 from bfcl.eval_checker.multi_turn_eval.multi_turn_utils import (
-    STATELESS_CLASSES,
+    ExecutionSession,
     execute_multi_turn_func_call,
     is_empty_execute_response,
 )
 from bfcl.model_handler.model_style import ModelStyle
-from bfcl.utils import load_file, make_json_serializable, sort_key
+from bfcl.utils import dumps_json_serializable, sort_key
 from overrides import final
 
 
@@ -80,229 +78,182 @@ class BaseHandler:
 
         all_reasoning_content: list[list] = []
         # Execute no function call, but just to get a reference to all the instances to get the initial state for logging purpose
-        if not exclude_state_log:
-            _, involved_instances = execute_multi_turn_func_call(
-                [],
-                initial_config,
-                involved_classes,
-                self.model_name_underline_replaced,
-                test_entry_id,
-                long_context=(
-                    "long_context" in test_category or "composite" in test_category
-                ),
-                is_evaL_run=False,
-            )
-            state_log = []
-            for class_name, class_instance in involved_instances.items():
-                if class_name in STATELESS_CLASSES:
-                    continue
-                # Avoid modification in future turns
-                class_instance = deepcopy(class_instance)
-                state_log.append(
-                    {
-                        "role": "state_info",
-                        "class_name": class_name,
-                        "content": {
-                            key: value
-                            for key, value in vars(class_instance).items()
-                            if not key.startswith("_")
-                        },
-                    }
-                )
-            all_inference_log.append(state_log)
+        # The session owns the backend instances for this entry; they are released once the entry is done
+        with ExecutionSession(
+            initial_config,
+            involved_classes,
+            long_context=("long_context" in test_category or "composite" in test_category),
+        ) as execution_session:
+            if not exclude_state_log:
+                all_inference_log.append(execution_session.state_log())
+
+            inference_data: dict = {}
+            inference_data = self._pre_query_processing_FC(inference_data, test_entry)
+            inference_data = self._compile_tools(inference_data, test_entry)
+
+            all_multi_turn_messages: list[list[dict]] = test_entry["question"]
+            for turn_idx, current_turn_message in enumerate(all_multi_turn_messages):
+                current_turn_message: list[dict]
+
+                if str(turn_idx) in holdout_function:
+                    test_entry["function"].extend(holdout_function[str(turn_idx)])
+                    # Since we have added new functions, we need to recompile the tools
+                    inference_data = self._compile_tools(inference_data, test_entry)
+                    assert (
+                        len(current_turn_message) == 0
+                    ), "Holdout turn should not have user message."
+                    current_turn_message = [
+                        {
+                            "role": "user",
+                            "content": DEFAULT_USER_PROMPT_FOR_ADDITIONAL_FUNCTION_FC,
+                        }
+                    ]
 
-        inference_data: dict = {}
-        inference_data = self._pre_query_processing_FC(inference_data, test_entry)
-        inference_data = self._compile_tools(inference_data, test_entry)
+                if turn_idx == 0:
+                    inference_data = self.add_first_turn_message_FC(
+                        inference_data, current_turn_message
+                    )
+                else:
+                    inference_data = self._add_next_turn_user_message_FC(
+                        inference_data, current_turn_message
+                    )
 
-        all_multi_turn_messages: list[list[dict]] = test_entry["question"]
-        for turn_idx, current_turn_message in enumerate(all_multi_turn_messages):
-            current_turn_message: list[dict]
-
-            if str(turn_idx) in holdout_function:
-                test_entry["function"].extend(holdout_function[str(turn_idx)])
-                # Since we have added new functions, we need to recompile the tools
-                inference_data = self._compile_tools(inference_data, test_entry)
-                assert (
-                    len(current_turn_message) == 0
-                ), "Holdout turn should not have user message."
-                current_turn_message = [
-                    {
-                        "role": "user",
-                        "content": DEFAULT_USER_PROMPT_FOR_ADDITIONAL_FUNCTION_FC,
-                    }
-                ]
+                current_turn_response = []
+                current_turn_inference_log: list[dict] = {
+                    "begin_of_turn_query": current_turn_message
+                }
+                current_turn_input_token_count: list[float] = []
+                current_turn_output_token_count: list[float] = []
+                current_turn_latency: list[float] = []
+                current_turn_reasoning_content = []
+
+                count = 0
+                while True:
+                    print("-" * 100)
+                    print(
+                        f"ID: {test_entry_id.replace('multi_turn_', '')}, Turn: {turn_idx}, Step: {count}"
+                    )
+                    current_step_inference_log: list[dict] = []
+                    # Add to the current_turn_inference_log at beginning of each step so that we don't need to bother dealing with the break statements
+                    current_turn_inference_log[f"step_{count}"] = current_step_inference_log
 
-            if turn_idx == 0:
-                inference_data = self.add_first_turn_message_FC(
-                    inference_data, current_turn_message
-                )
-            else:
-                inference_data = self._add_next_turn_user_message_FC(
-                    inference_data, current_turn_message
-                )
+                    api_response, query_latency = self._query_FC(inference_data)
 
-            current_turn_response = []
-            current_turn_inference_log: list[dict] = {
-                "begin_of_turn_query": current_turn_message
-            }
-            current_turn_input_token_count: list[float] = []
-            current_turn_output_token_count: list[float] = []
-            current_turn_latency: list[float] = []
-            current_turn_reasoning_content = []
-
-            count = 0
-            while True:
-                print("-" * 100)
-                print(
-                    f"ID: {test_entry_id.replace('multi_turn_', '')}, Turn: {turn_idx}, Step: {count}"
-                )
-                current_step_inference_log: list[dict] = []
-                # Add to the current_turn_inference_log at beginning of each step so that we don't need to bother dealing with the break statements
-                current_turn_inference_log[f"step_{count}"] = current_step_inference_log
+                    # This part of logging is disabled by default because it is too verbose and will make the result file extremely large
+                    # It is only useful to see if the inference pipeline is working as expected (eg, does it convert all the inputs correctly)
+                    if include_input_log:
+                        current_step_inference_log.append(
+                            {
+                                "role": "inference_input",
+                                "content": inference_data.get("inference_input_log", ""),
+                            }
+                        )
 
-                api_response, query_latency = self._query_FC(inference_data)
+                    # Try parsing the model response
+                    model_response_data = self._parse_query_response_FC(api_response)
+                    model_responses = model_response_data["model_responses"]
 
-                # This part of logging is disabled by default because it is too verbose and will make the result file extremely large
-                # It is only useful to see if the inference pipeline is working as expected (eg, does it convert all the inputs correctly)
-                if include_input_log:
-                    current_step_inference_log.append(
-                        {
-                            "role": "inference_input",
-                            "content": inference_data.get("inference_input_log", ""),
-                        }
+                    # Add the assistant message to the chat history
+                    inference_data = self._add_assistant_message_FC(
+                        inference_data, model_response_data
                     )
 
-                # Try parsing the model response
-                model_response_data = self._parse_query_response_FC(api_response)
-                model_responses = model_response_data["model_responses"]
+                    # Process the metadata
+                    current_turn_input_token_count.append(model_response_data["input_token"])
+                    current_turn_output_token_count.append(model_response_data["output_token"])
+                    current_turn_latency.append(query_latency)
 
-                # Add the assistant message to the chat history
-                inference_data = self._add_assistant_message_FC(
-                    inference_data, model_response_data
-                )
-
-                # Process the metadata
-                current_turn_input_token_count.append(model_response_data["input_token"])
-                current_turn_output_token_count.append(model_response_data["output_token"])
-                current_turn_latency.append(query_latency)
+                    current_turn_response.append(model_responses)
 
-                current_turn_response.append(model_responses)
+                    reasoning_content = model_response_data.get("reasoning_content", "")
+                    current_turn_reasoning_content.append(reasoning_content)
 
-                reasoning_content = model_response_data.get("reasoning_content", "")
-                current_turn_reasoning_content.append(reasoning_content)
-
-                log_entry = {
-                    "role": "assistant",
-                    "content": model_responses,
-                }
-                if reasoning_content:
-                    log_entry["reasoning_content"] = reasoning_content
-
-                current_step_inference_log.append(log_entry)
+                    log_entry = {
+                        "role": "assistant",
+                        "content": model_responses,
+                    }
+                    if reasoning_content:
+                        log_entry["reasoning_content"] = reasoning_content
 
-                # Try decoding the model response
-                try:
-                    decoded_model_responses = self.decode_execute(model_responses)
-                    current_step_inference_log.append(
-                        {
-                            "role": "handler_log",
-                            "content": "Successfully decoded model response.",
-                            "model_response_decoded": decoded_model_responses,
-                        }
-                    )
+                    current_step_inference_log.append(log_entry)
 
-                    if is_empty_execute_response(decoded_model_responses):
-                        print("Empty response from the model. Proceed to next turn.")
+                    # Try decoding the model response
+                    try:
+                        decoded_model_responses = self.decode_execute(model_responses)
                         current_step_inference_log.append(
                             {
                                 "role": "handler_log",
-                                "content": f"Empty response from the model. Proceed to next turn.",
+                                "content": "Successfully decoded model response.",
                                 "model_response_decoded": decoded_model_responses,
                             }
                         )
+
+                        if is_empty_execute_response(decoded_model_responses):
+                            print("Empty response from the model. Proceed to next turn.")
+                            current_step_inference_log.append(
+                                {
+                                    "role": "handler_log",
+                                    "content": f"Empty response from the model. Proceed to next turn.",
+                                    "model_response_decoded": decoded_model_responses,
+                                }
+                            )
+                            break
+
+                    except Exception as e:
+                        print("Failed to decode the model response. Proceed to next turn.")
+                        current_step_inference_log.append(
+                            {
+                                "role": "handler_log",
+                                "content": f"Error decoding the model response. Proceed to next turn.",
+                                "error": str(e),
+                            }
+                        )
                         break
 
-                except Exception as e:
-                    print("Failed to decode the model response. Proceed to next turn.")
-                    current_step_inference_log.append(
-                        {
-                            "role": "handler_log",
-                            "content": f"Error decoding the model response. Proceed to next turn.",
-                            "error": str(e),
-                        }
+                    # Obtain the execution results
+                    execution_results, _ = execute_multi_turn_func_call(
+                        decoded_model_responses, execution_session
                     )
-                    break
-
-                # Obtain the execution results
-                execution_results, involved_instances = execute_multi_turn_func_call(
-                    decoded_model_responses,
-                    initial_config,
-                    involved_classes,
-                    self.model_name_underline_replaced,
-                    test_entry_id,
-                    long_context=(
-                        "long_context" in test_category or "composite" in test_category
-                    ),
-                    is_evaL_run=False,
-                )
 
-                # Add the execution results to the chat history for the next turn
-                inference_data = self._add_execution_results_FC(
-                    inference_data, execution_results, model_response_data
-                )
-
-                for execution_result in execution_results:
-                    current_step_inference_log.append(
-                        {
-                            "role": "tool",
-                            "content": execution_result,
-                        }
+                    # Add the execution results to the chat history for the next turn
+                    inference_data = self._add_execution_results_FC(
+                        inference_data, execution_results, model_response_data
                     )
 
-                count += 1
-                # Force quit after too many steps
-                if count > MAXIMUM_STEP_LIMIT:
-                    force_quit = True
-                    current_step_inference_log.append(
-                        {
-                            "role": "handler_log",
-                            "content": f"Model has been forced to quit after {MAXIMUM_STEP_LIMIT} steps.",
-                        }
-                    )
+                    for execution_result in execution_results:
+                        current_step_inference_log.append(
+                            {
+                                "role": "tool",
+                                "content": execution_result,
+                            }
+                        )
 
-                    break
+                    count += 1
+                    # Force quit after too many steps
+                    if count > MAXIMUM_STEP_LIMIT:
+                        force_quit = True
+                        current_step_inference_log.append(
+                            {
+                                "role": "handler_log",
+                                "content": f"Model has been forced to quit after {MAXIMUM_STEP_LIMIT} steps.",
+                            }
+                        )
 
-            # Add to the total list
-            all_model_response.append(current_turn_response)
-            all_inference_log.append(current_turn_inference_log)
-            all_reasoning_content.append(current_turn_reasoning_content)
-            total_input_token_count.append(current_turn_input_token_count)
-            total_output_token_count.append(current_turn_output_token_count)
-            total_latency.append(current_turn_latency)
+                        break
 
-            if not exclude_state_log:
-                state_log = []
-                for class_name, class_instance in involved_instances.items():
-                    if class_name in STATELESS_CLASSES:
-                        continue
-                    # Avoid modification in future turns
-                    class_instance = deepcopy(class_instance)
-                    state_log.append(
-                        {
-                            "role": "state_info",
-                            "class_name": class_name,
-                            "content": {
-                                key: value
-                                for key, value in vars(class_instance).items()
-                                if not key.startswith("_")
-                            },
-                        }
-                    )
-                all_inference_log.append(state_log)
+                # Add to the total list
+                all_model_response.append(current_turn_response)
+                all_inference_log.append(current_turn_inference_log)
+                all_reasoning_content.append(current_turn_reasoning_content)
+                total_input_token_count.append(current_turn_input_token_count)
+                total_output_token_count.append(current_turn_output_token_count)
+                total_latency.append(current_turn_latency)
 
-            if force_quit:
-                break
+                if not exclude_state_log:
+                    all_inference_log.append(execution_session.state_log())
+
+                if force_quit:
+                    break
 
         metadata = {
             "input_token_count": total_input_token_count,
@@ -344,225 +295,178 @@ class BaseHandler:
         force_quit = False  # Whether the model has been forced to quit. If True, this whole entry will be failed.
 
         # Execute no function call, but just to get a reference to all the instances to get the initial state for logging purpose
-        if not exclude_state_log:
-            _, involved_instances = execute_multi_turn_func_call(
-                [],
-                initial_config,
-                involved_classes,
-                self.model_name_underline_replaced,
-                test_entry_id,
-                long_context=(
-                    "long_context" in test_category or "composite" in test_category
-                ),
-                is_evaL_run=False,
-            )
-            state_log = []
-            for class_name, class_instance in involved_instances.items():
-                if class_name in STATELESS_CLASSES:
-                    continue
-                # Avoid modification in future turns
-                class_instance = deepcopy(class_instance)
-                state_log.append(
-                    {
-                        "role": "state_info",
-                        "class_name": class_name,
-                        "content": {
-                            key: value
-                            for key, value in vars(class_instance).items()
-                            if not key.startswith("_")
-                        },
-                    }
-                )
-            all_inference_log.append(state_log)
+        # The session owns the backend instances for this entry; they are released once the entry is done
+        with ExecutionSession(
+            initial_config,
+            involved_classes,
+            long_context=("long_context" in test_category or "composite" in test_category),
+        ) as execution_session:
+            if not exclude_state_log:
+                all_inference_log.append(execution_session.state_log())
 
-        inference_data: dict = self._pre_query_processing_prompting(test_entry)
+            inference_data: dict = self._pre_query_processing_prompting(test_entry)
 
-        all_multi_turn_messages: list[list[dict]] = test_entry["question"]
-        for turn_idx, current_turn_message in enumerate(all_multi_turn_messages):
-            current_turn_message: list[dict]
-
-            if str(turn_idx) in holdout_function:
-                assert (
-                    len(current_turn_message) == 0
-                ), "Holdout turn should not have user message."
-                current_turn_message = [
-                    {
-                        "role": "user",
-                        "content": DEFAULT_USER_PROMPT_FOR_ADDITIONAL_FUNCTION_PROMPTING.format(
-                            functions=holdout_function[str(turn_idx)]
-                        ),
-                    }
-                ]
-
-            if turn_idx == 0:
-                inference_data = self.add_first_turn_message_prompting(
-                    inference_data, current_turn_message
-                )
-            else:
-                inference_data = self._add_next_turn_user_message_prompting(
-                    inference_data, current_turn_message
-                )
-
-            current_turn_response = []
-            current_turn_reasoning_content = []
-            current_turn_inference_log: list[dict] = {
-                "begin_of_turn_query": current_turn_message
-            }
-            current_turn_input_token_count: list[float] = []
-            current_turn_output_token_count: list[float] = []
-            current_turn_latency: list[float] = []
-
-            count = 0
-            while True:
-                print("-" * 100)
-                print(
-                    f"ID: {test_entry_id.replace('multi_turn_', '')}, Turn: {turn_idx}, Step: {count}"
-                )
-                current_step_inference_log: list[dict] = []
-                # Add to the current_turn_inference_log at beginning of each step so that we don't need to bother dealing with the break statements
-                current_turn_inference_log[f"step_{count}"] = current_step_inference_log
+            all_multi_turn_messages: list[list[dict]] = test_entry["question"]
+            for turn_idx, current_turn_message in enumerate(all_multi_turn_messages):
+                current_turn_message: list[dict]
 
-                api_response, query_latency = self._query_prompting(inference_data)
-
-                # This part of logging is disabled by default because it is too verbose and will make the result file extremely large
-                # It is only useful to see if the inference pipeline is working as expected (eg, does it convert all the inputs correctly)
-                if include_input_log:
-                    current_step_inference_log.append(
+                if str(turn_idx) in holdout_function:
+                    assert (
+                        len(current_turn_message) == 0
+                    ), "Holdout turn should not have user message."
+                    current_turn_message = [
                         {
-                            "role": "inference_input",
-                            "content": inference_data.get("inference_input_log", ""),
+                            "role": "user",
+                            "content": DEFAULT_USER_PROMPT_FOR_ADDITIONAL_FUNCTION_PROMPTING.format(
+                                functions=holdout_function[str(turn_idx)]
+                            ),
                         }
+                    ]
+
+                if turn_idx == 0:
+                    inference_data = self.add_first_turn_message_prompting(
+                        inference_data, current_turn_message
+                    )
+                else:
+                    inference_data = self._add_next_turn_user_message_prompting(
+                        inference_data, current_turn_message
+                    )
+
+                current_turn_response = []
+                current_turn_reasoning_content = []
+                current_turn_inference_log: list[dict] = {
+                    "begin_of_turn_query": current_turn_message
+                }
+                current_turn_input_token_count: list[float] = []
+                current_turn_output_token_count: list[float] = []
+                current_turn_latency: list[float] = []
+
+                count = 0
+                while True:
+                    print("-" * 100)
+                    print(
+                        f"ID: {test_entry_id.replace('multi_turn_', '')}, Turn: {turn_idx}, Step: {count}"
                     )
+                    current_step_inference_log: list[dict] = []
+                    # Add to the current_turn_inference_log at beginning of each step so that we don't need to bother dealing with the break statements
+                    current_turn_inference_log[f"step_{count}"] = current_step_inference_log
 
-                # Try parsing the model response
-                model_response_data = self._parse_query_response_prompting(api_response)
-                model_responses = model_response_data["model_responses"]
+                    api_response, query_latency = self._query_prompting(inference_data)
 
-                # Add the assistant message to the chat history
-                inference_data = self._add_assistant_message_prompting(
-                    inference_data, model_response_data
-                )
+                    # This part of logging is disabled by default because it is too verbose and will make the result file extremely large
+                    # It is only useful to see if the inference pipeline is working as expected (eg, does it convert all the inputs correctly)
+                    if include_input_log:
+                        current_step_inference_log.append(
+                            {
+                                "role": "inference_input",
+                                "content": inference_data.get("inference_input_log", ""),
+                            }
+                        )
 
-                # Process the metadata
-                current_turn_input_token_count.append(model_response_data["input_token"])
-                current_turn_output_token_count.append(model_response_data["output_token"])
-                current_turn_latency.append(query_latency)
+                    # Try parsing the model response
+                    model_response_data = self._parse_query_response_prompting(api_response)
+                    model_responses = model_response_data["model_responses"]
 
-                current_turn_response.append(model_responses)
-                reasoning_content = model_response_data.get("reasoning_content", "")
-                current_turn_reasoning_content.append(reasoning_content)
+                    # Add the assistant message to the chat history
+                    inference_data = self._add_assistant_message_prompting(
+                        inference_data, model_response_data
+                    )
 
-                log_entry = {
-                    "role": "assistant",
-                    "content": model_responses,
-                }
-                if reasoning_content:
-                    log_entry["reasoning_content"] = reasoning_content
+                    # Process the metadata
+                    current_turn_input_token_count.append(model_response_data["input_token"])
+                    current_turn_output_token_count.append(model_response_data["output_token"])
+                    current_turn_latency.append(query_latency)
 
-                current_step_inference_log.append(log_entry)
+                    current_turn_response.append(model_responses)
+                    reasoning_content = model_response_data.get("reasoning_content", "")
+                    current_turn_reasoning_content.append(reasoning_content)
 
-                # Try decoding the model response
-                try:
-                    decoded_model_responses = self.decode_execute(model_responses)
-                    current_step_inference_log.append(
-                        {
-                            "role": "handler_log",
-                            "content": "Successfully decoded model response.",
-                            "model_response_decoded": decoded_model_responses,
-                        }
-                    )
+                    log_entry = {
+                        "role": "assistant",
+                        "content": model_responses,
+                    }
+                    if reasoning_content:
+                        log_entry["reasoning_content"] = reasoning_content
 
-                    model_response_data["model_responses_decoded"] = decoded_model_responses
-                    if is_empty_execute_response(decoded_model_responses):
-                        print("Empty response from the model. Proceed to next turn.")
+                    current_step_inference_log.append(log_entry)
+
+                    # Try decoding the model response
+                    try:
+                        decoded_model_responses = self.decode_execute(model_responses)
                         current_step_inference_log.append(
                             {
                                 "role": "handler_log",
-                                "content": f"Empty response from the model. Proceed to next turn.",
+                                "content": "Successfully decoded model response.",
                                 "model_response_decoded": decoded_model_responses,
                             }
                         )
+
+                        model_response_data["model_responses_decoded"] = decoded_model_responses
+                        if is_empty_execute_response(decoded_model_responses):
+                            print("Empty response from the model. Proceed to next turn.")
+                            current_step_inference_log.append(
+                                {
+                                    "role": "handler_log",
+                                    "content": f"Empty response from the model. Proceed to next turn.",
+                                    "model_response_decoded": decoded_model_responses,
+                                }
+                            )
+                            break
+
+                    except Exception as e:
+                        print("Failed to decode the model response. Proceed to next turn.")
+                        current_step_inference_log.append(
+                            {
+                                "role": "handler_log",
+                                "content": f"Error decoding the model response. Proceed to next turn.",
+                                "error": str(e),
+                            }
+                        )
                         break
 
-                except Exception as e:
-                    print("Failed to decode the model response. Proceed to next turn.")
-                    current_step_inference_log.append(
-                        {
-                            "role": "handler_log",
-                            "content": f"Error decoding the model response. Proceed to next turn.",
-                            "error": str(e),
-                        }
+                    # Obtain the execution results
+                    execution_results, _ = execute_multi_turn_func_call(
+                        decoded_model_responses, execution_session
                     )
-                    break
 
-                # Obtain the execution results
-                execution_results, involved_instances = execute_multi_turn_func_call(
-                    decoded_model_responses,
-                    initial_config,
-                    involved_classes,
-                    self.model_name_underline_replaced,
-                    test_entry_id,
-                    long_context=(
-                        "long_context" in test_category or "composite" in test_category
-                    ),
-                    is_evaL_run=False,
-                )
-
-                # Add the execution results to the chat history for the next turn
-                inference_data = self._add_execution_results_prompting(
-                    inference_data, execution_results, model_response_data
-                )
-
-                for execution_result in execution_results:
-                    current_step_inference_log.append(
-                        {
-                            "role": "tool",
-                            "content": execution_result,
-                        }
+                    # Add the execution results to the chat history for the next turn
+                    inference_data = self._add_execution_results_prompting(
+                        inference_data, execution_results, model_response_data
                     )
 
-                count += 1
-                # Force quit after too many steps
-                if count > MAXIMUM_STEP_LIMIT:
-                    force_quit = True
-                    current_step_inference_log.append(
-                        {
-                            "role": "handler_log",
-                            "content": f"Model has been forced to quit after {MAXIMUM_STEP_LIMIT} steps.",
-                        }
-                    )
-                    break
+                    for execution_result in execution_results:
+                        current_step_inference_log.append(
+                            {
+                                "role": "tool",
+                                "content": execution_result,
+                            }
+                        )
+
+                    count += 1
+                    # Force quit after too many steps
+                    if count > MAXIMUM_STEP_LIMIT:
+                        force_quit = True
+                        current_step_inference_log.append(
+                            {
+                                "role": "handler_log",
+                                "content": f"Model has been forced to quit after {MAXIMUM_STEP_LIMIT} steps.",
+                            }
+                        )
+                        break
 
-            # Add to the total list
-            all_model_response.append(current_turn_response)
-            all_reasoning_content.append(current_turn_reasoning_content)
-            all_inference_log.append(current_turn_inference_log)
-            total_input_token_count.append(current_turn_input_token_count)
-            total_output_token_count.append(current_turn_output_token_count)
-            total_latency.append(current_turn_latency)
+                # Add to the total list
+                all_model_response.append(current_turn_response)
+                all_reasoning_content.append(current_turn_reasoning_content)
+                all_inference_log.append(current_turn_inference_log)
+                total_input_token_count.append(current_turn_input_token_count)
+                total_output_token_count.append(current_turn_output_token_count)
+                total_latency.append(current_turn_latency)
 
-            if not exclude_state_log:
-                state_log = []
-                for class_name, class_instance in involved_instances.items():
-                    if class_name in STATELESS_CLASSES:
-                        continue
-                    # Avoid modification in future turns
-                    class_instance = deepcopy(class_instance)
-                    state_log.append(
-                        {
-                            "role": "state_info",
-                            "class_name": class_name,
-                            "content": {
-                                key: value
-                                for key, value in vars(class_instance).items()
-                                if not key.startswith("_")
-                            },
-                        }
-                    )
-                all_inference_log.append(state_log)
+                if not exclude_state_log:
+                    all_inference_log.append(execution_session.state_log())
 
-            if force_quit:
-                break
+                if force_quit:
+                    break
 
         metadata = {
             "input_token_count": total_input_token_count,
@@ -658,7 +562,7 @@ class BaseHandler:
         raise NotImplementedError
 
     @final
-    def write(self, result, result_dir, update_mode=False):
+    def write(self, result, result_dir):
         model_name_dir = self.model_name.replace("/", "_")
         model_result_dir = result_dir / model_name_dir
         model_result_dir.mkdir(parents=True, exist_ok=True)
@@ -666,42 +570,20 @@ class BaseHandler:
         if isinstance(result, dict):
             result = [result]
 
-        # Collect and format each entry for JSON compatibility
-        entries_to_write = [make_json_serializable(entry) for entry in result]
-
         # Group entries by their `test_category` for efficient file handling
         file_entries = {}
-        for entry in entries_to_write:
+        for entry in result:
             test_category = entry["id"].rsplit("_", 1)[0]
             file_name = f"{VERSION_PREFIX}_{test_category}_result.json"
             file_path = model_result_dir / file_name
             file_entries.setdefault(file_path, []).append(entry)
 
         for file_path, entries in file_entries.items():
-            if update_mode:
-                # Load existing entries from the file
-                existing_entries = {}
-                if file_path.exists():
-                    existing_entries = {
-                        entry["id"]: entry for entry in load_file(file_path)
-                    }
-
-                # Update existing entries with new data
+            # Append in sorted order
+            entries.sort(key=sort_key)
+            with open(file_path, "a") as f:
                 for entry in entries:
-                    existing_entries[entry["id"]] = entry
-
-                # Sort entries by `id` and write them back to ensure order consistency
-                sorted_entries = sorted(existing_entries.values(), key=sort_key)
-                with open(file_path, "w") as f:
-                    for entry in sorted_entries:
-                        f.write(json.dumps(entry) + "\n")
-
-            else:
-                # Normal mode: Append in sorted order
-                entries.sort(key=sort_key)
-                with open(file_path, "a") as f:
-                    for entry in entries:
-                        f.write(json.dumps(entry) + "\n")
+                    f.write(dumps_json_serializable(entry) + "\n")
 
     #### FC methods ####
 
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import sqlite3
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from bfcl.utils import dumps_json_serializable
+
+# Kept next to the result files of the model; it does not end with `.json`, so the evaluation runner never picks it up
+INFERENCE_LOG_STORE_FILE_NAME = "inference_logs.sqlite"
+
+
+def get_inference_log_store_path(model_result_dir: Path) -> Path:
+    return model_result_dir / INFERENCE_LOG_STORE_FILE_NAME
+
+
+class InferenceLogStore:
+    """
+    A side store for the inference logs of one model, so that the result files only carry a reference to each log.
+
+    A log is a list of items (state snapshots, turns, inference inputs). Each item is stored once, zlib-compressed and
+    keyed by the hash of its JSON text, so the items repeated across entries and turns (eg, the initial state of the
+    backend APIs, or a state that did not change during a turn) take no extra space. A log itself is stored as the
+    list of its item hashes, under an id derived from those hashes.
+
+    The store is a SQLite database; a connection must only be used from the thread that opened it.
+    """
+
+    def __init__(self, store_path: Path):
+        self.store_path = Path(store_path)
+        self._connection = sqlite3.connect(self.store_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS items (item_id TEXT PRIMARY KEY, data BLOB NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS logs (log_id TEXT PRIMARY KEY, item_ids TEXT NOT NULL)"
+        )
+
+    def put(self, inference_log: list) -> str:
+        """
+        Store an inference log and return its id; values that are not JSON serializable are stored as their `str()`. The log is committed before this returns.
+        """
+        item_ids = []
+        with self._connection:
+            for item in inference_log:
+                item_json = dumps_json_serializable(item)
+                item_id = hashlib.sha256(item_json.encode()).hexdigest()
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO items VALUES (?, ?)",
+                    (item_id, zlib.compress(item_json.encode())),
+                )
+                item_ids.append(item_id)
+
+            item_ids_json = json.dumps(item_ids)
+            log_id = hashlib.sha256(item_ids_json.encode()).hexdigest()
+            self._connection.execute(
+                "INSERT OR IGNORE INTO logs VALUES (?, ?)", (log_id, item_ids_json)
+            )
+        return log_id
+
+    def get(self, log_id: str) -> Optional[list]:
+        row = self._connection.execute(
+            "SELECT item_ids FROM logs WHERE log_id = ?", (log_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        inference_log = []
+        for item_id in json.loads(row[0]):
+            (data,) = self._connection.execute(
+                "SELECT data FROM items WHERE item_id = ?", (item_id,)
+            ).fetchone()
+            inference_log.append(json.loads(zlib.decompress(data)))
+        return inference_log
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def load_inference_log(model_result_dir: Path, log_id: str) -> Optional[list]:
+    """
+    Load one inference log of a model from its store, eg, for an entry of a result or score file that has an
+    `inference_log_id` instead of an `inference_log`.
+    """
+    store_path = get_inference_log_store_path(model_result_dir)
+    if not store_path.exists():
+        return None
+    store = InferenceLogStore(store_path)
+    try:
+        return store.get(log_id)
+    finally:
+        store.close()
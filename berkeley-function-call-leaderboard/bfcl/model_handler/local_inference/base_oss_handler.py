@@ -1,24 +1,52 @@
+import hashlib
+import json
 import os
-import subprocess
-import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from copy import deepcopy
 from typing import Optional
 
-import requests
 from bfcl.constants.eval_config import RESULT_PATH, VLLM_PORT
 from bfcl.model_handler.base_handler import BaseHandler
+from bfcl.model_handler.local_inference.completion_batcher import CompletionBatcher
+from bfcl.model_handler.local_inference.server_pool import (
+    get_server_pool,
+    shutdown_server_pools,
+)
 from bfcl.model_handler.model_style import ModelStyle
+from bfcl.model_handler.result_writer import ResultWriter
 from bfcl.model_handler.utils import (
     default_decode_ast_prompting,
     default_decode_execute_prompting,
     func_doc_language_specific_pre_processing,
     system_prompt_pre_processing_chat_model,
 )
-from openai import OpenAI
 from overrides import EnforceOverrides, final, override
 from tqdm import tqdm
 
+# Tokenizing the new part of a prompt on its own can differ from the exact count by a token or two where it joins the
+# previous part, so `max_tokens` keeps this much headroom for every prompt extension counted that way
+PROMPT_EXTENSION_TOKEN_MARGIN = 4
+
+
+def order_by_prompt_prefix(test_entries: list[dict]) -> list[dict]:
+    """
+    Reorder the test entries so that the entries that share a system prompt are sent one after another.
+
+    The system prompt (and so the longest common prefix of the prompts) is built from the function docs and the
+    test category, so entries with the same function docs in the same category form a group. Groups are ordered by
+    their first entry, and the entries in a group keep their relative order. The server can then reuse the cached
+    prefix of the group while its entries are being generated.
+    """
+    groups = {}
+    for test_entry in test_entries:
+        test_category = test_entry["id"].rsplit("_", 1)[0]
+        prefix_key = hashlib.sha256(
+            json.dumps([test_category, test_entry["function"]]).encode()
+        ).hexdigest()
+        groups.setdefault(prefix_key, []).append(test_entry)
+    return [test_entry for group in groups.values() for test_entry in group]
+
 
 class OSSHandler(BaseHandler, EnforceOverrides):
     def __init__(self, model_name, temperature, dtype="bfloat16") -> None:
@@ -35,8 +63,14 @@ class OSSHandler(BaseHandler, EnforceOverrides):
         self.vllm_host = os.getenv("VLLM_ENDPOINT", "localhost")
         self.vllm_port = os.getenv("VLLM_PORT", VLLM_PORT)
 
-        self.base_url = f"http://{self.vllm_host}:{self.vllm_port}/v1"
-        self.client = OpenAI(base_url=self.base_url, api_key="EMPTY")
+        # Set in batch_inference method, once the servers are ready
+        self.server_pool = None
+        # Set in batch_inference method when prompts are sent to the server in batches
+        self.completion_batcher = None
+        # The number of multi-prompt requests that can be in flight at the same time in batched mode
+        self.max_concurrent_batches = 16
+        # Set in batch_inference method; whether to count prompt tokens from the `prompt_tokens` reported by the server
+        self.server_prompt_token_count = False
 
     @override
     def inference(self, test_entry: dict, include_input_log: bool, exclude_state_log: bool):
@@ -69,11 +103,30 @@ class OSSHandler(BaseHandler, EnforceOverrides):
         local_model_path: Optional[str],
         include_input_log: bool,
         exclude_state_log: bool,
-        update_mode: bool,
         result_dir=RESULT_PATH,
+        batch_size: int = 1,
+        batch_window: float = 0.05,
+        order_by_prefix: bool = False,
+        num_replicas: int = 1,
+        external_inference_log: bool = False,
+        server_prompt_token_count: bool = False,
     ):
         """
         Batch inference for OSS models.
+
+        With a `batch_size` larger than 1, the prompts that are ready at the same time are sent to the server in
+        multi-prompt completion requests of up to `batch_size` prompts; a prompt waits at most `batch_window`
+        seconds for others to join its request.
+
+        With `order_by_prefix`, entries that share a system prompt are sent together, to make the most of the
+        prefix caching of the server. The result files are still written in the canonical order.
+
+        The model is served by `num_replicas` servers of `num_gpus` GPUs each, and requests go to the least busy one.
+        The servers are kept running after this call, so that a following model served by the same weights can
+        reuse them (see `get_server_pool`).
+
+        With `server_prompt_token_count`, the prompt token count of each multi-turn step is based on the exact count
+        the server reported for the previous step, instead of on the local tokenizer only (see `_count_prompt_tokens`).
         """
         from transformers import AutoConfig, AutoTokenizer
 
@@ -105,6 +158,7 @@ class OSSHandler(BaseHandler, EnforceOverrides):
                 "trust_remote_code": True,
             }
 
+        self.server_prompt_token_count = server_prompt_token_count
         self.tokenizer = AutoTokenizer.from_pretrained(**load_kwargs)
         config = AutoConfig.from_pretrained(**load_kwargs)
 
@@ -119,106 +173,40 @@ class OSSHandler(BaseHandler, EnforceOverrides):
                 )
         print(f"Max context length: {self.max_context_length}")
 
-        if not skip_server_setup:
-            if backend == "vllm":
-                process = subprocess.Popen(
-                    [
-                        "vllm",
-                        "serve",
-                        str(self.model_path_or_id),
-                        "--port",
-                        str(self.vllm_port),
-                        "--dtype",
-                        str(self.dtype),
-                        "--tensor-parallel-size",
-                        str(num_gpus),
-                        "--gpu-memory-utilization",
-                        str(gpu_memory_utilization),
-                        "--trust-remote-code",
-                    ],
-                    stdout=subprocess.PIPE,  # Capture stdout
-                    stderr=subprocess.PIPE,  # Capture stderr
-                    text=True,  # To get the output as text instead of bytes
-                )
-            elif backend == "sglang":
-
-                process = subprocess.Popen(
-                    [
-                        "python",
-                        "-m",
-                        "sglang.launch_server",
-                        "--model-path",
-                        str(self.model_path_or_id),
-                        "--port",
-                        str(self.vllm_port),
-                        "--dtype",
-                        str(self.dtype),
-                        "--tp",
-                        str(num_gpus),
-                        "--mem-fraction-static",
-                        str(gpu_memory_utilization),
-                        "--trust-remote-code",
-                    ],
-                    stdout=subprocess.PIPE,  # Capture stdout
-                    stderr=subprocess.PIPE,  # Capture stderr
-                    text=True,  # To get the output as text instead of bytes
-                )
-            else:
-                raise ValueError(f"Backend {backend} is not supported.")
-
-            stop_event = threading.Event()
-            # Event to signal threads to stop; no need to see logs after server is ready
-
-            def log_subprocess_output(pipe, stop_event):
-                # Read lines until stop event is set
-                for line in iter(pipe.readline, ""):
-                    if stop_event.is_set():
-                        break
-                    else:
-                        print(line, end="")
-                pipe.close()
-                print("server log tracking thread stopped successfully.")
-
-            # Start threads to read and print stdout and stderr
-            stdout_thread = threading.Thread(
-                target=log_subprocess_output, args=(process.stdout, stop_event)
-            )
-            stderr_thread = threading.Thread(
-                target=log_subprocess_output, args=(process.stderr, stop_event)
-            )
-            stdout_thread.start()
-            stderr_thread.start()
+        self.server_pool = get_server_pool(
+            model_path_or_id=self.model_path_or_id,
+            backend=backend,
+            dtype=self.dtype,
+            num_gpus=num_gpus,
+            num_replicas=num_replicas,
+            gpu_memory_utilization=gpu_memory_utilization,
+            host=self.vllm_host,
+            port=self.vllm_port,
+            skip_server_setup=skip_server_setup,
+        )
 
         try:
-            # Wait for the server to be ready
-            server_ready = False
-            while not server_ready:
-                # Check if the process has terminated unexpectedly
-                if not skip_server_setup and process.poll() is not None:
-                    # Output the captured logs
-                    stdout, stderr = process.communicate()
-                    print(stdout)
-                    print(stderr)
-                    raise Exception(
-                        f"Subprocess terminated unexpectedly with code {process.returncode}"
-                    )
-                try:
-                    # Make a simple request to check if the server is up
-                    response = requests.get(f"{self.base_url}/models")
-                    if response.status_code == 200:
-                        server_ready = True
-                        print("server is ready!")
-                except requests.exceptions.ConnectionError:
-                    # If the connection is not ready, wait and try again
-                    time.sleep(1)
-
-            if not skip_server_setup:
-                # Signal threads to stop reading output
-                stop_event.set()
+            if batch_size > 1:
+                self.completion_batcher = CompletionBatcher(
+                    self.server_pool,
+                    model=self.model_path_or_id,
+                    temperature=self.temperature,
+                    count_tokens=lambda text: len(
+                        self.tokenizer.encode(text, add_special_tokens=False)
+                    ),
+                    batch_size=batch_size,
+                    batch_window=batch_window,
+                    max_concurrent_batches=self.max_concurrent_batches,
+                )
+
+            if order_by_prefix:
+                test_entries = order_by_prompt_prefix(test_entries)
 
             # Once the server is ready, make the completion requests
             futures = []
-            with ThreadPoolExecutor(max_workers=100) as executor:
+            with ThreadPoolExecutor(max_workers=100 * num_replicas) as executor, ResultWriter(
+                self.model_name, result_dir, external_inference_log
+            ) as writer:
                 with tqdm(
                     total=len(test_entries),
                     desc=f"Generating results for {self.model_name}",
@@ -233,32 +221,15 @@ class OSSHandler(BaseHandler, EnforceOverrides):
                         )
                         futures.append(future)
 
-                    for future in futures:
-                        # This will wait for the task to complete, so that we are always writing in order
-                        result = future.result()
-                        self.write(result, result_dir, update_mode=update_mode)
+                    # Results are journaled as soon as they are ready; the writer sorts them when it is closed
+                    for future in as_completed(futures):
+                        writer.submit(future.result())
                         pbar.update()
 
-        except Exception as e:
-            raise e
-
-        finally:
-            if not skip_server_setup:
-                # Ensure the server process is terminated properly
-                process.terminate()
-                try:
-                    # Wait for the process to terminate fully
-                    process.wait(timeout=15)
-                    print("Process terminated successfully.")
-                except subprocess.TimeoutExpired:
-                    process.kill()
-                    process.wait()  # Wait again to ensure it's fully terminated
-                    print("Process killed.")
-
-                # Wait for the output threads to finish
-                stop_event.set()
-                stdout_thread.join()
-                stderr_thread.join()
+        except Exception:
+            # Do not keep a server that may be in a bad state for the next model
+            shutdown_server_pools()
+            raise
 
     @final
     def _multi_threaded_inference(
@@ -269,6 +240,9 @@ class OSSHandler(BaseHandler, EnforceOverrides):
         """
         assert type(test_case["function"]) is list
 
+        # The function docs may be shared with other test cases, and inference modifies them in place
+        test_case = deepcopy(test_case)
+
         try:
             if "multi_turn" in test_case["id"]:
                 model_responses, metadata = self.inference_multi_turn_prompting(
@@ -317,17 +291,18 @@ class OSSHandler(BaseHandler, EnforceOverrides):
         formatted_prompt: str = self._format_prompt(message, function)
         inference_data["inference_input_log"] = {"formatted_prompt": formatted_prompt}
 
-        # Tokenize the formatted prompt to get token count
-        input_token_count = len(self.tokenizer.tokenize(formatted_prompt))
+        input_token_count, token_count_margin = self._count_prompt_tokens(
+            inference_data, formatted_prompt
+        )
 
         # Determine the number of tokens to request. Cap it at 4096 if the model has a larger limit.
-        if self.max_context_length < input_token_count + 2:
+        if self.max_context_length < input_token_count + token_count_margin + 2:
             # If the prompt is already at the max length, just request 1000 token, we will get an error anyway
             leftover_tokens_count = 1000
         else:
             leftover_tokens_count = min(
                 4096,
-                self.max_context_length - input_token_count - 2,
+                self.max_context_length - input_token_count - token_count_margin - 2,
             )
 
         extra_body = {}
@@ -337,27 +312,78 @@ class OSSHandler(BaseHandler, EnforceOverrides):
             extra_body["skip_special_tokens"] = self.skip_special_tokens
 
         start_time = time.time()
-        if len(extra_body) > 0:
-            api_response = self.client.completions.create(
-                model=self.model_path_or_id,
-                temperature=self.temperature,
-                prompt=formatted_prompt,
+        if self.completion_batcher is not None:
+            api_response = self.completion_batcher.create(
+                formatted_prompt,
+                prompt_token_count=input_token_count,
                 max_tokens=leftover_tokens_count,
                 extra_body=extra_body,
-                timeout=72000,  # Avoid timeout errors
             )
         else:
-            api_response = self.client.completions.create(
-                model=self.model_path_or_id,
-                temperature=self.temperature,
-                prompt=formatted_prompt,
-                max_tokens=leftover_tokens_count,
-                timeout=72000,  # Avoid timeout errors
-            )
+            with self.server_pool.acquire() as client:
+                if len(extra_body) > 0:
+                    api_response = client.completions.create(
+                        model=self.model_path_or_id,
+                        temperature=self.temperature,
+                        prompt=formatted_prompt,
+                        max_tokens=leftover_tokens_count,
+                        extra_body=extra_body,
+                        timeout=72000,  # Avoid timeout errors
+                    )
+                else:
+                    api_response = client.completions.create(
+                        model=self.model_path_or_id,
+                        temperature=self.temperature,
+                        prompt=formatted_prompt,
+                        max_tokens=leftover_tokens_count,
+                        timeout=72000,  # Avoid timeout errors
+                    )
         end_time = time.time()
 
+        # The server counted the tokens of the whole prompt exactly; use its count as the base for the next step. In
+        # batched mode, the usage is filled in from our own count, so there is nothing to gain.
+        if self.server_prompt_token_count and self.completion_batcher is None:
+            usage = getattr(api_response, "usage", None)
+            if usage is not None and usage.prompt_tokens is not None:
+                inference_data["prompt_token_count_cache"] = (
+                    formatted_prompt,
+                    usage.prompt_tokens,
+                    0,
+                )
+
         return api_response, end_time - start_time
 
+    def _count_prompt_tokens(
+        self, inference_data: dict, formatted_prompt: str
+    ) -> tuple[int, int]:
+        """
+        Count the tokens of the formatted prompt, which is only needed to compute `max_tokens`. Return the count and
+        the margin of error of the count.
+
+        In a multi-turn entry, the prompt of each step usually extends the prompt of the previous step, so only the
+        new part is tokenized and added to the token count of the previous prompt. Tokens can merge or split
+        differently across the boundary, so each extension counted that way adds `PROMPT_EXTENSION_TOKEN_MARGIN` to
+        the margin. The margin goes back to 0 whenever the whole prompt is counted, by the local tokenizer or, with
+        `server_prompt_token_count`, by the server.
+        """
+        previous_prompt, previous_token_count, previous_margin = inference_data.get(
+            "prompt_token_count_cache", ("", 0, 0)
+        )
+        if previous_prompt and formatted_prompt.startswith(previous_prompt):
+            new_part = formatted_prompt[len(previous_prompt) :]
+            input_token_count = previous_token_count + len(self.tokenizer.tokenize(new_part))
+            margin = previous_margin + PROMPT_EXTENSION_TOKEN_MARGIN
+        else:
+            input_token_count = len(self.tokenizer.tokenize(formatted_prompt))
+            margin = 0
+
+        inference_data["prompt_token_count_cache"] = (
+            formatted_prompt,
+            input_token_count,
+            margin,
+        )
+        return input_token_count, margin
+
     @override
     def _pre_query_processing_prompting(self, test_entry: dict) -> dict:
         functions: list = test_entry["function"]
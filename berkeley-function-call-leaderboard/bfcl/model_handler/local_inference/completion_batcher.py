@@ -0,0 +1,129 @@
+import concurrent.futures
+import json
+import threading
+from typing import Callable
+
+from openai.types import Completion, CompletionUsage
+
+
+class _PendingPrompt:
+    def __init__(self, prompt: str, prompt_token_count: int):
+        self.prompt = prompt
+        self.prompt_token_count = prompt_token_count
+        self.future = concurrent.futures.Future()
+
+
+class CompletionBatcher:
+    """
+    Groups the prompts submitted by concurrent inference threads into multi-prompt requests to the OpenAI-compatible
+    completions endpoint of the vLLM/SGLang server.
+
+    Prompts are grouped by their request parameters (`max_tokens` and `extra_body`). A group is sent as soon as it
+    holds `batch_size` prompts, or when the first prompt in it has waited for `batch_window` seconds. At most
+    `max_concurrent_batches` requests are in flight at a time, each sent to the least busy server of `server_pool`.
+
+    Each caller gets back a `Completion` that holds only its own choice. The server reports the token usage of the
+    whole batch, so the usage of each prompt is filled in from the prompt token count of the caller and from the
+    token count of the generated text.
+    """
+
+    def __init__(
+        self,
+        server_pool,
+        model: str,
+        temperature: float,
+        count_tokens: Callable[[str], int],
+        batch_size: int,
+        batch_window: float,
+        max_concurrent_batches: int,
+    ):
+        self.server_pool = server_pool
+        self.model = model
+        self.temperature = temperature
+        self.count_tokens = count_tokens
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._pending_groups: dict[tuple, list[_PendingPrompt]] = {}
+        self._lock = threading.Lock()
+        self._request_slots = threading.BoundedSemaphore(max_concurrent_batches)
+
+    def create(
+        self, prompt: str, prompt_token_count: int, max_tokens: int, extra_body: dict
+    ) -> Completion:
+        """
+        Submit one prompt and block until its completion is available.
+        """
+        group_key = (max_tokens, json.dumps(extra_body, sort_keys=True))
+        pending_prompt = _PendingPrompt(prompt, prompt_token_count)
+
+        with self._lock:
+            group = self._pending_groups.setdefault(group_key, [])
+            group.append(pending_prompt)
+            if len(group) >= self.batch_size:
+                batch = self._pending_groups.pop(group_key)
+            else:
+                batch = None
+            # The first prompt of a group is responsible for sending it once the window is over
+            is_group_leader = batch is None and len(group) == 1
+
+        if batch is None and is_group_leader:
+            try:
+                return pending_prompt.future.result(timeout=self.batch_window)
+            except concurrent.futures.TimeoutError:
+                with self._lock:
+                    # The group may have been filled (and sent) by another thread in the meantime
+                    if self._pending_groups.get(group_key) is group:
+                        batch = self._pending_groups.pop(group_key)
+
+        if batch is not None:
+            self._send(batch, max_tokens, extra_body)
+
+        return pending_prompt.future.result()
+
+    def _send(self, batch: list[_PendingPrompt], max_tokens: int, extra_body: dict) -> None:
+        kwargs = {}
+        if len(extra_body) > 0:
+            kwargs["extra_body"] = extra_body
+
+        try:
+            with self._request_slots, self.server_pool.acquire() as client:
+                api_response = client.completions.create(
+                    model=self.model,
+                    temperature=self.temperature,
+                    prompt=[pending_prompt.prompt for pending_prompt in batch],
+                    max_tokens=max_tokens,
+                    timeout=72000,  # Avoid timeout errors
+                    **kwargs,
+                )
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            # A single bad prompt (eg, one that exceeds the context length) fails the whole request, so send the
+            # prompts one by one to only fail the ones that are at fault
+            for pending_prompt in batch:
+                self._send([pending_prompt], max_tokens, extra_body)
+            return
+
+        for choice in api_response.choices:
+            pending_prompt = batch[choice.index]
+            completion_token_count = self.count_tokens(choice.text)
+            pending_prompt.future.set_result(
+                api_response.model_copy(
+                    update={
+                        "choices": [choice.model_copy(update={"index": 0})],
+                        "usage": CompletionUsage(
+                            prompt_tokens=pending_prompt.prompt_token_count,
+                            completion_tokens=completion_token_count,
+                            total_tokens=pending_prompt.prompt_token_count
+                            + completion_token_count,
+                        ),
+                    }
+                )
+            )
+
+        for pending_prompt in batch:
+            if not pending_prompt.future.done():
+                pending_prompt.future.set_exception(
+                    ValueError("The server returned no completion for this prompt.")
+                )
@@ -0,0 +1,288 @@
+import atexit
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+from openai import OpenAI
+
+# Downloading and loading the weights of a large model can take a while
+DEFAULT_STARTUP_TIMEOUT = 3600
+# Delays between two health checks of a replica that is starting up
+HEALTH_CHECK_INITIAL_DELAY = 0.5
+HEALTH_CHECK_MAX_DELAY = 10
+
+
+class ServerReplica:
+    """
+    One vLLM/SGLang server, either launched by the pool or already running at `base_url`.
+    """
+
+    def __init__(self, base_url: str, process: Optional[subprocess.Popen] = None):
+        self.base_url = base_url
+        self.process = process
+        self.client = OpenAI(base_url=base_url, api_key="EMPTY")
+        # The number of requests sent to this replica that have not returned yet
+        self.outstanding_requests = 0
+        self._stop_logging = threading.Event()
+        self._log_threads = []
+
+        if process is not None:
+            for pipe in [process.stdout, process.stderr]:
+                thread = threading.Thread(target=self._log_output, args=(pipe,), daemon=True)
+                thread.start()
+                self._log_threads.append(thread)
+
+    def _log_output(self, pipe):
+        # The server logs are only shown until the server is ready. The pipe is still drained afterwards, as a warm
+        # server can outlive the current model and would block (or fail) on a full or closed pipe.
+        for line in iter(pipe.readline, ""):
+            if not self._stop_logging.is_set():
+                print(line, end="")
+        pipe.close()
+
+    def is_ready(self) -> bool:
+        if self.process is not None and self.process.poll() is not None:
+            raise RuntimeError(
+                f"Server at {self.base_url} terminated unexpectedly with code {self.process.returncode}"
+            )
+        try:
+            response = requests.get(f"{self.base_url}/models", timeout=5)
+        except requests.exceptions.RequestException:
+            return False
+        return response.status_code == 200
+
+    def stop_logging(self):
+        self._stop_logging.set()
+
+    def terminate(self):
+        self.stop_logging()
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            # Wait for the process to terminate fully
+            self.process.wait(timeout=15)
+            print(f"Server at {self.base_url} terminated successfully.")
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()  # Wait again to ensure it's fully terminated
+            print(f"Server at {self.base_url} killed.")
+
+
+class ServerPool:
+    """
+    A set of vLLM/SGLang server replicas serving the same model, one per group of `num_gpus` GPUs (data
+    parallelism across replicas, tensor parallelism within a replica).
+
+    Replica `i` listens on port `port + i`. With `skip_server_setup`, the pool attaches to replicas that are already
+    running on those ports of `host` instead of launching them. Requests go to the replica with the fewest
+    outstanding requests.
+    """
+
+    def __init__(
+        self,
+        model_path_or_id: str,
+        backend: str,
+        dtype: str,
+        num_gpus: int,
+        num_replicas: int,
+        gpu_memory_utilization: float,
+        host: str,
+        port: int,
+        skip_server_setup: bool,
+    ):
+        if backend not in ["vllm", "sglang"]:
+            raise ValueError(f"Backend {backend} is not supported.")
+
+        self.model_path_or_id = model_path_or_id
+        self.backend = backend
+        self.dtype = dtype
+        self.num_gpus = num_gpus
+        self.num_replicas = num_replicas
+        self.gpu_memory_utilization = gpu_memory_utilization
+        self.host = host
+        self.port = int(port)
+        self.skip_server_setup = skip_server_setup
+        self.replicas: list[ServerReplica] = []
+        self._lock = threading.Lock()
+
+    @property
+    def launch_config(self) -> tuple:
+        return (
+            str(self.model_path_or_id),
+            self.backend,
+            self.dtype,
+            self.num_gpus,
+            self.num_replicas,
+            self.gpu_memory_utilization,
+            self.host,
+            self.port,
+            self.skip_server_setup,
+        )
+
+    def _launch_command(self, port: int) -> list[str]:
+        if self.backend == "vllm":
+            return [
+                "vllm",
+                "serve",
+                str(self.model_path_or_id),
+                "--port",
+                str(port),
+                "--dtype",
+                str(self.dtype),
+                "--tensor-parallel-size",
+                str(self.num_gpus),
+                "--gpu-memory-utilization",
+                str(self.gpu_memory_utilization),
+                "--trust-remote-code",
+            ]
+        return [
+            "python",
+            "-m",
+            "sglang.launch_server",
+            "--model-path",
+            str(self.model_path_or_id),
+            "--port",
+            str(port),
+            "--dtype",
+            str(self.dtype),
+            "--tp",
+            str(self.num_gpus),
+            "--mem-fraction-static",
+            str(self.gpu_memory_utilization),
+            "--trust-remote-code",
+        ]
+
+    def _gpu_groups(self) -> list[Optional[str]]:
+        if self.skip_server_setup or self.num_replicas == 1:
+            # A single replica sees the same GPUs as this process
+            return [None] * self.num_replicas
+        visible_devices = os.getenv("CUDA_VISIBLE_DEVICES")
+        if visible_devices:
+            devices = [device.strip() for device in visible_devices.split(",")]
+        else:
+            devices = [str(i) for i in range(self.num_gpus * self.num_replicas)]
+        if len(devices) < self.num_gpus * self.num_replicas:
+            raise ValueError(
+                f"{self.num_replicas} replicas of {self.num_gpus} GPUs need {self.num_gpus * self.num_replicas} GPUs, "
+                f"but only {len(devices)} are visible."
+            )
+        return [
+            ",".join(devices[i * self.num_gpus : (i + 1) * self.num_gpus])
+            for i in range(self.num_replicas)
+        ]
+
+    def start(self, startup_timeout: float = DEFAULT_STARTUP_TIMEOUT):
+        """
+        Launch (or attach to) every replica and wait until all of them are ready.
+        """
+        for i, gpu_group in enumerate(self._gpu_groups()):
+            port = self.port + i
+            base_url = f"http://{self.host}:{port}/v1"
+            if self.skip_server_setup:
+                self.replicas.append(ServerReplica(base_url))
+                continue
+
+            env = os.environ.copy()
+            if gpu_group is not None:
+                env["CUDA_VISIBLE_DEVICES"] = gpu_group
+            process = subprocess.Popen(
+                self._launch_command(port),
+                stdout=subprocess.PIPE,  # Capture stdout
+                stderr=subprocess.PIPE,  # Capture stderr
+                text=True,  # To get the output as text instead of bytes
+                env=env,
+            )
+            self.replicas.append(ServerReplica(base_url, process))
+
+        try:
+            self.wait_until_ready(startup_timeout)
+        except BaseException:
+            self.shutdown()
+            raise
+
+    def wait_until_ready(self, startup_timeout: float):
+        deadline = time.monotonic() + startup_timeout
+        pending_replicas = list(self.replicas)
+        delay = HEALTH_CHECK_INITIAL_DELAY
+        while True:
+            pending_replicas = [replica for replica in pending_replicas if not replica.is_ready()]
+            if len(pending_replicas) == 0:
+                break
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(
+                    f"Server(s) at {', '.join(replica.base_url for replica in pending_replicas)} "
+                    f"not ready after {startup_timeout} seconds."
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, HEALTH_CHECK_MAX_DELAY)
+
+        for replica in self.replicas:
+            replica.stop_logging()
+        print(f"{len(self.replicas)} server replica(s) ready!")
+
+    def is_healthy(self) -> bool:
+        try:
+            return all(replica.is_ready() for replica in self.replicas)
+        except RuntimeError:
+            return False
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pick the replica with the fewest outstanding requests and yield its client.
+        """
+        with self._lock:
+            replica = min(self.replicas, key=lambda replica: replica.outstanding_requests)
+            replica.outstanding_requests += 1
+        try:
+            yield replica.client
+        finally:
+            with self._lock:
+                replica.outstanding_requests -= 1
+
+    def shutdown(self):
+        for replica in self.replicas:
+            replica.terminate()
+        self.replicas = []
+
+
+# The pool of the last model is kept running, so that the next `--model` served by the same weights (eg, the
+# prompting and FC variants of a model) does not wait for the servers to start again
+_warm_pool: Optional[ServerPool] = None
+_warm_pool_lock = threading.Lock()
+
+
+def get_server_pool(startup_timeout: float = DEFAULT_STARTUP_TIMEOUT, **kwargs) -> ServerPool:
+    """
+    Return a ready server pool for the given configuration (see `ServerPool`), reusing the warm pool if it has the
+    same configuration and is still healthy. Any other warm pool is shut down first to free its GPUs.
+    """
+    global _warm_pool
+    pool = ServerPool(**kwargs)
+    with _warm_pool_lock:
+        if _warm_pool is not None:
+            if _warm_pool.launch_config == pool.launch_config and _warm_pool.is_healthy():
+                print("Reusing the running server replica(s).")
+                return _warm_pool
+            _warm_pool.shutdown()
+            _warm_pool = None
+
+        pool.start(startup_timeout)
+        _warm_pool = pool
+        return pool
+
+
+def shutdown_server_pools():
+    global _warm_pool
+    with _warm_pool_lock:
+        if _warm_pool is not None:
+            _warm_pool.shutdown()
+            _warm_pool = None
+
+
+atexit.register(shutdown_server_pools)
@@ -0,0 +1,161 @@
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+
+from bfcl.constants.category_mapping import VERSION_PREFIX
+from bfcl.model_handler.inference_log_store import (
+    InferenceLogStore,
+    get_inference_log_store_path,
+)
+from bfcl.utils import dumps_json_serializable, load_file, sort_key
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def get_result_file_path(model_result_dir: Path, test_category: str) -> Path:
+    return model_result_dir / f"{VERSION_PREFIX}_{test_category}_result.json"
+
+
+def get_journal_path(result_file_path: Path) -> Path:
+    # The journal deliberately does not end with `.json`, so that the evaluation runner never picks it up
+    return result_file_path.with_suffix(JOURNAL_SUFFIX)
+
+
+def load_journal(journal_path: Path) -> list[dict]:
+    """
+    Load the entries from a result journal.
+    The last line can be incomplete if the process was killed while appending to the journal; it is skipped.
+    """
+    entries = []
+    with open(journal_path) as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def compact_journal(result_file_path: Path) -> None:
+    """
+    Merge the journal of a result file into the result file itself.
+
+    Journal entries take precedence over the entries already in the result file (they are newer), duplicated ids
+    are collapsed, and the merged entries are written in sorted order. The result file is replaced atomically and
+    the journal is removed afterwards, so a crash at any point leaves either the old or the new result file on
+    disk, plus a journal that can be compacted again.
+    """
+    journal_path = get_journal_path(result_file_path)
+    if not journal_path.exists():
+        return
+
+    merged_entries = {}
+    if result_file_path.exists():
+        for entry in load_file(result_file_path):
+            merged_entries[entry["id"]] = entry
+    for entry in load_journal(journal_path):
+        merged_entries[entry["id"]] = entry
+
+    temp_file_path = result_file_path.with_suffix(".json.tmp")
+    with open(temp_file_path, "w") as f:
+        for entry in sorted(merged_entries.values(), key=sort_key):
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file_path, result_file_path)
+    journal_path.unlink()
+
+
+class ResultWriter:
+    """
+    Persist generation results from a dedicated writer thread, in the order they complete.
+
+    Each result is appended (and flushed) to an append-only journal next to its category's result file, so a
+    slow test case no longer holds back the results that finish after it, and a crashed run loses at most the
+    entries that were still in flight. When the writer is closed, every journal touched in this run is sorted and
+    compacted into the result file once (see `compact_journal`), instead of rewriting the result file per entry.
+
+    With `external_inference_log`, the inference log of each result is moved to the model's inference log store
+    (see `InferenceLogStore`) and the result only keeps its `inference_log_id`.
+
+    Usage:
+        with ResultWriter(model_name, result_dir) as writer:
+            writer.submit(result)
+    """
+
+    def __init__(self, model_name: str, result_dir: Path, external_inference_log: bool = False):
+        self.model_result_dir = result_dir / model_name.replace("/", "_")
+        self.external_inference_log = external_inference_log
+        # Opened by the writer thread, as a SQLite connection can only be used from the thread that opened it
+        self._log_store = None
+        self._queue = queue.Queue()
+        self._journal_files = {}
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.model_result_dir.mkdir(parents=True, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        except Exception as e:
+            # Do not replace the exception that is already propagating out of the `with` body
+            if exc_type is None:
+                raise
+            print(f"❗️ Failed to write the generation results: {e}")
+
+    def submit(self, result: dict) -> None:
+        if self._error is not None:
+            raise self._error
+        self._queue.put(result)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        for result_file_path, journal_file in self._journal_files.items():
+            journal_file.close()
+            compact_journal(result_file_path)
+        self._journal_files.clear()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        while True:
+            result = self._queue.get()
+            if result is None:
+                if self._log_store is not None:
+                    self._log_store.close()
+                break
+            if self._error is not None:
+                # Keep draining the queue so that the producers are never blocked
+                continue
+            try:
+                self._append(result)
+            except Exception as e:
+                self._error = e
+
+    def _append(self, result: dict) -> None:
+        entry = result
+        if self.external_inference_log and "inference_log" in entry:
+            # Shallow copy, so the result of the caller keeps its log
+            entry = dict(result)
+            if self._log_store is None:
+                self._log_store = InferenceLogStore(
+                    get_inference_log_store_path(self.model_result_dir)
+                )
+            # The log is committed to the store before the entry that refers to it is journaled
+            entry["inference_log_id"] = self._log_store.put(entry.pop("inference_log"))
+        test_category = entry["id"].rsplit("_", 1)[0]
+        result_file_path = get_result_file_path(self.model_result_dir, test_category)
+        if result_file_path not in self._journal_files:
+            self._journal_files[result_file_path] = open(
+                get_journal_path(result_file_path), "a"
+            )
+        journal_file = self._journal_files[result_file_path]
+        journal_file.write(dumps_json_serializable(entry) + "\n")
+        journal_file.flush()
@@ -5,6 +5,8 @@ import json
 import operator
 import re
 import os
+import threading
+from collections import OrderedDict
 from functools import reduce
 from typing import Callable, List, Optional, Type, Union
 
@@ -13,6 +15,7 @@ from bfcl.constants.type_mappings import GORILLA_TO_OPENAPI
 from bfcl.model_handler.model_style import ModelStyle
 from bfcl.model_handler.parser.java_parser import parse_java_function_call
 from bfcl.model_handler.parser.js_parser import parse_javascript_function_call
+from bfcl.utils import copy_json_like
 from tenacity import (
     retry,
     retry_if_exception_message,
@@ -66,121 +69,166 @@ def _cast_to_openai_type(properties, mapping):
     return properties
 
 
-def convert_to_tool(functions, mapping, model_style):
-    functions = copy.deepcopy(functions)
-    oai_tool = []
-    for item in functions:
-        if "." in item["name"] and model_style in [
-            ModelStyle.OpenAI,
-            ModelStyle.Mistral,
-            ModelStyle.Google,
-            ModelStyle.OSSMODEL,
-            ModelStyle.Anthropic,
-            ModelStyle.COHERE,
-            ModelStyle.AMAZON,
-            ModelStyle.NOVITA_AI,
-        ]:
-            # OAI does not support "." in the function name so we replace it with "_". ^[a-zA-Z0-9_-]{1,64}$ is the regex for the name.
-            item["name"] = re.sub(r"\.", "_", item["name"])
-
-        item["parameters"]["type"] = "object"
-        item["parameters"]["properties"] = _cast_to_openai_type(
-            item["parameters"]["properties"], mapping
-        )
-
-        if model_style == ModelStyle.Anthropic:
-            item["input_schema"] = item["parameters"]
-            del item["parameters"]
-
-        if model_style == ModelStyle.AMAZON:
-            item["inputSchema"] = {"json": item["parameters"]}
-            del item["parameters"]
+def _function_to_tool(item, mapping, model_style):
+    """
+    Compile one function doc into the tool format of `model_style`. `item` is modified in place.
+    Returns None if the model style has no tool format.
+    """
+    if "." in item["name"] and model_style in [
+        ModelStyle.OpenAI,
+        ModelStyle.Mistral,
+        ModelStyle.Google,
+        ModelStyle.OSSMODEL,
+        ModelStyle.Anthropic,
+        ModelStyle.COHERE,
+        ModelStyle.AMAZON,
+        ModelStyle.NOVITA_AI,
+    ]:
+        # OAI does not support "." in the function name so we replace it with "_". ^[a-zA-Z0-9_-]{1,64}$ is the regex for the name.
+        item["name"] = re.sub(r"\.", "_", item["name"])
+
+    item["parameters"]["type"] = "object"
+    item["parameters"]["properties"] = _cast_to_openai_type(
+        item["parameters"]["properties"], mapping
+    )
 
-        if model_style in [
-            ModelStyle.Google,
-            ModelStyle.WRITER,
-        ]:
-            # Remove fields that are not supported by Gemini or Palmyra.
-            # No `optional` field in function schema.
-            if "optional" in item["parameters"]:
-                del item["parameters"]["optional"]
-            for params in item["parameters"]["properties"].values():
-                # No `default` field in Google or Palmyra's schema.
-                if "default" in params:
-                    params["description"] += f" Default is: {str(params['default'])}."
-                    del params["default"]
-                # No `optional` field in parameter schema as well.
-                if "optional" in params:
-                    params["description"] += f" Optional: {str(params['optional'])}."
-                    del params["optional"]
-                # No `maximum` field.
-                if "maximum" in params:
-                    params["description"] += f" Maximum value: {str(params['maximum'])}."
-                    del params["maximum"]
-                # No `minItems` field.
-                if "minItems" in params:
-                    params[
-                        "description"
-                    ] += f" Minimum number of items: {str(params['minItems'])}."
-                    del params["minItems"]
-                # No `maxItems` field.
-                if "maxItems" in params:
-                    params[
-                        "description"
-                    ] += f" Maximum number of items: {str(params['maxItems'])}."
-                    del params["maxItems"]
-                # No `additionalProperties` field.
-                if "additionalProperties" in params:
-                    params[
-                        "description"
-                    ] += f" Additional properties: {str(params['additionalProperties'])}."
-                    del params["additionalProperties"]
-                # For Gemini, only `enum` field when the type is `string`.
-                # For Palmyra, `enum` field is not supported.
-                if "enum" in params and (
-                    model_style == ModelStyle.WRITER
-                    or (model_style == ModelStyle.Google and params["type"] != "string")
-                ):
-                    params["description"] += f" Enum values: {str(params['enum'])}."
-                    del params["enum"]
-
-                # Gemini with Genai library doesn't support propoerties with format "date"
-                if model_style == ModelStyle.Google and os.getenv("GOOGLE_GENAI_USE_VERTEXAI")=="false" and "format" in params:
-                    if "date" == params["format"]:
-                        params["format"]="date-time"
-
-        # Process the return field
-        if "response" in item:
-            if model_style in [
-                ModelStyle.Anthropic,
-                ModelStyle.Google,
-                ModelStyle.FIREWORK_AI,
-                ModelStyle.WRITER,
-                ModelStyle.AMAZON,
-                ModelStyle.NOVITA_AI,
-            ]:
-                item[
+    if model_style == ModelStyle.Anthropic:
+        item["input_schema"] = item["parameters"]
+        del item["parameters"]
+
+    if model_style == ModelStyle.AMAZON:
+        item["inputSchema"] = {"json": item["parameters"]}
+        del item["parameters"]
+
+    if model_style in [
+        ModelStyle.Google,
+        ModelStyle.WRITER,
+    ]:
+        # Remove fields that are not supported by Gemini or Palmyra.
+        # No `optional` field in function schema.
+        if "optional" in item["parameters"]:
+            del item["parameters"]["optional"]
+        for params in item["parameters"]["properties"].values():
+            # No `default` field in Google or Palmyra's schema.
+            if "default" in params:
+                params["description"] += f" Default is: {str(params['default'])}."
+                del params["default"]
+            # No `optional` field in parameter schema as well.
+            if "optional" in params:
+                params["description"] += f" Optional: {str(params['optional'])}."
+                del params["optional"]
+            # No `maximum` field.
+            if "maximum" in params:
+                params["description"] += f" Maximum value: {str(params['maximum'])}."
+                del params["maximum"]
+            # No `minItems` field.
+            if "minItems" in params:
+                params[
                     "description"
-                ] += f" The response field has the following schema: {json.dumps(item['response'])}"
-                del item["response"]
-
+                ] += f" Minimum number of items: {str(params['minItems'])}."
+                del params["minItems"]
+            # No `maxItems` field.
+            if "maxItems" in params:
+                params[
+                    "description"
+                ] += f" Maximum number of items: {str(params['maxItems'])}."
+                del params["maxItems"]
+            # No `additionalProperties` field.
+            if "additionalProperties" in params:
+                params[
+                    "description"
+                ] += f" Additional properties: {str(params['additionalProperties'])}."
+                del params["additionalProperties"]
+            # For Gemini, only `enum` field when the type is `string`.
+            # For Palmyra, `enum` field is not supported.
+            if "enum" in params and (
+                model_style == ModelStyle.WRITER
+                or (model_style == ModelStyle.Google and params["type"] != "string")
+            ):
+                params["description"] += f" Enum values: {str(params['enum'])}."
+                del params["enum"]
+
+            # Gemini with Genai library doesn't support propoerties with format "date"
+            if model_style == ModelStyle.Google and os.getenv("GOOGLE_GENAI_USE_VERTEXAI")=="false" and "format" in params:
+                if "date" == params["format"]:
+                    params["format"]="date-time"
+
+    # Process the return field
+    if "response" in item:
         if model_style in [
             ModelStyle.Anthropic,
             ModelStyle.Google,
-            ModelStyle.OSSMODEL,
-        ]:
-            oai_tool.append(item)
-        elif model_style in [
-            ModelStyle.COHERE,
-            ModelStyle.OpenAI,
-            ModelStyle.Mistral,
             ModelStyle.FIREWORK_AI,
             ModelStyle.WRITER,
+            ModelStyle.AMAZON,
             ModelStyle.NOVITA_AI,
         ]:
-            oai_tool.append({"type": "function", "function": item})
-        elif model_style == ModelStyle.AMAZON:
-            oai_tool.append({"toolSpec": item})
+            item[
+                "description"
+            ] += f" The response field has the following schema: {json.dumps(item['response'])}"
+            del item["response"]
+
+    if model_style in [
+        ModelStyle.Anthropic,
+        ModelStyle.Google,
+        ModelStyle.OSSMODEL,
+    ]:
+        return item
+    elif model_style in [
+        ModelStyle.COHERE,
+        ModelStyle.OpenAI,
+        ModelStyle.Mistral,
+        ModelStyle.FIREWORK_AI,
+        ModelStyle.WRITER,
+        ModelStyle.NOVITA_AI,
+    ]:
+        return {"type": "function", "function": item}
+    elif model_style == ModelStyle.AMAZON:
+        return {"toolSpec": item}
+
+    return None
+
+
+# Compiled tools by (function doc, model style, type mapping); many entries share the same function docs, and the
+# tools of a multi-turn entry are compiled again on every turn that adds a held-out function
+COMPILED_TOOL_CACHE_SIZE = 8192
+_compiled_tools = OrderedDict()
+_compiled_tools_lock = threading.Lock()
+
+
+def convert_to_tool(functions, mapping, model_style):
+    try:
+        # The Gemini tool format also depends on which backend the Google Gen AI SDK talks to
+        key_suffix = (
+            json.dumps(mapping),
+            model_style,
+            os.getenv("GOOGLE_GENAI_USE_VERTEXAI") if model_style == ModelStyle.Google else None,
+        )
+        # The serialized doc is the cache key. Key order is kept, as it shows in the compiled tool.
+        keys = [(json.dumps(item),) + key_suffix for item in functions]
+    except (TypeError, ValueError):
+        # Not a plain JSON function doc, so it cannot be cached
+        oai_tool = [
+            _function_to_tool(item, mapping, model_style) for item in copy.deepcopy(functions)
+        ]
+        return [tool for tool in oai_tool if tool is not None]
+
+    oai_tool = []
+    for item, key in zip(functions, keys):
+        with _compiled_tools_lock:
+            tool = _compiled_tools.get(key, _compiled_tools)
+            if tool is not _compiled_tools:
+                _compiled_tools.move_to_end(key)
+        if tool is _compiled_tools:
+            tool = _function_to_tool(copy_json_like(item), mapping, model_style)
+            with _compiled_tools_lock:
+                _compiled_tools[key] = tool
+                if len(_compiled_tools) > COMPILED_TOOL_CACHE_SIZE:
+                    _compiled_tools.popitem(last=False)
+
+        if tool is not None:
+            # Callers are free to modify the tools they get (eg, to add cache control flags)
+            oai_tool.append(copy_json_like(tool))
 
     return oai_tool
 
@@ -745,6 +793,30 @@ def decoded_output_to_execution_list(decoded_output):
     return execution_list
 
 
+# Lets the generation scheduler observe backoffs that happen inside a handler's own retry loop.
+# Thread-local, because each worker thread runs inference for a different test case.
+_backoff_context = threading.local()
+
+
+def set_backoff_callback(callback: Optional[Callable]) -> None:
+    """
+    Register a callback (for the current thread) that is called with the tenacity retry state every time a
+    function decorated with `retry_with_backoff` is about to sleep.
+    """
+    _backoff_context.callback = callback
+
+
+def _before_sleep(retry_state) -> None:
+    print(
+        f"Attempt {retry_state.attempt_number} failed. "
+        f"Sleeping for {retry_state.next_action.sleep:.2f} seconds before retrying... "
+        f"Error: {retry_state.outcome.exception()}"
+    )
+    callback = getattr(_backoff_context, "callback", None)
+    if callback is not None:
+        callback(retry_state)
+
+
 def retry_with_backoff(
     error_type: Optional[Union[Type[Exception], List[Type[Exception]]]] = None,
     error_message_pattern: Optional[str] = None,
@@ -794,11 +866,7 @@ def retry_with_backoff(
         @retry(
             wait=wait_random_exponential(min=min_wait, max=max_wait),
             retry=retry_policy,
-            before_sleep=lambda retry_state: print(
-                f"Attempt {retry_state.attempt_number} failed. "
-                f"Sleeping for {retry_state.next_action.sleep:.2f} seconds before retrying... "
-                f"Error: {retry_state.outcome.exception()}"
-            ),
+            before_sleep=_before_sleep,
             **kwargs,
         )
         def wrapped(*args, **inner_kwargs):
@@ -1,9 +1,11 @@
+import copy
 import json
 import os
 import re
 from pathlib import Path
 from typing import Union
 
+from bfcl._dataset_store import open_jsonl
 from bfcl.constants.category_mapping import TEST_COLLECTION_MAPPING, TEST_FILE_MAPPING, VERSION_PREFIX
 
 
@@ -69,15 +71,8 @@ def is_sql(test_category):
 
 
 def load_file(file_path, sort_by_id=False):
-    result = []
-    with open(file_path) as f:
-        file = f.readlines()
-        for line in file:
-            result.append(json.loads(line))
-
-    if sort_by_id:
-        result.sort(key=sort_key)
-    return result
+    # The file is indexed once per process (and again only when it changes); see `bfcl/_dataset_store.py`
+    return open_jsonl(file_path).load(sort_by_id)
 
 
 def write_list_of_dicts_to_file(filename, data, subdir=None):
@@ -88,31 +83,47 @@ def write_list_of_dicts_to_file(filename, data, subdir=None):
         # Construct the full path to the file
         filename = os.path.join(subdir, filename)
 
-    # Write the list of dictionaries to the file in JSON format
+    # Write the list of dictionaries to the file in JSON format, one entry at a time
     with open(filename, "w") as f:
         for i, entry in enumerate(data):
-            # Go through each key-value pair in the dictionary to make sure the values are JSON serializable
-            entry = make_json_serializable(entry)
-            json_str = json.dumps(entry)
-            f.write(json_str)
+            f.write(dumps_json_serializable(entry))
             if i < len(data) - 1:
                 f.write("\n")
 
 
-def make_json_serializable(value):
-    if isinstance(value, dict):
-        # If the value is a dictionary, we need to go through each key-value pair recursively
-        return {k: make_json_serializable(v) for k, v in value.items()}
-    elif isinstance(value, list):
-        # If the value is a list, we need to process each element recursively
-        return [make_json_serializable(item) for item in value]
-    else:
-        # Try to serialize the value directly, and if it fails, convert it to a string
-        try:
-            json.dumps(value)
-            return value
-        except (TypeError, ValueError):
-            return str(value)
+def _json_fallback(value):
+    # Any value that is not JSON serializable (eg, a response object of a model SDK) is logged as its string form
+    return str(value)
+
+
+# Stateless, so it is shared by every thread. Without indentation, `encode` runs in the C encoder and only calls back
+# into Python for the values it cannot serialize.
+_json_serializable_encoder = json.JSONEncoder(default=_json_fallback)
+
+
+def dumps_json_serializable(value) -> str:
+    """
+    Serialize a value to a JSON string in a single pass, converting every value that is not JSON serializable into
+    its `str()`. The output is the same as `json.dumps` of the converted value, with the default separators.
+
+    A tuple is written as a list, with the values in it converted one by one.
+    """
+    return _json_serializable_encoder.encode(value)
+
+
+def copy_json_like(value):
+    """
+    Copy a value made of dicts, lists and scalars (ie, anything loaded from JSON).
+    Other objects are handed to `copy.deepcopy`.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        return {key: copy_json_like(item) for key, item in value.items()}
+    if value_type is list:
+        return [copy_json_like(item) for item in value]
+    if value_type in (str, int, float, bool) or value is None:
+        return value
+    return copy.deepcopy(value)
 
 
 def sort_key(entry):
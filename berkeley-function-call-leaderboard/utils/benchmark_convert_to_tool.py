@@ -0,0 +1,67 @@
+import json
+import time
+
+from bfcl._llm_response_generation import process_multi_turn_test_case
+from bfcl.constants.category_mapping import TEST_FILE_MAPPING
+from bfcl.constants.eval_config import PROMPT_PATH
+from bfcl.constants.type_mappings import GORILLA_TO_OPENAPI
+from bfcl.model_handler import utils as model_handler_utils
+from bfcl.model_handler.model_style import ModelStyle
+from bfcl.utils import load_file
+from tabulate import tabulate
+
+"""
+Benchmark for `convert_to_tool`, the compilation of function docs into the tool format of each model style.
+
+The function docs of every test entry (multi-turn entries included) are compiled three times per model style: once
+with a cache size of 0 (so every tool is compiled), once with an empty cache, and once with a warm cache. All three
+must produce the same tools.
+"""
+
+test_entries = []
+for test_file_path in TEST_FILE_MAPPING.values():
+    test_entries.extend(load_file(PROMPT_PATH / test_file_path))
+test_entries = process_multi_turn_test_case(test_entries)
+function_lists = [entry["function"] for entry in test_entries if entry.get("function")]
+
+rows = []
+mismatch_count = 0
+cache_size = model_handler_utils.COMPILED_TOOL_CACHE_SIZE
+for model_style in ModelStyle:
+    timings = []
+    outputs = []
+    for size in [0, cache_size, cache_size]:
+        model_handler_utils.COMPILED_TOOL_CACHE_SIZE = size
+        if size == 0 or len(timings) == 1:
+            model_handler_utils._compiled_tools.clear()
+        start = time.perf_counter()
+        outputs.append(
+            [
+                model_handler_utils.convert_to_tool(functions, GORILLA_TO_OPENAPI, model_style)
+                for functions in function_lists
+            ]
+        )
+        timings.append(time.perf_counter() - start)
+
+    if len({json.dumps(output) for output in outputs}) != 1:
+        mismatch_count += 1
+        print(f"Mismatch for {model_style}")
+    rows.append(
+        [
+            model_style.name,
+            f"{timings[0] * 1000:.0f}",
+            f"{timings[1] * 1000:.0f}",
+            f"{timings[2] * 1000:.0f}",
+            f"{timings[0] / timings[2]:.2f}x",
+        ]
+    )
+
+print(f"{len(function_lists)} function lists, {sum(map(len, function_lists))} function docs")
+print(
+    tabulate(
+        rows,
+        headers=["Model style", "Cache size 0 (ms)", "Cold cache (ms)", "Warm cache (ms)", "Speedup"],
+        tablefmt="grid",
+    )
+)
+print(f"Output mismatches: {mismatch_count}")
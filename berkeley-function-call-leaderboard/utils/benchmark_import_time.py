@@ -0,0 +1,90 @@
+import statistics
+import subprocess
+import sys
+
+from tabulate import tabulate
+
+"""
+Benchmark for the startup time of the `bfcl` CLI.
+
+Each snippet is run in a fresh interpreter (so nothing is cached in `sys.modules`), a few times, and the median
+wall time is reported. The model handlers in `MODEL_CONFIG_MAPPING` are lazy references, so importing the CLI or the
+model registry must not import any provider SDK; the last rows show the cost of resolving handlers on first use.
+"""
+
+REPEAT = 5
+
+SNIPPETS = {
+    "python (baseline)": "pass",
+    "import bfcl.__main__": "import bfcl.__main__",
+    "import bfcl.constants.model_config": "import bfcl.constants.model_config",
+    "import bfcl.eval_checker.eval_runner": "import bfcl.eval_checker.eval_runner",
+    "resolve OpenAIHandler": (
+        "from bfcl.constants.model_config import MODEL_CONFIG_MAPPING\n"
+        "MODEL_CONFIG_MAPPING['gpt-4o-2024-11-20-FC'].model_handler.resolve()"
+    ),
+    "resolve every handler": (
+        "from bfcl.constants.model_config import MODEL_CONFIG_MAPPING\n"
+        "for config in MODEL_CONFIG_MAPPING.values():\n"
+        "    config.model_handler.resolve()"
+    ),
+}
+
+# Modules that must not be imported just by loading the CLI or the model registry
+HEAVY_MODULES = [
+    "openai",
+    "anthropic",
+    "cohere",
+    "mistralai",
+    "google.genai",
+    "vertexai",
+    "boto3",
+    "pandas",
+]
+
+
+def time_snippet(snippet: str) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        timing_code = (
+            "import time\n"
+            "start = time.perf_counter()\n"
+            f"{snippet}\n"
+            "print(time.perf_counter() - start)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", timing_code], capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def imported_heavy_modules(snippet: str) -> list[str]:
+    check_code = (
+        f"{snippet}\n"
+        "import sys\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", check_code], capture_output=True, text=True, check=True
+    ).stdout
+    return [module for module in output.strip().split(",") if module]
+
+
+rows = []
+for name, snippet in SNIPPETS.items():
+    try:
+        median_time = time_snippet(snippet)
+        heavy_modules = imported_heavy_modules(snippet)
+    except subprocess.CalledProcessError as e:
+        rows.append([name, "N/A", f"Failed: {e.stderr.strip().splitlines()[-1]}"])
+        continue
+    rows.append([name, f"{median_time * 1000:.0f}", ", ".join(heavy_modules) or "-"])
+
+print(
+    tabulate(
+        rows,
+        headers=["Snippet", "Median time (ms)", "Heavy modules imported"],
+        tablefmt="grid",
+    )
+)
@@ -0,0 +1,107 @@
+import json
+import time
+from pathlib import Path
+
+from bfcl.constants.category_mapping import TEST_FILE_MAPPING
+from bfcl.constants.eval_config import PROMPT_PATH
+from bfcl.utils import dumps_json_serializable, load_file
+from tabulate import tabulate
+
+"""
+Benchmark for `dumps_json_serializable`, the encoder of the result, score and eval cache files.
+
+It is compared against the previous two-pass approach (rebuild the value while probing every scalar with `json.dumps`,
+then dump it), on the test entries and on score entries of failed multi-turn entries, which carry the whole inference
+log. Both must produce the same text.
+"""
+
+
+def make_json_serializable(value):
+    # The previous implementation, kept here as the reference
+    if isinstance(value, dict):
+        return {k: make_json_serializable(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [make_json_serializable(item) for item in value]
+    else:
+        try:
+            json.dumps(value)
+            return value
+        except (TypeError, ValueError):
+            return str(value)
+
+
+class ResponseObject:
+    # Stands for a response object of a model SDK, which is not JSON serializable
+    def __init__(self, content):
+        self.content = content
+
+    def __repr__(self):
+        return f"ResponseObject(content={self.content!r})"
+
+
+def make_failed_multi_turn_entry(test_entry: dict) -> dict:
+    state = {
+        "role": "state_info",
+        "class_name": "GorillaFileSystem",
+        "content": {"root": {f"file_{i}.txt": "x" * 200 for i in range(200)}},
+    }
+    inference_log = [state]
+    for turn in test_entry["question"]:
+        inference_log.append(turn)
+        inference_log.append({"role": "inference_input", "content": ResponseObject(turn)})
+        inference_log.append(
+            {"role": "handler_log", "content": "decode_success", "path": Path("/tmp")}
+        )
+        inference_log.append(state)
+    return {
+        "id": test_entry["id"],
+        "model_name": "benchmark",
+        "test_category": test_entry["id"].rsplit("_", 1)[0],
+        "valid": False,
+        "error": {
+            "error_message": "Model response execution results do not match.",
+            "error_type": "multi_turn:execution_response_mismatch",
+        },
+        "prompt": test_entry,
+        "inference_log": inference_log,
+    }
+
+
+test_entries = []
+for test_file_path in TEST_FILE_MAPPING.values():
+    test_entries.extend(load_file(PROMPT_PATH / test_file_path))
+score_entries = [
+    make_failed_multi_turn_entry(entry) for entry in test_entries if "multi_turn" in entry["id"]
+]
+
+rows = []
+mismatch_count = 0
+for name, entries in [("Test entries", test_entries), ("Failed multi-turn score entries", score_entries)]:
+    start = time.perf_counter()
+    reference = [json.dumps(make_json_serializable(entry)) for entry in entries]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = [dumps_json_serializable(entry) for entry in entries]
+    output_time = time.perf_counter() - start
+
+    mismatch_count += sum(a != b for a, b in zip(reference, output))
+    rows.append(
+        [
+            name,
+            len(entries),
+            f"{sum(map(len, output)) / 1e6:.1f}",
+            f"{reference_time * 1000:.0f}",
+            f"{output_time * 1000:.0f}",
+            f"{reference_time / output_time:.1f}x",
+        ]
+    )
+
+print(
+    tabulate(
+        rows,
+        headers=["Entries", "Count", "Size (MB)", "Two passes (ms)", "Single pass (ms)", "Speedup"],
+        tablefmt="grid",
+    )
+)
+print(f"Output mismatches: {mismatch_count}")
@@ -0,0 +1,136 @@
+import inspect
+import time
+from collections import defaultdict
+
+from bfcl._llm_response_generation import parse_test_category_argument
+from bfcl.constants.eval_config import POSSIBLE_ANSWER_PATH, PROMPT_PATH
+from bfcl.eval_checker.multi_turn_eval.multi_turn_utils import (
+    CLASS_FILE_PATH_MAPPING,
+    ExecutionSession,
+    _compile_func_call,
+    _eval_func_call,
+    _run_call_plan,
+)
+from bfcl.utils import load_file
+from tabulate import tabulate
+
+"""
+Micro-benchmark for the execution of multi-turn function calls.
+
+Every ground truth function call of the multi-turn datasets is replayed twice, in two separate sessions: once through
+the parsed call path (`_compile_func_call` + `_run_call_plan`) and once through the original rewrite-and-eval path
+(`_eval_func_call`). Both must produce the same result. Timings are aggregated per backend class, together with the
+`inspect.getmembers` lookup that the original implementation repeated for every instance on every step.
+"""
+
+REPEAT = 3
+
+test_filename_total, _ = parse_test_category_argument(["multi_turn"])
+
+call_count = defaultdict(int)
+eval_path_time = defaultdict(float)
+parsed_path_time = defaultdict(float)
+mismatch_count = 0
+class_name_by_instance_name = {
+    f"{class_name.lower()}_instance": class_name for class_name in CLASS_FILE_PATH_MAPPING
+}
+
+for _ in range(REPEAT):
+    for file_path in test_filename_total:
+        ground_truth_data = load_file(POSSIBLE_ANSWER_PATH / file_path)
+        dataset_data = load_file(PROMPT_PATH / file_path)
+
+        for ground_truth_entry, test_entry in zip(ground_truth_data, dataset_data):
+            test_category = test_entry["id"].rsplit("_", 1)[0]
+            long_context = "long_context" in test_category or "composite" in test_category
+            eval_session = ExecutionSession(
+                test_entry["initial_config"], test_entry["involved_classes"], long_context
+            )
+            parsed_session = ExecutionSession(
+                test_entry["initial_config"], test_entry["involved_classes"], long_context
+            )
+            method_owner = {
+                method_name: class_name_by_instance_name[instance_name]
+                for method_name, instance_name in eval_session.class_method_name_mapping.items()
+            }
+
+            for single_turn_ground_truth in ground_truth_entry["ground_truth"]:
+                for func_call in single_turn_ground_truth:
+                    class_name = method_owner.get(func_call.split("(")[0].strip(), "other")
+
+                    start = time.perf_counter()
+                    try:
+                        eval_result = _eval_func_call(func_call, eval_session)
+                    except Exception as e:
+                        eval_result = f"Error during execution: {str(e)}"
+                    eval_path_time[class_name] += time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    try:
+                        call_plan = _compile_func_call(func_call, parsed_session.bound_methods)
+                        if call_plan is not None:
+                            parsed_result = _run_call_plan(
+                                call_plan, parsed_session.bound_methods
+                            )
+                        else:
+                            parsed_result = _eval_func_call(func_call, parsed_session)
+                    except Exception as e:
+                        parsed_result = f"Error during execution: {str(e)}"
+                    parsed_path_time[class_name] += time.perf_counter() - start
+
+                    call_count[class_name] += 1
+                    if str(eval_result) != str(parsed_result):
+                        mismatch_count += 1
+                        print(f"Mismatch for {test_entry['id']}: {func_call}")
+
+            eval_session.release()
+            parsed_session.release()
+
+getmembers_time = {}
+for class_name, module_name in CLASS_FILE_PATH_MAPPING.items():
+    module = __import__(module_name, fromlist=[class_name])
+    instance = getattr(module, class_name)()
+    start = time.perf_counter()
+    for _ in range(1000):
+        inspect.getmembers(instance, predicate=inspect.ismethod)
+    getmembers_time[class_name] = (time.perf_counter() - start) / 1000
+
+rows = []
+for class_name in list(CLASS_FILE_PATH_MAPPING) + ["other"]:
+    count = call_count[class_name]
+    if count == 0 and class_name == "other":
+        continue
+    rows.append(
+        [
+            class_name,
+            count // REPEAT,
+            f"{eval_path_time[class_name] / count * 1e6:.1f}" if count else "N/A",
+            f"{parsed_path_time[class_name] / count * 1e6:.1f}" if count else "N/A",
+            (
+                f"{eval_path_time[class_name] / parsed_path_time[class_name]:.2f}x"
+                if count
+                else "N/A"
+            ),
+            (
+                f"{getmembers_time[class_name] * 1e6:.1f}"
+                if class_name in getmembers_time
+                else "N/A"
+            ),
+        ]
+    )
+
+print(
+    tabulate(
+        rows,
+        headers=[
+            "Class",
+            "Calls",
+            "eval path (µs/call)",
+            "parsed path (µs/call)",
+            "Speedup",
+            "getmembers per step (µs)",
+        ],
+        tablefmt="grid",
+    )
+)
+print(f"Result mismatches: {mismatch_count}")
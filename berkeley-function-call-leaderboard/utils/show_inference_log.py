@@ -0,0 +1,27 @@
+import argparse
+import json
+
+from bfcl.constants.eval_config import PROJECT_ROOT, RESULT_PATH
+from bfcl.model_handler.inference_log_store import load_inference_log
+
+"""
+Print the inference log of a result generated with `--external-inference-log`.
+
+The `inference_log_id` can be taken from the result file or from the score file of the entry, eg:
+
+    python show_inference_log.py --model gpt-4o-2024-11-20-FC --log-id 3f2a...
+"""
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model", type=str, required=True)
+parser.add_argument("--log-id", type=str, required=True)
+parser.add_argument("--result-dir", type=str, default=None)
+args = parser.parse_args()
+
+result_dir = RESULT_PATH if args.result_dir is None else PROJECT_ROOT / args.result_dir
+model_result_dir = result_dir / args.model.replace("/", "_")
+
+inference_log = load_inference_log(model_result_dir, args.log_id)
+if inference_log is None:
+    raise SystemExit(f"No inference log with id {args.log_id} in {model_result_dir}.")
+print(json.dumps(inference_log, indent=4))
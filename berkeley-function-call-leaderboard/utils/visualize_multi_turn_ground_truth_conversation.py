@@ -1,15 +1,14 @@
 import json
-from copy import deepcopy
 
 from bfcl._llm_response_generation import parse_test_category_argument
 from bfcl.constants.eval_config import POSSIBLE_ANSWER_PATH, PROMPT_PATH, UTILS_PATH
 from bfcl.eval_checker.eval_runner_helper import load_file, write_list_of_dicts_to_file
 from bfcl.eval_checker.multi_turn_eval.multi_turn_utils import (
-    STATELESS_CLASSES,
+    ExecutionSession,
     execute_multi_turn_func_call,
 )
 
-_, test_filename_total = parse_test_category_argument(["multi_turn"])
+test_filename_total, _ = parse_test_category_argument(["multi_turn"])
 
 for file_path in test_filename_total:
     ground_truth_data = load_file(POSSIBLE_ANSWER_PATH / file_path)
@@ -25,33 +24,12 @@ for file_path in test_filename_total:
         test_entry_id: str = test_entry["id"]
         test_category: str = test_entry_id.rsplit("_", 1)[0]
 
-        _, involved_instances = execute_multi_turn_func_call(
-            [],
+        execution_session = ExecutionSession(
             initial_config,
             involved_classes,
-            "ground_truth_conversation",  # the model_name is not important here, could use any string
-            test_entry_id,
             long_context=("long_context" in test_category or "composite" in test_category),
-            is_evaL_run=False,
         )
-
-        state_log = []
-        for class_name, class_instance in involved_instances.items():
-            if class_name in STATELESS_CLASSES:
-                continue
-            class_instance = deepcopy(class_instance)  # Avoid modification in future turns
-            state_log.append(
-                {
-                    "role": "state_info",
-                    "class_name": class_name,
-                    "content": {
-                        key: value
-                        for key, value in vars(class_instance).items()
-                        if not key.startswith("_")
-                    },
-                }
-            )
-        all_inference_log.append(state_log)
+        all_inference_log.append(execution_session.state_log())
 
         for single_turn_query, single_turn_ground_truth in zip(
             test_entry["question"], ground_truth_entry["ground_truth"]
@@ -60,16 +38,8 @@ for file_path in test_filename_total:
                 {"begin_of_turn_query": single_turn_query}
             ]
 
-            execution_results, involved_instances = execute_multi_turn_func_call(
-                single_turn_ground_truth,
-                initial_config,
-                involved_classes,
-                "ground_truth_conversation",  # the model_name is not important here, could use any string
-                test_entry_id,
-                long_context=(
-                    "long_context" in test_category or "composite" in test_category
-                ),
-                is_evaL_run=False,
+            execution_results, _ = execute_multi_turn_func_call(
+                single_turn_ground_truth, execution_session
             )
 
             for ground_truth, execution_result in zip(
@@ -107,24 +77,8 @@ for file_path in test_filename_total:
 
             all_inference_log.append(current_turn_inference_log)
 
-            state_log = []
-            for class_name, class_instance in involved_instances.items():
-                if class_name in STATELESS_CLASSES:
-                    continue
-                class_instance = deepcopy(
-                    class_instance
-                )  # Avoid modification in future turns
-                state_log.append(
-                    {
-                        "role": "state_info",
-                        "class_name": class_name,
-                        "content": {
-                            key: value
-                            for key, value in vars(class_instance).items()
-                            if not key.startswith("_")
-                        },
-                    }
-                )
-            all_inference_log.append(state_log)
+            all_inference_log.append(execution_session.state_log())
+
+        execution_session.release()
 
     write_list_of_dicts_to_file(file_path, result, UTILS_PATH / "ground_truth_conversation")